@@ -0,0 +1 @@
+"""Benchmarks of vibrant, see `benchmarks.suite`."""
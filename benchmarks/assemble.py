@@ -0,0 +1,52 @@
+"""Compare the single scatter `Assembler` with the former per-column bincount loop.
+
+Run it from the repository root with `python -m benchmarks.assemble [elements ...]`.
+"""
+
+import sys
+
+import torch
+
+from vibrant.math_extensions import Assembler
+
+try:
+    from .suite import best_time
+except ImportError as error:
+    message = "Run it from the repository root: python -m benchmarks.assemble"
+    raise ImportError(message) from error
+
+
+def bincount_assemble(length, conn, inputs):
+    """Reference implementation: one bincount per column and element node."""
+    storage = torch.zeros(length, inputs.size(2), dtype=inputs.dtype)
+    for j in range(storage.size(1)):
+        for i in range(conn.size(1)):
+            storage[:, j] += torch.bincount(
+                conn[:, i], weights=inputs[:, i, j], minlength=storage.size(0)
+            )
+    return storage
+
+
+def main(sizes):
+    torch.manual_seed(0)
+    header = ("elements", "bincount [ms]", "assembler [ms]", "speedup")
+    print("{:>10} {:>14} {:>15} {:>8}".format(*header))
+    for elements in sizes:
+        length = elements // 2
+        conn = torch.randint(length, (elements, 2))
+        inputs = torch.rand(elements, 2, 3, dtype=torch.double)
+        assembler = Assembler(conn, length)
+        out = torch.empty(length, 3, dtype=torch.double)
+        assert torch.allclose(
+            assembler(inputs, out=out), bincount_assemble(length, conn, inputs)
+        )
+        reference = best_time(lambda: bincount_assemble(length, conn, inputs))
+        scatter = best_time(lambda: assembler(inputs, out=out))
+        print(
+            f"{elements:>10} {1e3 * reference:>14.2f} {1e3 * scatter:>15.2f}"
+            f" {reference / scatter:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main([int(float(arg)) for arg in sys.argv[1:]] or [10 ** 4, 10 ** 5, 10 ** 6])
@@ -0,0 +1,84 @@
+"""Vectorized generators of large structured meshes for the benchmarks.
+
+The nodes of every mesh lie on a regular grid of unit spacing, and the
+connectivities are built by slicing the grid of node ids, without Python loops over
+the elements, so meshes of 1e7 elements take seconds to generate.
+"""
+
+import torch
+
+
+def grid(cells, dim=2):
+    """Nodes of a regular grid.
+
+    Args:
+        cells (int): the number of cells per side.
+        dim (int): the dimension, 2 or 3.
+    Returns:
+        (tensor, tensor): the node positions, with shape `(nodes, dim)`, and the node
+            ids arranged in the grid, with shape `(cells + 1,) * dim`.
+    """
+    axis = torch.arange(cells + 1.0)
+    X = torch.stack(torch.meshgrid(*[axis] * dim, indexing="ij"), -1)
+    ids = torch.arange((cells + 1) ** dim).reshape((cells + 1,) * dim)
+    return X.reshape(-1, dim), ids
+
+
+def _corner(ids, offsets):
+    """Get the id of the node at `offsets` from the first corner of every cell."""
+    cells = ids.size(0) - 1
+    index = tuple(slice(offset, offset + cells) for offset in offsets)
+    return ids[index].reshape(-1)
+
+
+def lattice_truss(cells, dim=2):
+    """Lattice truss with the edges of a regular grid and one diagonal per cell.
+
+    It has about `(dim + 1) * cells ** dim` bars.
+
+    Args:
+        cells (int): the number of cells per side.
+        dim (int): the dimension, 2 or 3.
+    Returns:
+        (tensor, tensor): the node positions and the connectivity.
+    """
+    X, ids = grid(cells, dim)
+    bars = []
+    for axis in range(dim):
+        first = ids.narrow(axis, 0, cells).reshape(-1)
+        last = ids.narrow(axis, 1, cells).reshape(-1)
+        bars.append(torch.stack((first, last), 1))
+    diagonal = (_corner(ids, (0,) * dim), _corner(ids, (1,) * dim))
+    bars.append(torch.stack(diagonal, 1))
+    return X, torch.cat(bars)
+
+
+QUAD4_CORNERS = ((0, 0), (1, 0), (1, 1), (0, 1))
+HEX8_CORNERS = tuple(corner + (z,) for z in (0, 1) for corner in QUAD4_CORNERS)
+
+
+def solid_mesh(cells, dim=2):
+    """Structured mesh of `Quad4` or `Hex8` elements.
+
+    Args:
+        cells (int): the number of cells per side.
+        dim (int): the dimension, 2 for quadrilaterals or 3 for hexahedra.
+    Returns:
+        (tensor, tensor): the node positions and the connectivity.
+    """
+    X, ids = grid(cells, dim)
+    corners = QUAD4_CORNERS if dim == 2 else HEX8_CORNERS
+    return X, torch.stack([_corner(ids, corner) for corner in corners], 1)
+
+
+def cells_for(elements, dim=2, per_cell=1):
+    """Get the number of cells per side of a mesh with about `elements` elements.
+
+    Args:
+        elements (int): the target number of elements.
+        dim (int): the dimension of the grid.
+        per_cell (int): the number of elements per cell.
+    Returns:
+        int: the number of cells per side.
+    """
+    return max(1, round((elements / per_cell) ** (1 / dim)))
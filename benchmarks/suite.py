@@ -0,0 +1,304 @@
+"""Benchmark suite of the hot paths, with throughput, peak memory and baselines.
+
+Run it as a module from the repository root, which makes the source tree of vibrant
+importable. Every case and size runs in a fresh process, so its peak resident memory
+is measured on its own. The sizes go from 1e2 to 1e7 elements by default. Sizes
+that fail, for example because they do not fit in memory, are reported and skipped.
+
+    python -m benchmarks.suite --sizes 1e2 1e4 1e6
+    python -m benchmarks.suite --save benchmarks/baseline.json
+    python -m benchmarks.suite --compare benchmarks/baseline.json
+
+With `--compare`, the exit status is 1 when a case is slower, or uses more memory,
+than the baseline by more than the tolerance. The time of short cases varies from
+process to process, so the cases under 10 ms run in five processes and keep the
+fastest, and a case is only slower when it also takes `--min-delta` seconds more
+than the baseline, 0.2 ms by default. Baselines only compare runs on the same
+machine: `baseline.json` was saved on a single core Linux machine with 5 GB of
+memory, up to 1e6 elements, so save a new one on yours before changing the code.
+"""
+
+import argparse
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import torch
+
+from vibrant.constraints import Prescribe
+from vibrant.elements import Hex8, Truss
+from vibrant.materials import Elastic1D, Isotropic3D
+from vibrant.math_extensions import Assembler, btdot
+from vibrant.models import Model
+from vibrant.nodes import Nodes
+from vibrant.parallel import PartitionedModel
+
+try:
+    from .generators import cells_for, lattice_truss, solid_mesh
+except ImportError as error:
+    message = "Run the suite from the repository root: python -m benchmarks.suite"
+    raise ImportError(message) from error
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def truss(elements, dim=2):
+    """A steel lattice truss with about `elements` bars and small displacements."""
+    X, conn = lattice_truss(cells_for(elements, dim, dim + 1), dim)
+    nodes = Nodes(X.double())
+    nodes.u = torch.rand_like(nodes.X) / 100
+    return Truss(conn, nodes, 1e-4, Elastic1D(2e11, 7800).to(torch.double))
+
+
+def truss_force(elements):
+    els = truss(elements)
+    return els.force, len(els.conn)
+
+
+def truss_force_3d(elements):
+    els = truss(elements, 3)
+    return els.force, len(els.conn)
+
+
+def truss_mass(elements):
+    els = truss(elements)
+    return els.mass, len(els.conn)
+
+
+def hex8_force(elements):
+    X, conn = solid_mesh(cells_for(elements, 3), 3)
+    nodes = Nodes(X.double())
+    nodes.u = torch.rand_like(nodes.X) / 100
+    els = Hex8(conn, nodes, Isotropic3D(2e11, 0.3, 7800).to(torch.double))
+    return els.force, len(conn)
+
+
+def assemble(elements):
+    els = truss(elements)
+    inputs = torch.rand(len(els.conn), 2, 2, dtype=torch.double)
+    assembler = Assembler(els.conn, len(els.nodes))
+    out = torch.empty(len(els.nodes), 2, dtype=torch.double)
+    return lambda: assembler(inputs, out), len(els.conn)
+
+
+def btdot_voigt(elements):
+    C = Isotropic3D(torch.rand(elements) + 1, 0.3).C.double()
+    strain = torch.rand(elements, 6, dtype=torch.double)
+    return lambda: btdot(C, strain, 1), elements
+
+
+def constrained_model(elements):
+    """A lattice model clamped on one side and driven on the opposite one."""
+    els = truss(elements)
+    model = Model(els.nodes, els)
+    X = model.nodes.X
+    clamped = torch.nonzero(X[:, 0] == 0)[:, 0]
+    driven = torch.nonzero(X[:, 0] == X[:, 0].max())[:, 0]
+    model.constraints.append(Prescribe(model.nodes, clamped, 0.0, "v"))
+    model.constraints.append(
+        Prescribe(model.nodes, driven, lambda t: t, "v", components=[0])
+    )
+    return model
+
+
+def model_acceleration(elements):
+    model = constrained_model(elements)
+    return model.acceleration, len(model.elements[0].conn)
+
+
+def apply_constraints(elements):
+    model = constrained_model(elements)
+    return lambda: model.apply_constraints("v"), len(model.elements[0].conn)
+
+
+def partitioned_force(elements, parts=2):
+    """The internal force of a lattice model evaluated by forked workers.
+
+    The peak memory only includes the parent process, which holds the shared
+        buffers, not the elements copied by the workers.
+    """
+    els = truss(elements)
+    model = Model(els.nodes, els)
+    partitioned = PartitionedModel(model, parts)
+    out = torch.empty_like(model.nodes.u)
+    return lambda: partitioned.internal_force(out), len(els.conn)
+
+
+CASES = {
+    "truss_force": truss_force,
+    "truss_force_3d": truss_force_3d,
+    "truss_mass": truss_mass,
+    "hex8_force": hex8_force,
+    "assemble": assemble,
+    "btdot": btdot_voigt,
+    "model_acceleration": model_acceleration,
+    "apply_constraints": apply_constraints,
+    "partitioned_force": partitioned_force,
+}
+
+
+def best_time(function, min_time=0.2, min_repeat=3):
+    """Return the best wall time of the calls made in about `min_time` seconds."""
+    function()  # warm up
+    times = []
+    while len(times) < min_repeat or sum(times) < min_time:
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def measure(case, size):
+    """Time a case in the current process.
+
+    Returns:
+        dict: the elements, the best time, the throughput in element evaluations
+            per second, the peak resident memory of the process in MB, and its
+            increase over the peak after the imports, which is the memory used by
+            the case.
+    """
+    torch.manual_seed(0)
+    before = peak_memory()
+    function, elements = CASES[case](size)
+    seconds = best_time(function)
+    peak = peak_memory()
+    return {
+        "elements": elements,
+        "seconds": seconds,
+        "throughput": elements / seconds,
+        "peak_mb": peak,
+        "extra_mb": peak - before,
+    }
+
+
+def peak_memory():
+    """Get the peak resident memory of the process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != "darwin":
+        peak *= 1024  # kilobytes on Linux
+    return peak / 2 ** 20
+
+
+def run(case, size):
+    """Time a case in a fresh process.
+
+    Returns:
+        (dict, str): the results of `measure`, or None and the reason why the
+            process failed.
+    """
+    command = [sys.executable, "-m", "benchmarks.suite", "--child", case, str(size)]
+    output = subprocess.run(command, capture_output=True, text=True, cwd=ROOT)
+    if output.returncode:
+        errors = output.stderr.strip().splitlines()
+        if output.returncode < 0:
+            return None, f"killed by signal {-output.returncode}"
+        return None, errors[-1] if errors else f"exit status {output.returncode}"
+    return json.loads(output.stdout.splitlines()[-1]), None
+
+
+def run_best(case, size, processes=5, short=0.01):
+    """Time a case in fresh processes, repeating the short ones.
+
+    The time of short cases changes from process to process by up to a factor of
+        two, so cases faster than `short` seconds run in up to `processes`
+        processes, and the fastest run is kept.
+
+    Returns:
+        (dict, str): as `run`.
+    """
+    result, reason = run(case, size)
+    for _ in range(processes - 1):
+        if result is None or result["seconds"] >= short:
+            break
+        other, _ = run(case, size)
+        if other is not None and other["seconds"] < result["seconds"]:
+            result = other
+    return result, reason
+
+
+def compare(results, baseline, tolerance, min_delta=2e-4):
+    """Find the cases that regressed with respect to the baseline.
+
+    Args:
+        results (dict): the results of `measure`, by case and size.
+        baseline (dict): the results of the baseline.
+        tolerance (float): the relative slowdown and memory increase allowed.
+        min_delta (float): the smallest slowdown, in seconds, that is reported.
+    Returns:
+        list: a description of each regression.
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        reference = baseline[key]
+        slower = result["seconds"] - reference["seconds"] > min_delta
+        if slower and result["throughput"] < (1 - tolerance) * reference["throughput"]:
+            ratio = result["throughput"] / reference["throughput"]
+            regressions.append(f"{key}: throughput at {ratio:.0%} of the baseline")
+        # small cases are dominated by allocator noise, hence the slack
+        if result["extra_mb"] > (1 + tolerance) * reference["extra_mb"] + 16:
+            extra = result["extra_mb"] - reference["extra_mb"]
+            regressions.append(f"{key}: {extra:.0f} MB more memory than the baseline")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=CASES)
+    sizes = [1e2, 1e4, 1e5, 1e6, 1e7]
+    parser.add_argument("--sizes", nargs="+", type=float, default=sizes)
+    parser.add_argument("--save", help="write the results to a baseline file")
+    parser.add_argument("--compare", help="compare the results with a baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-delta", type=float, default=2e-4)
+    parser.add_argument("--child", nargs=2, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        print(json.dumps(measure(args.child[0], int(args.child[1]))))
+        return 0
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+    header = ("case", "elements", "time [ms]", "elements/s", "peak [MB]", "case [MB]")
+    header += ("vs base",)
+    print("{:<20} {:>10} {:>12} {:>12} {:>10} {:>10} {:>8}".format(*header))
+    results = {}
+    for case in args.cases:
+        for size in args.sizes:
+            key = f"{case}/{int(size)}"
+            result, reason = run_best(case, int(size))
+            if result is None:
+                print(f"{case:<20} {int(size):>10} failed: {reason}")
+                continue
+            results[key] = result
+            relative = ""
+            if key in baseline:
+                relative = f"{result['throughput'] / baseline[key]['throughput']:.2f}"
+            print(
+                f"{case:<20} {result['elements']:>10} {1e3 * result['seconds']:>12.3f}"
+                f" {result['throughput']:>12.3g} {result['peak_mb']:>10.1f}"
+                f" {result['extra_mb']:>10.1f} {relative:>8}"
+            )
+    if args.save:
+        machine = {
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "torch": torch.__version__,
+            "threads": torch.get_num_threads(),
+        }
+        with open(args.save, "w") as file:
+            json.dump({"machine": machine, "results": results}, file, indent=2)
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+    for regression in regressions:
+        print(f"regression: {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
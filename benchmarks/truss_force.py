@@ -0,0 +1,52 @@
+"""Compare the eager and compiled evaluation of `Truss.force`.
+
+Run it from the repository root with `python -m benchmarks.truss_force [side ...]`,
+where side is the number of cells per side of a square lattice.
+"""
+
+import sys
+import warnings
+
+import torch
+
+from vibrant.elements import Truss
+from vibrant.materials import BasicMaterial
+from vibrant.nodes import Nodes
+
+try:
+    from .generators import lattice_truss
+    from .suite import best_time
+except ImportError as error:
+    message = "Run it from the repository root: python -m benchmarks.truss_force"
+    raise ImportError(message) from error
+
+
+def main(sides):
+    torch.manual_seed(0)
+    material = BasicMaterial(lambda e: 2e11 * e, 7800)
+    header = ("elements", "eager [us]", "compiled [us]", "speedup")
+    print("{:>10} {:>12} {:>14} {:>8}".format(*header))
+    for side in sides:
+        X, conn = lattice_truss(side)
+        nodes = Nodes(X, torch.rand_like(X) / 100)
+        eager = Truss(conn, nodes, 1e-4, material)
+        compiled = Truss(conn, nodes, 1e-4, material, compile=True)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            compiled.force()  # compilation
+        if caught:
+            print(f"compilation unavailable: {caught[0].message}")
+            return
+        reference = eager.force()
+        atol = 1e-4 * reference.abs().max().item()
+        assert torch.allclose(reference, compiled.force(), atol=atol)
+        reference = best_time(eager.force)
+        fused = best_time(compiled.force)
+        print(
+            f"{len(conn):>10} {1e6 * reference:>12.1f} {1e6 * fused:>14.1f}"
+            f" {reference / fused:>8.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [4, 32, 256, 1024])
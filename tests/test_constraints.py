@@ -1,7 +1,7 @@
 import pytest
 import torch
 
-from vibrant.constraints import ImposeVelocity
+from vibrant.constraints import ConstraintTable, ImposeVelocity, Prescribe
 from vibrant.nodes import Nodes
 
 
@@ -41,3 +41,74 @@ class TestImposeVelocityConstraint:
         original_position = nodes.u.clone()
         vel_constraint("u")
         assert torch.allclose(nodes.u, original_position)
+
+
+class TestPrescribe:
+    @pytest.fixture
+    def nodes(self):
+        torch.manual_seed(100)
+        return Nodes(torch.rand(5, 3), u=torch.rand(5, 3), v=torch.rand(5, 3))
+
+    def test_single_component(self, nodes):
+        v = nodes.v.clone()
+        Prescribe(nodes, [1, 3], 2.0, "v", components=[1])()
+        v[[1, 3], 1] = 2
+        assert torch.equal(nodes.v, v)
+
+    def test_time_dependent_value(self, nodes):
+        constraint = Prescribe(nodes, [0], lambda t: [t, 2 * t, 3 * t], "u")
+        constraint("u", time=2.0)
+        assert nodes.u[0].tolist() == [2, 4, 6]
+
+    def test_node_ids_are_converted_once(self, nodes):
+        constraint = Prescribe(nodes, [1, -1], 0.0, "u")
+        assert constraint.node_ids.dtype == torch.int32
+        assert constraint.node_ids.tolist() == [1, 4]
+
+    def test_node_ids_out_of_range_fail(self, nodes):
+        with pytest.raises(IndexError):
+            Prescribe(nodes, [5], 0.0, "u")
+
+    def test_unknown_field_fails(self, nodes):
+        with pytest.raises(ValueError):
+            Prescribe(nodes, [0], 0.0, "x")
+
+    def test_mark_skips_forces(self, nodes):
+        mask = torch.zeros(5, 3, dtype=torch.bool)
+        Prescribe(nodes, [0], 0.0, "f").mark(mask)
+        Prescribe(nodes, [2], 0.0, "u", components=[0, 2]).mark(mask)
+        assert mask.nonzero().tolist() == [[2, 0], [2, 2]]
+
+
+class TestConstraintTable:
+    @pytest.fixture
+    def nodes(self):
+        torch.manual_seed(100)
+        return Nodes(torch.rand(6, 2), v=torch.rand(2, 6, 2))
+
+    @pytest.fixture
+    def constraints(self, nodes):
+        return [
+            ImposeVelocity(nodes, [0, 1], [1.0, 2.0]),
+            Prescribe(nodes, [1, 2], lambda t: t, "v", components=[0]),
+            Prescribe(nodes, slice(4, None), [[3.0], [4.0]], "v", components=[1]),
+            Prescribe(nodes, [5], 7.0, "u"),
+        ]
+
+    def test_matches_sequential_application(self, nodes, constraints):
+        expected = nodes.v.clone()
+        for constraint in constraints:
+            constraint("v", 0.5, expected)
+        table = ConstraintTable(constraints, nodes.X.size(), nodes.v.dtype)
+        assert table.fields() == ("u", "v")
+        table.apply("v", nodes.v, 0.5)
+        assert torch.equal(nodes.v, expected)
+        assert nodes.v[1, 1].tolist() == [0.5, 2.0]
+
+    def test_only_dynamic_values_change(self, nodes, constraints):
+        table = ConstraintTable(constraints, nodes.X.size(), nodes.v.dtype)
+        table.apply("v", nodes.v, 0.5)
+        table.apply("v", nodes.v, 1.5)
+        assert nodes.v[:, 2, 0].tolist() == [1.5, 1.5]
+        assert nodes.v[:, 0].tolist() == [[1.0, 2.0], [1.0, 2.0]]
+        assert nodes.v[:, 5, 1].tolist() == [4.0, 4.0]
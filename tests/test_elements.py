@@ -1,10 +1,19 @@
+import warnings
 from math import cos, pi, sin
 
+import numpy as np
 import pytest
 import torch
 
-from vibrant.elements import Truss
-from vibrant.materials import BasicMaterial
+from vibrant.elements import Hex8, Quad4, Tet4, Tri3, Truss, fuse
+from vibrant.materials import (
+    BasicMaterial,
+    Elastic1D,
+    ElastoPlastic1D,
+    Isotropic3D,
+    IsotropicPE,
+    IsotropicPS,
+)
 from vibrant.nodes import Nodes
 
 
@@ -102,3 +111,392 @@ class TestMirroredTruss:
         nodes.u[1] = nodes.X[2] - nodes.X[1] + nodes.u[2]
         forces = elements.force()
         assert torch.allclose(forces[1], forces[2], rtol=rtol, atol=atol)
+
+
+class TestTrussReferenceGeometry:
+    @pytest.fixture
+    def elements(self, seed):
+        nodes = Nodes(torch.rand(4, 3))
+        conn = torch.tensor([[0, 1], [1, 2], [2, 3]])
+        return Truss(conn, nodes, 2.0, BasicMaterial(lambda e: 5 * e))
+
+    def test_matches_nodes(self, elements):
+        ref = elements.reference()
+        X = elements.nodes.X
+        assert torch.allclose(ref.Xdiff, X[1:] - X[:-1])
+        assert torch.allclose(ref.L0, (X[1:] - X[:-1]).norm(dim=1))
+        assert torch.allclose(ref.L0 * ref.inv_L0, torch.ones(3))
+        assert torch.allclose(ref.area_inv_L0, 2.0 / ref.L0)
+
+    def test_is_reused(self, elements):
+        ref = elements.reference()
+        elements.nodes.u = torch.rand(4, 3)
+        elements.force()
+        assert elements.reference() is ref
+
+    def test_is_updated_when_replaced(self, elements):
+        ref = elements.reference()
+        elements.nodes.X = 2 * elements.nodes.X
+        assert torch.allclose(elements.reference().L0, 2 * ref.L0)
+        elements.area = 1.0
+        assert torch.allclose(elements.reference().area_inv_L0, ref.inv_L0 / 2)
+        elements.conn = torch.tensor([[0, 3]])
+        assert elements.reference().L0.size() == (1,)
+
+
+class TestTrussCriticalTimeStep:
+    def test_matches_wave_speed(self, seed, young, density, area):
+        nodes = Nodes(torch.rand(4, 3), torch.rand(4, 3) / 10)
+        conn = torch.tensor([[0, 1], [1, 2], [2, 3]])
+        elements = Truss(conn, nodes, area, BasicMaterial(lambda e: young * e, density))
+        L = (nodes.x()[1:] - nodes.x()[:-1]).norm(dim=1)
+        expected = L / (young / density) ** 0.5
+        assert torch.allclose(elements.critical_time_step(), expected)
+
+    def test_uses_the_tangent(self, seed):
+        nodes = Nodes(torch.tensor([[0.0, 0.0], [1.0, 0.0]]))
+        nodes.u[1, 0] = 0.5
+        material = BasicMaterial(lambda e: e ** 2, 4)
+        elements = Truss(torch.tensor([[0, 1]]), nodes, material=material)
+        # tangent 2 * strain = 1, wave speed 0.5
+        assert elements.critical_time_step().item() == pytest.approx(3)
+
+
+class TestTrussStiffness:
+    @pytest.fixture
+    def elements(self, seed):
+        X = torch.rand(4, 3, dtype=torch.double)
+        nodes = Nodes(X, torch.rand(4, 3, dtype=torch.double) / 5)
+        conn = torch.tensor([[0, 1], [1, 2], [2, 3], [0, 3], [0, 2]])
+        material = BasicMaterial(lambda e: 5 * e + 20 * e ** 3)
+        return Truss(conn, nodes, 2.0, material)
+
+    def test_matches_force_jacobian(self, elements):
+        nodes = elements.nodes
+
+        def force(u):
+            nodes.u = u
+            return elements.force()
+
+        jacobian = torch.autograd.functional.jacobian(force, nodes.u.clone())
+        jacobian = jacobian.reshape(nodes.u.numel(), nodes.u.numel())
+        nodes.u = nodes.u.detach()
+        K = elements.stiffness()
+        assert K.layout == torch.sparse_csr
+        assert torch.allclose(K.to_dense(), -jacobian)
+
+    def test_uses_the_force_strain(self, seed):
+        strains = []
+
+        def tangent(strain):
+            strains.append(strain)
+            return torch.ones_like(strain)
+
+        nodes = Nodes(torch.rand(4, 3) + 100, torch.rand(4, 3) * 1e-4)
+        conn = torch.tensor([[0, 1], [1, 2], [2, 3]])
+        elements = Truss(conn, nodes, material=BasicMaterial(lambda e: e, 1, tangent))
+        elements.force()
+        elements.element_stiffness()
+        elements.critical_time_step()
+        for strain in strains:
+            assert torch.equal(strain, elements.strain)
+
+    def test_dofs(self, elements):
+        dofs = elements.dofs()
+        assert dofs.size() == (5, 6)
+        assert dofs[1].tolist() == [3, 4, 5, 6, 7, 8]
+
+
+class TestCompiledTruss:
+    @pytest.fixture
+    def nodes(self, seed):
+        return Nodes(torch.rand(5, 3), torch.rand(5, 3) / 10)
+
+    @pytest.fixture
+    def conn(self):
+        return torch.tensor([[0, 1], [1, 2], [2, 3], [3, 4], [4, 0], [0, 2]])
+
+    def test_matches_eager(self, nodes, conn):
+        material = BasicMaterial(lambda e: 5 * e + e ** 2)
+        eager = Truss(conn, nodes, 2.0, material)
+        with warnings.catch_warnings():
+            # Platforms without a working compiler fall back to eager
+            warnings.simplefilter("ignore")
+            compiled = Truss(conn, nodes, 2.0, material, compile=True).force()
+        assert torch.allclose(compiled, eager.force(), atol=1e-6)
+
+    def test_falls_back_when_material_can_not_compile(self, nodes, conn):
+        def material_function(strain):
+            # Converting to python lists breaks the traced graph
+            return torch.tensor([5 * value for value in strain.tolist()])
+
+        material = BasicMaterial(material_function)
+        elements = Truss(conn, nodes, 2.0, material, compile=True)
+        with pytest.warns(UserWarning):
+            force = elements.force()
+        assert not elements.compile
+        expected = Truss(conn, nodes, 2.0, BasicMaterial(lambda e: 5 * e)).force()
+        assert torch.allclose(force, expected)
+
+    def test_material_errors_are_raised(self, nodes, conn):
+        def material_function(strain):
+            raise ValueError("invalid strain")
+
+        elements = Truss(conn, nodes, 2.0, BasicMaterial(material_function), True)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            with pytest.raises(ValueError, match="invalid strain"):
+                elements.force()
+
+    def test_later_errors_are_not_caught(self, nodes, conn):
+        elements = Truss(conn, nodes, 2.0, BasicMaterial(lambda e: 5 * e), True)
+        elements._compiled_kernel = lambda *arguments: 1 / 0
+        with pytest.raises(ZeroDivisionError):
+            elements.force()
+        assert elements.compile
+
+
+class TestHeterogeneousTruss:
+    @pytest.fixture
+    def nodes(self, seed):
+        return Nodes(torch.rand(4, 2).double(), torch.rand(4, 2).double() / 10)
+
+    def test_matches_one_group_per_element(self, nodes):
+        conn = torch.tensor([[0, 1], [1, 2], [2, 3]])
+        area = torch.tensor([1.0, 2.0, 3.0]).double()
+        E = torch.tensor([4.0, 5.0, 6.0]).double()
+        density = torch.tensor([7.0, 8.0, 9.0]).double()
+        elements = Truss(conn, nodes, area, Elastic1D(E, density))
+        groups = [
+            Truss(conn[[k]], nodes, area[k], Elastic1D(E[k], density[k]))
+            for k in range(3)
+        ]
+        assert torch.allclose(elements.force(), sum(g.force() for g in groups))
+        assert torch.allclose(elements.mass(), sum(g.mass() for g in groups))
+        dt = torch.cat([g.critical_time_step() for g in groups])
+        assert torch.allclose(elements.critical_time_step(), dt)
+
+
+class TestCompactConnectivity:
+    @pytest.fixture
+    def nodes(self, seed):
+        return Nodes(torch.rand(4, 2).double(), torch.rand(4, 2).double() / 10)
+
+    def test_int32_matches_int64(self, nodes):
+        conn = torch.tensor([[0, 1], [1, 2], [2, 3]])
+        els = Truss(conn, nodes, 2.0, Elastic1D(3.0))
+        assert els.conn.dtype == torch.int32
+        expected = Truss(conn, nodes, 2.0, Elastic1D(3.0))
+        expected._conn = conn  # bypass the conversion
+        assert torch.equal(els.force(), expected.force())
+        assert torch.equal(els.mass(), expected.mass())
+        K, K64 = els.stiffness().to_dense(), expected.stiffness().to_dense()
+        assert torch.equal(K, K64)
+
+    def test_indices_are_stored_once(self, nodes):
+        conn = torch.randint(4, (1000, 2))
+        els = Truss(conn, nodes, 2.0, Elastic1D(3.0))
+        els.force()
+        tensors = [els.conn, *vars(els.assembler()).values(), *els.reference()]
+        storages = {
+            tensor.untyped_storage().data_ptr(): tensor.untyped_storage().nbytes()
+            for tensor in tensors
+            if torch.is_tensor(tensor) and not tensor.is_floating_point()
+        }
+        # the int32 connectivity and the int64 index of the assembler
+        assert sum(storages.values()) == (4 + 8) * conn.numel()
+
+    def test_arrays_are_not_copied(self, nodes):
+        conn = np.array([[0, 1], [1, 2]], dtype=np.int32)
+        els = Quad4(np.array([[0, 1, 2, 3]]), nodes, IsotropicPS(1.0, 0.3))
+        assert els.conn.dtype == torch.int32
+        els = Truss(conn, nodes, 1.0, Elastic1D(1.0))
+        conn[0, 0] = 3
+        assert els.conn[0, 0] == 3
+
+    def test_out_of_range_fails_once(self, nodes):
+        with pytest.raises(IndexError):
+            Truss([[0, 4]], nodes, 1.0, Elastic1D(1.0))
+        els = Truss([[0, 1]], None, 1.0, Elastic1D(1.0))
+        els.nodes = nodes
+        with pytest.raises(IndexError):
+            els.conn = [[0, 4]]
+
+
+class TestFuse:
+    @pytest.fixture
+    def nodes(self, seed):
+        return Nodes(torch.rand(6, 2).double(), torch.rand(6, 2).double() / 10)
+
+    @pytest.fixture
+    def conns(self):
+        pairs = [[[0, 1], [1, 2]], [[2, 3]], [[3, 4], [4, 5]]]
+        return [torch.tensor(pair, dtype=torch.int32) for pair in pairs]
+
+    def test_groups_sharing_a_material(self, nodes, conns):
+        material = BasicMaterial(lambda e: 5 * e, 2.0)
+        groups = [Truss(conn, nodes, k + 1.0, material) for k, conn in enumerate(conns)]
+        ((fused, members),) = fuse(groups)
+        assert fused.area.tolist() == [1, 1, 2, 3, 3]
+        ranges = [(start, count) for _, start, count in members]
+        assert ranges == [(0, 2), (2, 1), (3, 2)]
+        assert torch.allclose(fused.force(), sum(els.force() for els in groups))
+        assert torch.allclose(fused.mass(), sum(els.mass() for els in groups))
+        assert all(els.conn is conn for els, conn in zip(groups, conns))
+
+    def test_materials_are_concatenated(self, nodes, conns):
+        groups = [
+            Truss(conn, nodes, 2.0, Elastic1D(k + 1.0)) for k, conn in enumerate(conns)
+        ]
+        ((fused, _),) = fuse(groups)
+        assert fused.material.E.tolist() == [1, 1, 2, 3, 3]
+        assert fused.area == 2.0
+        assert torch.allclose(fused.force(), sum(els.force() for els in groups))
+
+    def test_incompatible_groups_are_kept(self, nodes, conns):
+        groups = [
+            Truss(conns[0], nodes, 1.0, BasicMaterial(lambda e: e)),
+            Truss(conns[1], nodes, 1.0, BasicMaterial(lambda e: e)),
+            Truss(conns[2], nodes, 1.0, ElastoPlastic1D(1.0, 1.0)),
+        ]
+        fused = fuse(groups)
+        assert [els for els, _ in fused] == groups
+        assert all(members == [(els, 0, len(els.conn))] for els, members in fused)
+
+    def test_select_splits_a_group(self, nodes, conns):
+        conn = torch.cat(conns)
+        E = torch.arange(1.0, 6.0).double()
+        els = Truss(conn, nodes, E * 2, Elastic1D(E, E * 3))
+        first = els.select(torch.tensor([0, 3]))
+        second = els.select(torch.tensor([1, 2, 4]))
+        assert first.material.E.tolist() == [1, 4]
+        assert second.area.tolist() == [4, 6, 10]
+        assert torch.allclose(first.force() + second.force(), els.force())
+        assert torch.allclose(first.mass() + second.mass(), els.mass())
+
+    def test_continuum_groups(self, seed):
+        X = torch.rand(5, 2).double()
+        nodes = Nodes(X, torch.rand_like(X) / 100)
+        first = Tri3(torch.tensor([[0, 1, 2]]), nodes, IsotropicPS(1.0, 0.3), 0.5)
+        second = Tri3(
+            torch.tensor([[1, 3, 2], [2, 3, 4]]), nodes, IsotropicPS(2.0, 0.25)
+        )
+        ((fused, _),) = fuse([first, second])
+        assert fused.thickness.tolist() == [0.5, 1, 1]
+        assert torch.allclose(fused.force(), first.force() + second.force())
+
+
+UNIT_ELEMENTS = {
+    Tri3: [[0, 0], [1, 0], [0, 1]],
+    Quad4: [[0, 0], [1, 0], [1, 1], [0, 1]],
+    Tet4: [[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]],
+    Hex8: [
+        [0, 0, 0],
+        [1, 0, 0],
+        [1, 1, 0],
+        [0, 1, 0],
+        [0, 0, 1],
+        [1, 0, 1],
+        [1, 1, 1],
+        [0, 1, 1],
+    ],
+}
+
+
+class TestContinuum:
+    @pytest.fixture(params=[Tri3, Quad4, Tet4, Hex8], ids=lambda cls: cls.__name__)
+    def element_type(self, request):
+        return request.param
+
+    @pytest.fixture
+    def unit_element(self, element_type):
+        """A single unit element, with its nodes slightly perturbed."""
+        torch.manual_seed(100)
+        X = torch.tensor(UNIT_ELEMENTS[element_type], dtype=torch.double)
+        X = X + torch.rand_like(X) / 10
+        nodes = Nodes(X)
+        conn = torch.arange(len(X))[None]
+        material = IsotropicPS(2.0, 0.3, 3.0)
+        if element_type.dim == 3:
+            material = Isotropic3D(2.0, 0.3, 3.0)
+        return element_type(conn, nodes, material, thickness=0.5)
+
+    def test_uniform_strain_is_exact(self, unit_element):
+        dim = unit_element.dim
+        A = torch.rand(dim, dim, dtype=torch.double) / 100
+        unit_element.nodes.u = unit_element.nodes.X @ A.T
+        strain = unit_element.current_strain()
+        symmetric = A + A.T
+        if dim == 2:
+            expected = [A[0, 0], A[1, 1], symmetric[0, 1]]
+        else:
+            expected = [A[0, 0], A[1, 1], A[2, 2]]
+            expected += [symmetric[1, 2], symmetric[0, 2], symmetric[0, 1]]
+        assert torch.allclose(strain, torch.stack(expected).expand_as(strain))
+
+    def test_rigid_translation_has_no_force(self, unit_element):
+        unit_element.nodes.u = torch.ones_like(unit_element.nodes.X)
+        assert torch.allclose(
+            unit_element.force(), torch.zeros_like(unit_element.nodes.X)
+        )
+
+    def test_forces_are_balanced(self, unit_element):
+        unit_element.nodes.u = torch.rand_like(unit_element.nodes.X) / 100
+        force = unit_element.force()
+        assert torch.allclose(force.sum(0), torch.zeros(unit_element.dim).double())
+
+    def test_mass_sums_to_total(self, unit_element):
+        volume = unit_element.reference().measure.sum()
+        if unit_element.dim == 2:
+            volume = volume * 0.5
+        mass = unit_element.mass()
+        assert mass.size() == (len(unit_element.nodes), 1)
+        assert mass.sum().item() == pytest.approx(3.0 * volume.item())
+
+    def test_stiffness_matches_force_jacobian(self, unit_element):
+        nodes = unit_element.nodes
+
+        def force(u):
+            nodes.u = u
+            return unit_element.force()
+
+        jacobian = torch.autograd.functional.jacobian(force, nodes.u.clone())
+        jacobian = jacobian.reshape(nodes.u.numel(), nodes.u.numel())
+        nodes.u = nodes.u.detach()
+        K = unit_element.stiffness().to_dense()
+        assert torch.allclose(K, -jacobian.to(K.dtype), atol=1e-6)
+        assert torch.allclose(K, K.T, atol=1e-6)
+
+    def test_critical_time_step_of_a_square(self, element_type):
+        if element_type.corners is None:
+            pytest.skip("only for multilinear elements")
+        X = torch.tensor(UNIT_ELEMENTS[element_type], dtype=torch.double)
+        material = IsotropicPE(2.0, 0.3, 3.0)
+        if element_type.dim == 3:
+            material = Isotropic3D(2.0, 0.3, 3.0)
+        elements = element_type(torch.arange(len(X))[None], Nodes(X), material)
+        wave_speed = (material.C[0, 0, 0].item() / 3.0) ** 0.5
+        dt = elements.critical_time_step()
+        assert dt.size() == (1,)
+        assert dt.item() == pytest.approx(1 / wave_speed)
+
+    def test_per_element_material(self, element_type):
+        torch.manual_seed(100)
+        X = torch.tensor(UNIT_ELEMENTS[element_type], dtype=torch.double)
+        X = torch.cat((X, X + 2))
+        nodes = Nodes(X, torch.rand_like(X) / 100)
+        conn = torch.arange(len(X)).view(2, -1)
+        E = torch.tensor([2.0, 5.0]).double()
+        density = torch.tensor([3.0, 4.0]).double()
+        cls = Isotropic3D if element_type.dim == 3 else IsotropicPS
+        elements = element_type(conn, nodes, cls(E, 0.3, density))
+        groups = [
+            element_type(conn[[k]], nodes, cls(E[k], 0.3, density[k]))
+            for k in range(2)
+        ]
+        assert torch.allclose(elements.force(), sum(g.force() for g in groups))
+        assert torch.allclose(elements.mass(), sum(g.mass() for g in groups))
+        K = sum(g.stiffness().to_dense() for g in groups)
+        assert torch.allclose(elements.stiffness().to_dense(), K)
+        dt = torch.cat([g.critical_time_step() for g in groups])
+        assert torch.allclose(elements.critical_time_step(), dt)
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+import torch
+
+from vibrant.constraints import ImposeVelocity
+from vibrant.elements import Quad4, Truss
+from vibrant.history import GrowableArray, History, read_history
+from vibrant.materials import BasicMaterial, IsotropicPS
+from vibrant.models import Model
+from vibrant.nodes import Nodes
+from vibrant.solvers import CentralDifference
+
+
+@pytest.fixture
+def chain():
+    """A clamped chain of bars with an initial velocity."""
+    count = 10
+    X = torch.stack((torch.arange(count + 1.0), torch.zeros(count + 1)), 1)
+    nodes = Nodes(X.double())
+    nodes.v[:, 0] = torch.linspace(0, 1e-3, count + 1)
+    conn = torch.stack((torch.arange(count), torch.arange(1, count + 1)), 1)
+    model = Model(nodes, Truss(conn, nodes, 1.0, BasicMaterial(lambda e: e)))
+    model.constraints.append(ImposeVelocity(nodes, [0], [0.0, 0.0]))
+    return model
+
+
+class TestGrowableArray:
+    def test_grows_in_place_and_trims(self, tmp_path):
+        array = GrowableArray(tmp_path / "a.npy", (2, 3), np.float32, capacity=2)
+        for i in range(5):
+            array.append(np.full((2, 3), i))
+        assert array.capacity == 8
+        array.close()
+        result = np.load(tmp_path / "a.npy")
+        assert result.shape == (5, 2, 3)
+        assert np.array_equal(result[:, 0, 0], np.arange(5))
+
+
+class TestHistory:
+    def test_records_decimated_frames(self, chain, tmp_path):
+        history = History(chain, tmp_path, ("u", "v"), every=10, capacity=2)
+        solver = CentralDifference(chain)
+        solver.run(10.02, 0.1, callback=history)
+        history.close()
+        result = read_history(tmp_path)
+        assert history.frames == 10
+        assert result["u"].shape == (10, 11, 2)
+        assert np.allclose(result["time"], 0.1 * np.arange(10, 101, 10))
+        assert np.allclose(result["u"][-1], chain.nodes.u.numpy())
+        assert np.allclose(result["v"][-1], chain.nodes.v.numpy())
+
+    def test_subsets(self, chain, tmp_path):
+        CentralDifference(chain).step(0.1)
+        with History(chain, tmp_path, ("f", "stress"), nodes=[3, 1], elements=[2]) as h:
+            h.record()
+        result = read_history(tmp_path)
+        assert result["f"].shape == (1, 2, 2)
+        assert np.allclose(result["f"][0], chain.nodes.f[[3, 1]].numpy())
+        assert np.allclose(result["stress"][0], chain.elements[0].stress[[2]].numpy())
+
+    def test_background_matches_foreground(self, chain, tmp_path):
+        solver = CentralDifference(chain)
+        foreground = History(chain, tmp_path / "fg", nodes=[5, 10])
+        background = History(
+            chain, tmp_path / "bg", nodes=[5, 10], background=True, max_pending=1
+        )
+        for _ in range(20):
+            solver.step(0.1)
+            foreground()
+            background()
+        foreground.close()
+        background.close()
+        expected = read_history(tmp_path / "fg")
+        result = read_history(tmp_path / "bg")
+        assert np.array_equal(result["u"], expected["u"])
+        assert np.array_equal(result["time"], expected["time"])
+
+    def test_continuum_element_axis(self, tmp_path):
+        X = torch.tensor([[0, 0], [1, 0], [2, 0], [0, 1], [1, 1], [2, 1]]).float()
+        nodes = Nodes(X, u=X * 1e-3)
+        conn = torch.tensor([[0, 1, 4, 3], [1, 2, 5, 4]])
+        elements = Quad4(conn, nodes, IsotropicPS(1.0, 0.3))
+        elements.force()
+        with History(Model(nodes, elements), tmp_path, ["strain"], elements=[1]) as h:
+            h.record()
+        assert read_history(tmp_path)["strain"].shape == (1, 4, 1, 3)
+
+    def test_missing_field_fails(self, chain, tmp_path):
+        with pytest.raises(ValueError):
+            History(chain, tmp_path, ["a"])
+        with pytest.raises(ValueError):
+            History(chain, tmp_path, ["f"]).record()
+
+    def test_out_of_range_ids_fail(self, chain, tmp_path):
+        with pytest.raises(IndexError):
+            History(chain, tmp_path, nodes=[11]).record()
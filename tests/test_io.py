@@ -0,0 +1,255 @@
+import pytest
+import torch
+
+from vibrant import io
+from vibrant.constraints import ImposeVelocity
+from vibrant.elements import Hex8, Quad4, Truss
+from vibrant.io import read_abaqus, read_gmsh, read_mesh
+from vibrant.materials import Elastic1D, IsotropicPS
+
+GMSH = """$MeshFormat
+4.1 0 8
+$EndMeshFormat
+$PhysicalNames
+3
+0 3 "corner"
+1 2 "left"
+2 1 "plate"
+$EndPhysicalNames
+$Entities
+1 1 1 0
+3 2 0 0 1 3
+4 0 0 0 0 1 0 1 2 0
+1 0 0 0 2 1 0 1 1 0
+$EndEntities
+$Nodes
+2 6 1 6
+2 1 0 4
+1
+2
+4
+5
+0 0 0
+1 0 0
+0 1 0
+1 1 0
+0 3 0 2
+3
+6
+2 0 0
+2 1 0
+$EndNodes
+$Elements
+3 4 1 4
+2 1 3 2
+1 1 2 5 4
+2 2 3 6 5
+1 4 1 1
+3 1 4
+0 3 15 1
+4 3
+$EndElements
+"""
+
+ABAQUS = """*Heading
+** a 2 by 1 plate
+*Node, nset=all
+1, 0., 0.
+2, 1., 0.
+3, 2., 0.
+4, 0., 1.
+5, 1., 1.
+6, 2., 1.
+*Element, type=CPS4, elset=plate
+1, 1, 2, 5, 4
+** the next element spans two lines
+2, 2, 3,
+6, 5
+*Element, type=T2D2, elset=left
+3, 1, 4
+*Nset, nset=left
+1, 4
+*Nset, nset=bottom, generate
+1, 3, 1
+*Material, name=steel
+*Elastic
+2e11, 0.3
+"""
+
+X = [[0.0, 0.0], [1.0, 0.0], [2.0, 0.0], [0.0, 1.0], [1.0, 1.0], [2.0, 1.0]]
+
+
+@pytest.fixture
+def gmsh_file(tmp_path):
+    path = tmp_path / "plate.msh"
+    path.write_text(GMSH)
+    return path
+
+
+@pytest.fixture
+def abaqus_file(tmp_path):
+    path = tmp_path / "plate.inp"
+    path.write_text(ABAQUS)
+    return path
+
+
+class TestGmsh:
+    def test_nodes(self, gmsh_file):
+        mesh = read_gmsh(gmsh_file)
+        assert mesh.X.dtype == torch.float64
+        assert mesh.node_tags.tolist() == [1, 2, 4, 5, 3, 6]
+        assert mesh.X[mesh.node_tags.argsort()].tolist() == X
+
+    def test_blocks(self, gmsh_file):
+        mesh = read_gmsh(gmsh_file)
+        assert [(block.name, block.element) for block in mesh.blocks] == [
+            ("plate", Quad4),
+            ("left", Truss),
+        ]
+        plate, left = mesh.blocks
+        assert plate.conn.dtype == torch.int32
+        assert plate.conn.tolist() == [[0, 1, 3, 2], [1, 4, 5, 3]]
+        assert left.conn.tolist() == [[0, 2]]
+
+    def test_node_sets(self, gmsh_file):
+        node_sets = read_gmsh(gmsh_file).node_sets
+        assert node_sets["plate"].tolist() == list(range(6))
+        assert node_sets["left"].tolist() == [0, 2]
+        assert node_sets["corner"].tolist() == [4]
+        assert node_sets["left"].dtype == torch.int32
+
+    def test_dim(self, gmsh_file):
+        assert read_gmsh(gmsh_file, dim=3).X.size() == (6, 3)
+
+    def test_chunks(self, gmsh_file, monkeypatch):
+        expected = read_gmsh(gmsh_file)
+        monkeypatch.setattr(io, "BUFFER", 7)
+        mesh = read_gmsh(gmsh_file)
+        assert torch.equal(mesh.X, expected.X)
+        assert torch.equal(mesh.blocks[0].conn, expected.blocks[0].conn)
+
+    @pytest.mark.parametrize(
+        "version, message",
+        [("2.2 0 8", "not 2.2"), ("4.0 0 8", "not 4.0"), ("4.1 1 8", "ASCII")],
+    )
+    def test_unsupported_format(self, tmp_path, version, message):
+        path = tmp_path / "mesh.msh"
+        path.write_text(GMSH.replace("4.1 0 8", version))
+        with pytest.raises(ValueError, match=message):
+            read_gmsh(path)
+
+    def test_undefined_node(self, tmp_path):
+        path = tmp_path / "mesh.msh"
+        path.write_text(GMSH.replace("3 1 4\n", "3 1 7\n"))
+        with pytest.raises(ValueError, match="undefined nodes"):
+            read_gmsh(path)
+
+    def test_truncated_block(self, tmp_path):
+        path = tmp_path / "mesh.msh"
+        path.write_text(GMSH.replace("2 2 3 6 5\n", "2 2 3 6\n"))
+        with pytest.raises(ValueError):
+            read_gmsh(path)
+
+
+class TestAbaqus:
+    def test_mesh(self, abaqus_file):
+        mesh = read_abaqus(abaqus_file)
+        assert mesh.X.tolist() == X
+        assert [(block.name, block.element) for block in mesh.blocks] == [
+            ("plate", Quad4),
+            ("left", Truss),
+        ]
+        plate, left = mesh.blocks
+        assert plate.conn.dtype == torch.int32
+        assert plate.conn.tolist() == [[0, 1, 4, 3], [1, 2, 5, 4]]
+        assert left.conn.tolist() == [[0, 3]]
+
+    def test_node_sets(self, abaqus_file):
+        node_sets = read_abaqus(abaqus_file).node_sets
+        assert node_sets["all"].tolist() == list(range(6))
+        assert node_sets["left"].tolist() == [0, 3]
+        assert node_sets["bottom"].tolist() == [0, 1, 2]
+
+    def test_chunks(self, abaqus_file, monkeypatch):
+        expected = read_abaqus(abaqus_file)
+        monkeypatch.setattr(io, "BUFFER", 5)
+        mesh = read_abaqus(abaqus_file)
+        assert torch.equal(mesh.X, expected.X)
+        assert torch.equal(mesh.blocks[0].conn, expected.blocks[0].conn)
+
+    def test_sparse_node_ids(self, tmp_path):
+        path = tmp_path / "mesh.inp"
+        path.write_text(
+            "*Node\n10, 0., 0.\n30, 1., 0.\n*Element, type=T2D2\n1, 30, 10\n"
+        )
+        mesh = read_abaqus(path)
+        assert mesh.node_tags.tolist() == [10, 30]
+        assert mesh.blocks == [io.Block(None, Truss, mesh.blocks[0].conn)]
+        assert mesh.blocks[0].conn.tolist() == [[1, 0]]
+
+    def test_unsupported_element(self, tmp_path):
+        path = tmp_path / "mesh.inp"
+        path.write_text(ABAQUS.replace("CPS4", "C3D20"))
+        with pytest.raises(ValueError, match="C3D20"):
+            read_abaqus(path)
+
+    @pytest.mark.parametrize(
+        "kind, element",
+        [("CPS4R", Quad4), ("CPE4R", Quad4), ("C3D8R", Hex8), ("C3D8I", Hex8)],
+    )
+    def test_substituted_element(self, tmp_path, kind, element):
+        count = io.NODES_PER_ELEMENT[element]
+        ids = [str(k + 1) for k in range(count)]
+        path = tmp_path / "mesh.inp"
+        path.write_text(
+            "*Node\n"
+            + "".join(f"{node}, {node}., 0., 0.\n" for node in ids)
+            + f"*Element, type={kind}\n1, {', '.join(ids)}\n"
+        )
+        with pytest.warns(UserWarning, match=f"{kind} elements are read as"):
+            mesh = read_abaqus(path)
+        assert mesh.blocks[0].element is element
+
+    def test_incomplete_element(self, tmp_path):
+        path = tmp_path / "mesh.inp"
+        path.write_text(ABAQUS.replace("6, 5\n", "6\n"))
+        with pytest.raises(ValueError):
+            read_abaqus(path)
+
+
+class TestMesh:
+    def test_formats_agree(self, gmsh_file, abaqus_file):
+        gmsh, abaqus = read_mesh(gmsh_file), read_mesh(abaqus_file)
+        for mesh in (gmsh, abaqus):
+            positions = mesh.X[mesh.blocks[0].conn.long()]
+            assert positions.tolist() == [
+                [[0, 0], [1, 0], [1, 1], [0, 1]],
+                [[1, 0], [2, 0], [2, 1], [1, 1]],
+            ]
+
+    def test_unknown_format(self, tmp_path):
+        with pytest.raises(ValueError):
+            read_mesh(tmp_path / "mesh.vtk")
+
+    def test_model(self, gmsh_file):
+        mesh = read_mesh(gmsh_file)
+        model = mesh.model(IsotropicPS(1.0, 0.3), thickness=0.5)
+        assert [type(els) for els in model.elements] == [Quad4]
+        assert model.elements[0].thickness == 0.5
+        model.nodes.u = torch.rand_like(model.nodes.X)
+        model.nodes.v = torch.ones_like(model.nodes.X)
+        model.constraints.append(
+            ImposeVelocity(model.nodes, mesh.node_sets["left"], 0.0)
+        )
+        model.apply_constraints("v")
+        assert model.nodes.v.sum(1).tolist() == [0, 2, 0, 2, 2, 2]
+        assert model.acceleration().size() == (6, 2)
+
+    def test_materials_by_block(self, abaqus_file):
+        mesh = read_mesh(abaqus_file)
+        materials = {"plate": IsotropicPS(1.0, 0.3), "left": Elastic1D(1.0)}
+        model = mesh.model(materials, dtype=torch.float32, area=2.0)
+        assert [type(els) for els in model.elements] == [Quad4, Truss]
+        assert model.elements[1].area == 2.0
+        assert model.nodes.X.dtype == torch.float32
+        assert model.acceleration().size() == (6, 2)
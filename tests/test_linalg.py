@@ -0,0 +1,29 @@
+import torch
+
+from vibrant.linalg import conjugate_gradient
+
+
+class TestConjugateGradient:
+    def test_solves_spd_system(self):
+        torch.manual_seed(100)
+        A = torch.rand(10, 10, dtype=torch.double)
+        A = A @ A.T + 10 * torch.eye(10, dtype=torch.double)
+        b = torch.rand(10, dtype=torch.double)
+        x, iterations = conjugate_gradient(A.mv, b)
+        assert torch.allclose(A @ x, b)
+        assert iterations <= 10
+
+    def test_jacobi_preconditioner(self):
+        torch.manual_seed(100)
+        diagonal = torch.logspace(0, 6, 20, dtype=torch.double)
+        b = torch.rand(20, dtype=torch.double)
+        x, iterations = conjugate_gradient(
+            diagonal.mul, b, preconditioner=diagonal.reciprocal().mul
+        )
+        assert torch.allclose(x, b / diagonal)
+        assert iterations == 1
+
+    def test_zero_right_hand_side(self):
+        x, iterations = conjugate_gradient(lambda x: 2 * x, torch.zeros(3))
+        assert torch.allclose(x, torch.zeros(3))
+        assert iterations == 0
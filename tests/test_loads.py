@@ -0,0 +1,122 @@
+from math import sin
+
+import pytest
+import torch
+
+from vibrant.elements import Truss
+from vibrant.loads import Gravity, LoadTable, NodalLoad, Tabular, interpolate
+from vibrant.materials import BasicMaterial
+from vibrant.models import Model
+from vibrant.nodes import Nodes
+
+
+@pytest.fixture
+def model(density):
+    X = torch.tensor([[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0]]).double()
+    nodes = Nodes(X)
+    conn = torch.tensor([[0, 1], [1, 2], [2, 3], [3, 0]])
+    return Model(nodes, Truss(conn, nodes, 2.0, BasicMaterial(lambda e: e, density)))
+
+
+class TestTabular:
+    @pytest.mark.parametrize(
+        "time, expected", [(-1, 0), (0.5, 1), (1.5, 1.5), (2, 1), (5, 1)]
+    )
+    def test_interpolation(self, time, expected):
+        amplitude = Tabular([0, 1, 2, 2], [0, 2, 1, 1])
+        assert amplitude(time) == pytest.approx(expected)
+
+    def test_single_point_is_constant(self):
+        assert Tabular([1.0], [3.0])(0) == 3
+
+    def test_interpolate_padded_tables(self):
+        times = torch.tensor([[0.0, 1.0, 1.0], [0.0, 2.0, 4.0]])
+        values = torch.tensor([[0.0, 1.0, 1.0], [0.0, 4.0, 0.0]])
+        assert interpolate(times, values, 3.0).tolist() == [1.0, 2.0]
+
+    def test_mismatched_lengths_fail(self):
+        with pytest.raises(ValueError):
+            Tabular([0, 1], [1])
+
+
+class TestLoads:
+    def test_nodal_load_components(self, model):
+        load = NodalLoad(model.nodes, [1, 2], [[3.0], [4.0]], components=[1])
+        force = load.force(model)
+        assert force.dtype == model.nodes.X.dtype
+        assert force.tolist() == [[0, 0], [0, 3], [0, 4], [0, 0]]
+
+    def test_gravity_uses_the_mass(self, model, density):
+        force = Gravity([0.0, -10.0]).force(model)
+        assert torch.allclose(force, model.mass() * torch.tensor([0.0, -10.0]).double())
+        assert force[:, 1].sum().item() == pytest.approx(-10 * 2 * 4 * density)
+
+    def test_nodal_load_ids_are_checked(self, model):
+        with pytest.raises(IndexError):
+            NodalLoad(model.nodes, [4], 1.0)
+        assert NodalLoad(model.nodes, [-1], 1.0).node_ids.tolist() == [3]
+
+    def test_batched_gravity(self, model):
+        density = torch.tensor([[1.0], [2.0], [3.0]]).double()
+        model.elements[0].material.density = density
+        model.nodes.u = torch.zeros(3, 4, 2).double()
+        model.loads += [Gravity([0.0, -1.0]), NodalLoad(model.nodes, [0], [1.0, 0.0])]
+        force = model.external_force()
+        assert force.size() == (3, 4, 2)
+        assert force[..., 1].sum(-1).tolist() == [-8, -16, -24]
+        assert force[:, 0, 0].tolist() == [1, 1, 1]
+        assert torch.equal(model.force(), force)
+
+    def test_batched_nodal_load(self, model):
+        value = torch.tensor([1.0, 2.0, 3.0]).double()[:, None, None]
+        load = NodalLoad(model.nodes, [1, 2], value, components=[1])
+        force = load.force(model)
+        assert force.size() == (3, 4, 2)
+        for variant in range(3):
+            expected = NodalLoad(model.nodes, [1, 2], value[variant], components=[1])
+            assert torch.equal(force[variant], expected.force(model))
+        per_node = NodalLoad(model.nodes, [0, 3], torch.ones(2, 2, 2).cumsum(0))
+        assert per_node.force(model)[:, [0, 3]].tolist() == [[[1, 1]] * 2, [[2, 2]] * 2]
+
+    def test_table_matches_individual_loads(self, model):
+        ramp = Tabular([0, 1], [0, 1])
+        loads = [
+            NodalLoad(model.nodes, [0], [1.0, 2.0], amplitude=ramp),
+            NodalLoad(model.nodes, slice(None), 1.0, components=[0], amplitude=sin),
+            Gravity([0.0, -1.0], amplitude=ramp),
+            NodalLoad(model.nodes, [0, 3], 5.0),
+        ]
+        table = LoadTable(loads, model)
+        assert len(table.amplitudes) == 2
+        expected = sum(load.force(model, 0.25) for load in loads)
+        assert torch.allclose(table.force(0.25), expected)
+        assert table.force(0.25)[0, 0].item() == pytest.approx(5.25 + sin(0.25))
+
+    def test_model_external_force(self, model):
+        class Legacy:
+            def force(self):
+                return torch.ones(4, 2, dtype=torch.double)
+
+        ramp = NodalLoad(model.nodes, [1], 2.0, amplitude=lambda t: t)
+        model.loads += [Legacy(), ramp]
+        model.time = 3.0
+        force = model.external_force()
+        assert force[1].tolist() == [7.0, 7.0]
+        assert force[0].tolist() == [1.0, 1.0]
+        table = model.load_table()
+        model.time = 4.0
+        assert model.load_table() is table
+        assert model.external_force()[1].tolist() == [9.0, 9.0]
+
+    def test_table_follows_the_loads(self, model):
+        load = NodalLoad(model.nodes, [1], 2.0)
+        model.loads.append(load)
+        table = model.load_table()
+        assert model.load_table() is table
+        load.amplitude = lambda t: 3.0
+        assert model.external_force()[1].tolist() == [6.0, 6.0]
+        load.components = [0]
+        assert model.external_force()[1].tolist() == [6.0, 0.0]
+        load.value.mul_(2)
+        assert model.external_force()[1].tolist() == [12.0, 0.0]
+        assert model.load_table() is not table
@@ -100,3 +100,206 @@ class TestMaterialProperties:
         mu, lam = mu_lambda(mu=2, lam=3)
         assert mu == pytest.approx(2)
         assert lam == pytest.approx(3)
+
+
+class TestElasticEnsemble:
+    def test_one_stiffness_per_variant(self):
+        torch.manual_seed(100)
+        C = torch.randn(2, 1, 3, 3)
+        strain = torch.randn(2, 4, 3)
+        mat = materials.Elastic(C, batch_dims=2)
+        stress = mat(strain)
+        assert stress.size() == (2, 4, 3)
+        for variant in range(2):
+            expected = materials.Elastic(C[variant, 0])(strain[variant])
+            assert torch.allclose(stress[variant], expected)
+
+    def test_shared_stiffness_with_batched_strain(self):
+        torch.manual_seed(100)
+        mat = materials.IsotropicPS(2, 0.3)
+        strain = torch.randn(2, 4, 3)
+        assert torch.allclose(mat(strain), strain @ mat.C.squeeze().T, atol=1e-6)
+
+
+class TestPerElementParameters:
+    def test_isotropic_stack_matches_scalars(self):
+        E = torch.tensor([1.0, 2.0, 3.0])
+        nu = torch.tensor([0.0, 0.2, 0.3])
+        for cls in (
+            materials.Isotropic3D,
+            materials.IsotropicPS,
+            materials.IsotropicPE,
+        ):
+            stack = cls(E, nu).C
+            assert stack.size()[:-2] == (3,)
+            for k in range(3):
+                expected = cls(E[k].item(), nu[k].item()).C[0]
+                assert torch.allclose(stack[k], expected)
+
+    def test_stress_of_each_element(self):
+        torch.manual_seed(100)
+        mat = materials.IsotropicPS(torch.tensor([1.0, 2.0]), 0.25)
+        strain = torch.randn(4, 2, 3)
+        stress = mat(strain)
+        for k in range(2):
+            expected = materials.IsotropicPS(k + 1.0, 0.25)(strain[:, k])
+            assert torch.allclose(stress[:, k], expected)
+
+    def test_mu_lambda_broadcasts(self):
+        mu, lam = mu_lambda(E=torch.tensor([2.0, 4.0]), nu=0.25)
+        assert mu.tolist() == pytest.approx([0.8, 1.6])
+        assert lam.tolist() == pytest.approx([0.8, 1.6])
+
+    def test_elastic_1D(self):
+        mat = materials.Elastic1D(torch.tensor([1.0, 2.0, 3.0]))
+        strain = torch.tensor([[1.0, 1.0, 1.0], [0.5, 0.5, 0.5]])
+        assert mat(strain).tolist() == [[1, 2, 3], [0.5, 1, 1.5]]
+        assert mat.tangent(strain).tolist() == [[1, 2, 3]] * 2
+
+    def test_permute(self):
+        order = torch.tensor([2, 0, 1])
+        E = torch.tensor([1.0, 2.0, 3.0])
+        density = torch.tensor([4.0, 5.0, 6.0])
+        elastic = materials.Isotropic3D(E, 0.3, density)
+        expected = elastic.C[order]
+        elastic.permute(order)
+        assert torch.equal(elastic.C, expected)
+        assert elastic.density.tolist() == [6, 4, 5]
+        shared = materials.Isotropic3D(1.0, 0.3, 2.0)
+        C = shared.C.clone()
+        shared.permute(order)
+        assert torch.equal(shared.C, C)
+        truss = materials.Elastic1D(E, density)
+        truss.permute(order)
+        assert truss.E.tolist() == [3, 1, 2]
+
+
+class TestElastoPlastic1D:
+    @pytest.fixture
+    def material(self):
+        return materials.ElastoPlastic1D(100.0, 1.0, hardening=10.0)
+
+    def load(self, material, strains):
+        stresses = []
+        for strain in strains:
+            stresses.append(material(torch.tensor([strain])).item())
+            material.commit()
+        return stresses
+
+    def test_loading_and_unloading(self, material):
+        stresses = self.load(material, [0.005, 0.021, 0.011])
+        hardened = 1 + 100 * 10 / 110 * 0.011
+        assert stresses == pytest.approx([0.5, hardened, hardened - 1], rel=1e-5)
+        plastic_strain = material.committed["plastic_strain"].item()
+        assert plastic_strain == pytest.approx(0.021 - hardened / 100, rel=1e-5)
+        assert material.tangent(torch.tensor([0.011])).item() == 100
+
+    def test_kinematic_hardening_shifts_the_elastic_range(self):
+        material = materials.ElastoPlastic1D(100.0, 1.0, kinematic_hardening=10.0)
+        stresses = self.load(material, [0.021, -0.001])
+        # the elastic range is centered on the back stress
+        back_stress = material.committed["back_stress"].item()
+        assert back_stress == pytest.approx(10 * material.committed["plastic_strain"])
+        assert stresses[1] == pytest.approx(back_stress - 1)
+
+    def test_trial_state_is_not_committed(self, material):
+        first = material(torch.tensor([0.05]))
+        assert material.committed["plastic_strain"].item() == 0
+        assert torch.equal(material(torch.tensor([0.05])), first)
+
+    def test_per_element_parameters(self):
+        material = materials.ElastoPlastic1D(100.0, torch.tensor([1.0, 2.0, 3.0]))
+        stress = material(torch.full((2, 3), 0.025))
+        assert stress.tolist() == [[1, 2, 2.5]] * 2
+        assert material.tangent(torch.full((2, 3), 0.025)).tolist() == [[0, 0, 100]] * 2
+
+
+class TestJ2Plasticity3D:
+    @pytest.fixture
+    def material(self):
+        torch.manual_seed(100)
+        yield_stress = torch.tensor([1.0, 0.5]).double()
+        return materials.J2Plasticity3D(
+            200.0, 0.3, yield_stress, hardening=10.0, kinematic_hardening=5.0
+        ).to(torch.double)
+
+    @pytest.fixture
+    def strain(self):
+        return torch.randn(4, 2, 6, dtype=torch.double) / 50
+
+    def test_elastic_below_yield(self, material, strain):
+        small = strain / 1e4
+        elastic = materials.Isotropic3D(200.0, 0.3).to(torch.double)
+        assert torch.allclose(material(small), elastic(small))
+        assert torch.allclose(material.elastic_tangent(small)[0, 0], elastic.C[0])
+
+    def test_stress_returns_to_the_yield_surface(self, material, strain):
+        stress = material(strain)
+        material.commit()
+        alpha = material.committed["equivalent_plastic_strain"][..., 0]
+        assert (alpha > 0).all()
+        relative = stress - material.committed["back_stress"]
+        deviatoric = relative - relative[..., :3].mean(-1, keepdim=True) * torch.tensor(
+            [1, 1, 1, 0, 0, 0]
+        )
+        von_mises = (1.5 * materials._voigt_norm(deviatoric) ** 2).sqrt()
+        assert torch.allclose(von_mises, material.yield_stress + 10.0 * alpha)
+        volumetric = material.committed["plastic_strain"][..., :3].sum(-1)
+        assert torch.allclose(volumetric, torch.zeros_like(volumetric))
+
+    def test_tangent_matches_the_stress_jacobian(self, material, strain):
+        material(strain / 2)
+        material.commit()
+
+        def stress(strain):
+            return material.return_mapping(strain, material.committed)[0]
+
+        jacobian = torch.autograd.functional.jacobian(stress, strain)
+        jacobian = torch.einsum("abiabj->abij", jacobian)
+        assert torch.allclose(material.tangent(strain), jacobian)
+
+    def test_select(self, material, strain):
+        material(strain)
+        material.commit()
+        selected = material.select(torch.tensor([1]), 2)
+        assert selected.yield_stress.tolist() == [0.5]
+        assert torch.equal(
+            selected.committed["back_stress"], material.committed["back_stress"][:, 1:]
+        )
+        assert torch.allclose(selected(strain[:, 1:]), material(strain)[:, 1:])
+
+    def test_permute_and_state_dict(self, material, strain):
+        material(strain)
+        material.commit()
+        state = {k: v.clone() for k, v in material.state_dict().items()}
+        material.permute(torch.tensor([1, 0]))
+        assert material.yield_stress.tolist() == [0.5, 1.0]
+        assert torch.equal(
+            material.committed["plastic_strain"], state["plastic_strain"][:, [1, 0]]
+        )
+        material.load_state_dict(state)
+        assert torch.equal(material.committed["back_stress"], state["back_stress"])
+
+
+class TestConcatenate:
+    def test_elastic_stiffness_per_element(self):
+        soft = materials.Isotropic3D(1.0, 0.3, 2.0)
+        stiff = materials.Isotropic3D(torch.tensor([3.0, 4.0]), 0.2)
+        merged = materials.Elastic.concatenate([soft, stiff], [2, 2])
+        assert merged.C.size() == (4, 6, 6)
+        assert torch.equal(merged.C[:2], soft.C.expand(2, 6, 6))
+        assert torch.equal(merged.C[2:], stiff.C)
+        assert merged.density.tolist() == [2, 2, 1, 1]
+
+    def test_elastic_forms_must_match(self):
+        voigt = materials.IsotropicPS(1.0, 0.3)
+        tensor = materials.Elastic(torch.ones(2, 2, 2, 2))
+        assert materials.Elastic.concatenate([voigt, tensor], [1, 1]) is None
+
+    def test_elastic_1D(self):
+        merged = materials.Elastic1D.concatenate(
+            [materials.Elastic1D(1.0), materials.Elastic1D(torch.tensor([2.0, 3.0]))],
+            [1, 2],
+        )
+        assert merged.E.tolist() == [1, 2, 3]
+        assert merged.density == 1
@@ -2,7 +2,15 @@ import numpy as np
 import pytest
 import torch
 
-from vibrant.math_extensions import assemble, btdot
+from vibrant.math_extensions import (
+    Assembler,
+    SparseAssembler,
+    as_index,
+    assemble,
+    btdot,
+    concatenate_elements,
+    element_pattern,
+)
 
 
 class TestBtdot:
@@ -40,3 +48,156 @@ def test_simple_assemble(input_dim, conn_dim, elements, length):
         for j, node in enumerate(element):
             real_result[node] += inputs[i, j]
     assert torch.allclose(result, real_result)
+
+
+class TestAssembler:
+    @pytest.fixture
+    def conn(self):
+        torch.manual_seed(100)
+        return torch.randint(6, (10, 2))
+
+    @pytest.fixture
+    def inputs(self):
+        torch.manual_seed(100)
+        return torch.rand(10, 2, 3)
+
+    def test_matches_assemble(self, conn, inputs):
+        assembler = Assembler(conn, 6)
+        assert torch.allclose(assembler(inputs), assemble(6, conn, inputs))
+
+    def test_writes_into_buffer(self, conn, inputs):
+        assembler = Assembler(conn, 6)
+        out = torch.rand(6, 3)
+        result = assembler(inputs, out=out)
+        assert result is out
+        assert torch.allclose(out, assemble(6, conn, inputs))
+
+    def test_accumulates_into_buffer(self, conn, inputs):
+        assembler = Assembler(conn, 6)
+        out = torch.ones(6, 3)
+        assembler(inputs, out=out, accumulate=True)
+        assert torch.allclose(out, 1 + assemble(6, conn, inputs))
+
+    def test_gathers_with_the_same_index(self, conn):
+        assembler = Assembler(conn.int(), 6)
+        values = torch.rand(4, 6, 3)
+        assert torch.equal(assembler.gather(values), values[:, conn])
+        assert assembler.index.dtype == torch.int64
+        assert torch.equal(Assembler(conn, 6).index, conn.reshape(-1))
+        assert Assembler(conn, 6).index.data_ptr() == conn.data_ptr()
+
+
+def test_btdot_with_several_batch_dimensions():
+    torch.manual_seed(100)
+    large = torch.rand(2, 1, 4, 3)
+    small = torch.rand(2, 5, 3)
+    result = btdot(large, small, dims=1)
+    assert result.size() == (2, 5, 4)
+    assert torch.allclose(result, small @ large[:, 0].transpose(-1, -2))
+
+
+def test_btdot_with_a_shared_matrix():
+    torch.manual_seed(100)
+    large = torch.rand(1, 1, 4, 3, dtype=torch.double)
+    small = torch.rand(2, 5, 3)
+    result = btdot(large, small, dims=1)
+    assert result.dtype == torch.double
+    expected = (large * small[..., None, :]).sum(-1)
+    assert torch.allclose(result, expected)
+
+
+def test_batched_assembler():
+    torch.manual_seed(100)
+    conn = torch.randint(6, (10, 2))
+    inputs = torch.rand(3, 10, 2, 2)
+    result = Assembler(conn, 6)(inputs)
+    assert result.size() == (3, 6, 2)
+    for variant in range(3):
+        assert torch.allclose(result[variant], assemble(6, conn, inputs[variant]))
+
+
+class TestSparseAssembler:
+    @pytest.fixture
+    def dofs(self):
+        torch.manual_seed(100)
+        return torch.randint(8, (10, 3))
+
+    @pytest.fixture
+    def matrices(self):
+        torch.manual_seed(100)
+        return torch.rand(10, 3, 3, dtype=torch.double)
+
+    def test_matches_dense_assembly(self, dofs, matrices):
+        assembler = SparseAssembler(*element_pattern(dofs), 8)
+        expected = torch.zeros(8, 8, dtype=torch.double)
+        for element, element_dofs in enumerate(dofs):
+            for i, row in enumerate(element_dofs):
+                for j, col in enumerate(element_dofs):
+                    expected[row, col] += matrices[element, i, j]
+        matrix = assembler(matrices)
+        assert matrix.layout == torch.sparse_csr
+        assert torch.allclose(matrix.to_dense(), expected)
+        assert torch.allclose(assembler.diagonal(matrix), expected.diagonal())
+        assert assembler.nnz == (expected != 0).sum().item()
+
+
+def test_assembler_accumulates_in_dtype():
+    conn = torch.tensor([[0, 1], [1, 2]])
+    inputs = torch.ones(2, 2, 1, dtype=torch.float32)
+    result = Assembler(conn, 3, torch.float64)(inputs)
+    assert result.dtype == torch.float64
+    assert result[:, 0].tolist() == [1, 2, 1]
+
+
+class TestConcatenateElements:
+    def test_shared_scalar_is_kept(self):
+        assert concatenate_elements([2.0, 2.0], [3, 1]) == 2.0
+
+    def test_scalars_and_tensors(self):
+        values = [1.0, torch.tensor([2.0, 3.0]), torch.tensor(4.0)]
+        result = concatenate_elements(values, [2, 2, 1])
+        assert result.tolist() == [1, 1, 2, 3, 4]
+
+    def test_batch_dimensions_broadcast(self):
+        values = [torch.tensor([[1.0], [2.0]]), torch.tensor([3.0, 4.0])]
+        result = concatenate_elements(values, [1, 2])
+        assert result.tolist() == [[1, 3, 4], [2, 3, 4]]
+
+
+class TestAsIndex:
+    def test_sequences_become_int32(self):
+        index = as_index([[0, 1], [1, 2]])
+        assert index.dtype == torch.int32
+        assert index.tolist() == [[0, 1], [1, 2]]
+
+    def test_int32_arrays_are_not_copied(self):
+        array = np.array([[0, 1], [1, 2]], dtype=np.int32)
+        index = as_index(array, 3)
+        array[0, 0] = 2
+        assert index[0, 0] == 2
+
+    def test_int64_tensors_are_compacted(self):
+        index = as_index(torch.tensor([3, 1]))
+        assert index.dtype == torch.int32
+        assert index.is_contiguous()
+
+    def test_large_ids_keep_64_bits(self):
+        assert as_index([2 ** 40]).dtype == torch.long
+
+    def test_slices_masks_and_negative_ids(self):
+        assert as_index(slice(1, None), 4).tolist() == [1, 2, 3]
+        assert as_index(slice(1, None)) == slice(1, None)
+        assert as_index(torch.tensor([True, False, True])).tolist() == [0, 2]
+        assert as_index([-1, 0], 4).tolist() == [3, 0]
+
+    @pytest.mark.parametrize("ids", [[0, 4], [-5]])
+    def test_out_of_range(self, ids):
+        with pytest.raises(IndexError):
+            as_index(ids, 4)
+
+    def test_floats_fail(self):
+        with pytest.raises(TypeError):
+            as_index([0.0, 1.0])
+
+    def test_empty(self):
+        assert as_index([], 4).numel() == 0
@@ -1,25 +1,36 @@
-from math import cos, sin
+from math import cos, pi, sin
 
+import numpy as np
 import pytest
 import torch
 
-from vibrant.constraints import ImposeVelocity
+from vibrant.constraints import ImposeVelocity, Prescribe
 from vibrant.elements import Truss
-from vibrant.materials import BasicMaterial
+from vibrant.materials import BasicMaterial, Elastic1D, ElastoPlastic1D
 from vibrant.models import Model
 from vibrant.nodes import Nodes
+from vibrant.ordering import bandwidth, inverse_permutation
+from vibrant.solvers import CentralDifference
 
 
 class TestTrussModel2D:
     @pytest.fixture
     def two_bars(self, young, density, area, length):
-        X = torch.tensor([[0, 0], [length, 0], [length, length]])
+        X = torch.tensor([[0, 0], [length, 0], [length, length]], dtype=torch.double)
         conn = torch.tensor([[0, 1], [1, 2]], dtype=int)
         nodes = Nodes(X)
         mat = BasicMaterial(lambda e: young * e, density)
         els = Truss(conn, nodes, area, mat)
         return Model(nodes, els)
 
+    @pytest.fixture
+    def rotation(self, length):
+        """Stretch the first bar and rotate the second one rigidly about node 1."""
+        return torch.tensor(
+            [[length * 0.1, 0], [0, 0], [length * sin(0.1), -length * (1 - cos(0.1))]],
+            dtype=torch.double,
+        )
+
     def test_mass(self, two_bars, young, area, length, density):
         m = two_bars.mass()
         assert m.size() == (3, 1)
@@ -27,20 +38,27 @@ class TestTrussModel2D:
         assert m[0, 0].item() == pytest.approx(m[2, 0].item())
         assert m[0, 0].item() == pytest.approx(density * length * area / 2)
 
-    def test_force(self, two_bars, young, area, length, density):
-        two_bars.nodes.u = torch.tensor(
-            [[length * 0.1, 0], [0, 0], [length * sin(0.1), -length * (1 - cos(0.1))]]
-        )
+    def test_force(self, two_bars, rotation, young, area):
+        two_bars.nodes.u = rotation
         f = two_bars.force()
         assert f[0, 0].item() == pytest.approx(-0.1 * young * area)  # stretch
         assert f[0, 1].item() == pytest.approx(0)  # transversal
         assert f[2, 1].item() == pytest.approx(0)  # rotation
         assert f[2, 1].item() == pytest.approx(0)  # rotation
 
-    def test_acceleration(self, two_bars, young, area, length, density):
-        two_bars.nodes.u = torch.tensor(
-            [[length * 0.1, 0], [0, 0], [length * sin(0.1), -length * (1 - cos(0.1))]]
-        )
+    def test_force_in_single_precision(self, two_bars, rotation, young, area):
+        two_bars.to(torch.float32)
+        two_bars.nodes.u = rotation.float()
+        f = two_bars.force()
+        assert f.dtype == torch.float32
+        assert f[0, 0].item() == pytest.approx(-0.1 * young * area, rel=1e-5)
+        # single precision rounding of the rigid rotation
+        rounding = 1e-6 * young * area
+        assert f[0, 1].item() == pytest.approx(0, abs=rounding)  # transversal
+        assert f[2, 1].item() == pytest.approx(0, abs=rounding)  # rotation
+
+    def test_acceleration(self, two_bars, rotation, young, length, density):
+        two_bars.nodes.u = rotation
         a = two_bars.acceleration()
         assert a[0, 0].item() == pytest.approx(
             -0.2 * young / density / length
@@ -58,6 +76,13 @@ class TestTrussModel2D:
         m = density * length * area / 2
         assert f[0, 0].item() == pytest.approx(-m * v00 * two_bars.damping)
 
+    def test_numpy_positions(self, length):
+        X = np.array([[0.0, 0.0], [length, 0.0]])
+        model = Model(X)
+        assert torch.equal(model.nodes.X, torch.from_numpy(X))
+        X[1, 0] = 2 * length
+        assert model.nodes.X[1, 0] == 2 * length
+
 
 @pytest.mark.usefixtures("seed")
 class TestTruss3D:
@@ -114,3 +139,423 @@ class TestTruss3D:
         model.constraints.append(ImposeVelocity(model.nodes, [2, 3], [0, 1, 1]))
         model.apply_constraints()
         assert torch.allclose(model.nodes.v, result)
+
+
+class TestStableTimeStep:
+    def test_smallest_element_controls(self, young, density, area, length):
+        X = torch.tensor([[0, 0], [length, 0], [length, length / 4], [0, length]])
+        nodes = Nodes(X)
+        mat = BasicMaterial(lambda e: young * e, density)
+        long_bars = Truss(torch.tensor([[0, 1], [0, 3]]), nodes, area, mat)
+        short_bars = Truss(torch.tensor([[0, 2], [1, 2]]), nodes, area, mat)
+        model = Model(nodes, long_bars)
+        model.elements.append(short_bars)
+        result = model.stable_time_step()
+        assert result.group == 1
+        assert result.element == 1
+        assert result.dt == pytest.approx(length / 4 / (young / density) ** 0.5)
+
+
+@pytest.mark.usefixtures("seed")
+class TestEnsemble:
+    @pytest.fixture
+    def variants(self):
+        return 3
+
+    @pytest.fixture
+    def ensemble(self, variants, length, area, young, density):
+        X = length * torch.tensor([[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1.0]])
+        conn = torch.tensor([[0, 1], [0, 2], [0, 3], [1, 2], [2, 3]])
+        nodes = Nodes(X, batch_size=variants)
+        nodes.u = length * torch.rand(variants, 4, 3) / 10
+        areas = area * torch.rand(variants, 1)
+        youngs = young * torch.rand(variants, 1)
+        mat = BasicMaterial(lambda e: youngs * e, density)
+        return Model(nodes, Truss(conn, nodes, areas, mat)), areas, youngs
+
+    def single(self, ensemble, variant, density):
+        model, areas, youngs = ensemble
+        nodes = Nodes(model.nodes.X, model.nodes.u[variant])
+        mat = BasicMaterial(lambda e: youngs[variant].item() * e, density)
+        conn = model.elements[0].conn
+        return Model(nodes, Truss(conn, nodes, areas[variant].item(), mat))
+
+    def test_default_state_is_batched(self, variants):
+        nodes = Nodes(torch.rand(4, 2), batch_size=variants)
+        assert nodes.u.size() == (variants, 4, 2)
+        assert nodes.v.size() == (variants, 4, 2)
+        assert nodes.batch_shape == (variants,)
+
+    def test_force_matches_single_models(self, ensemble, variants, density):
+        forces = ensemble[0].force()
+        assert forces.size() == (variants, 4, 3)
+        for variant in range(variants):
+            single_force = self.single(ensemble, variant, density).force()
+            atol = 1e-5 * single_force.abs().max().item()
+            assert torch.allclose(forces[variant], single_force, rtol=1e-4, atol=atol)
+
+    def test_mass_matches_single_models(self, ensemble, variants, density):
+        mass = ensemble[0].mass()
+        assert mass.size() == (variants, 4, 1)
+        for variant in range(variants):
+            single_mass = self.single(ensemble, variant, density).mass()
+            assert torch.allclose(mass[variant], single_mass)
+
+    def test_constraints_apply_to_all_variants(self, ensemble):
+        model = ensemble[0]
+        model.constraints.append(ImposeVelocity(model.nodes, [0, 2], [1, 2, 3]))
+        model.apply_constraints()
+        assert torch.allclose(model.nodes.v[:, [0, 2]], torch.tensor([1.0, 2, 3]))
+        assert torch.allclose(model.nodes.v[:, [1, 3]], torch.zeros(3))
+
+
+class PointLoad:
+    def __init__(self, nodes, node_ids, value):
+        self.nodes = nodes
+        self.node_ids = node_ids
+        self.value = torch.as_tensor(value, dtype=nodes.X.dtype)
+
+    def force(self):
+        force = torch.zeros_like(self.nodes.X)
+        force[self.node_ids] = self.value
+        return force
+
+
+class TestStaticSolution:
+    @pytest.fixture
+    def arch(self, young, area, length):
+        """Two inclined bars supported at the base and joined at the top."""
+        X = length * torch.tensor([[0, 0], [2, 0], [1, 1]], dtype=torch.double)
+        nodes = Nodes(X)
+        conn = torch.tensor([[0, 2], [1, 2]])
+        material = BasicMaterial(lambda e: young * e)
+        model = Model(nodes, Truss(conn, nodes, area, material))
+        model.constraints.append(ImposeVelocity(nodes, [0, 1], [0.0, 0.0]))
+        model.loads.append(PointLoad(nodes, 2, [0, -1e-3 * young * area]))
+        return model
+
+    def test_reaches_equilibrium(self, arch, young, area):
+        solution = arch.solve_static()
+        assert solution.converged
+        assert solution.iterations < 10
+        residual = arch.static_force()[2]
+        assert residual.norm().item() <= 1e-6 * young * area
+        assert torch.allclose(arch.nodes.u[:2], torch.zeros(2, 2, dtype=torch.double))
+
+    def test_matches_linear_solution(self, arch, young, area, length):
+        arch.solve_static()
+        # each bar carries P / sqrt(2), shortening by P / sqrt(2) * L sqrt(2) / EA
+        expected = 1e-3 * length * 2 ** 0.5
+        assert arch.nodes.u[2, 1].item() == pytest.approx(-expected, rel=1e-2)
+        assert arch.nodes.u[2, 0].item() == pytest.approx(0, abs=1e-8 * length)
+
+    def test_stiffness_is_symmetric(self, arch):
+        arch.nodes.u[2] = torch.tensor([0.1, -0.2], dtype=torch.double)
+        K = arch.stiffness().to_dense()
+        assert torch.allclose(K, K.T)
+
+
+class TestModes:
+    @pytest.fixture
+    def bar(self, young, density, area, length):
+        """A clamped-free bar along a 1D axis, split in 60 elements."""
+        elements = 60
+        X = torch.linspace(0, length, elements + 1, dtype=torch.double)[:, None]
+        nodes = Nodes(X)
+        conn = torch.stack((torch.arange(elements), torch.arange(1, elements + 1)), 1)
+        material = BasicMaterial(lambda e: young * e, density)
+        model = Model(nodes, Truss(conn, nodes, area, material))
+        model.constraints.append(ImposeVelocity(nodes, [0], [0.0]))
+        return model
+
+    def test_fundamental_frequency(self, bar, young, density, length):
+        torch.manual_seed(100)
+        omega, shapes = bar.modes(3)
+        wave_speed = (young / density) ** 0.5
+        expected = torch.tensor([1.0, 3, 5]) * pi / 2 * wave_speed / length
+        assert torch.allclose(omega.float(), expected, rtol=1e-2)
+        assert shapes.size() == (3, 61, 1)
+        assert torch.allclose(shapes[:, 0], torch.zeros(3, 1, dtype=torch.double))
+
+    def test_sparse_matches_dense(self, bar):
+        torch.manual_seed(100)
+        sparse = bar.modes(3)
+        dense = bar.modes(20)
+        assert torch.allclose(sparse.omega, dense.omega[:3], rtol=1e-5)
+        for sparse_shape, dense_shape in zip(sparse.shapes, dense.shapes):
+            sign = (sparse_shape * dense_shape).sum().sign()
+            atol = 1e-3 * dense_shape.abs().max().item()
+            assert torch.allclose(sparse_shape, sign * dense_shape, atol=atol)
+
+    def test_shapes_are_mass_normalized(self, bar):
+        torch.manual_seed(100)
+        shapes = bar.modes(3).shapes.reshape(3, -1)
+        mass = bar.mass().reshape(-1)
+        products = shapes @ (mass[:, None] * shapes.T)
+        assert torch.allclose(products, torch.eye(3, dtype=torch.double), atol=1e-6)
+
+
+class TestReorder:
+    @pytest.fixture
+    def model(self, young, density, length):
+        """A shuffled zigzag truss, clamped at one end and pulled at the other."""
+        torch.manual_seed(100)
+        count = 30
+        X = length * torch.stack(
+            (torch.arange(count) / 2, torch.arange(count) % 2), 1
+        ).double()
+        labels = torch.randperm(count)
+        X = X[inverse_permutation(labels)]
+        conn = torch.cat(
+            (
+                torch.stack((labels[:-1], labels[1:]), 1),
+                torch.stack((labels[:-2], labels[2:]), 1),
+            )
+        )
+        nodes = Nodes(X)
+        nodes.u = torch.rand_like(X) * length / 100
+        # per element sections and materials must follow the elements
+        scales = torch.rand(3, len(conn), dtype=torch.double) + 1
+        material = Elastic1D(young * scales[0], density * scales[1])
+        model = Model(nodes, Truss(conn, nodes, scales[2], material))
+        model.constraints.append(ImposeVelocity(nodes, labels[:2], [0.0, 0.0]))
+        model.loads.append(PointLoad(nodes, labels[-1].item(), [1.0, 0.0]))
+        return model
+
+    @pytest.mark.parametrize("method", ["rcm", "hilbert"])
+    def test_results_map_back(self, model, method):
+        force, mass = model.force().clone(), model.mass().clone()
+        dt = model.stable_time_step().dt
+        constrained = model.constrained_dofs()
+        order = model.reorder(method)
+        inverse = inverse_permutation(order)
+        assert torch.allclose(model.force()[inverse], force)
+        assert torch.allclose(model.mass()[inverse], mass)
+        assert model.stable_time_step().dt == pytest.approx(dt)
+        assert torch.equal(model.constrained_dofs()[inverse], constrained)
+
+    def test_rcm_reduces_bandwidth(self, model):
+        before = bandwidth([model.elements[0].conn])
+        model.reorder("rcm")
+        assert bandwidth([model.elements[0].conn]) < before
+        conn = model.elements[0].conn
+        assert torch.all(conn.amin(1)[1:] >= conn.amin(1)[:-1])
+
+    def test_indices_stay_compact(self, model):
+        model.reorder("rcm")
+        assert model.elements[0].conn.dtype == torch.int32
+        assert model.constraints[0].node_ids.dtype == torch.int32
+
+    def test_unknown_method_fails(self, model):
+        with pytest.raises(ValueError):
+            model.reorder("metis")
+
+
+class TestCheckpoint:
+    @staticmethod
+    def build(young, density, area, length):
+        """A damped chain of bars, clamped at one end and pulled at the other."""
+        count = 8
+        X = length * torch.stack(
+            (torch.arange(count + 1.0), torch.zeros(count + 1)), 1
+        ).double()
+        nodes = Nodes(X)
+        conn = torch.stack((torch.arange(count), torch.arange(1, count + 1)), 1)
+        material = BasicMaterial(lambda e: young * e + young * e ** 2, density)
+        model = Model(nodes, Truss(conn, nodes, area, material))
+        model.damping = 0.1 / model.stable_time_step().dt
+        model.constraints.append(ImposeVelocity(nodes, [0], [0.0, 0.0]))
+        model.loads.append(PointLoad(nodes, count, [1e-3 * young * area, 0.0]))
+        return model
+
+    def test_tensors_round_trip(self, young, density, area, length, tmp_path):
+        model = self.build(young, density, area, length)
+        model.nodes.u = torch.rand_like(model.nodes.X)
+        model.mass()
+        model.time = 0.5
+        model.save_checkpoint(tmp_path / "model.pt")
+        restored = self.build(young, density, area, length)
+        restored.load_checkpoint(tmp_path / "model.pt")
+        assert restored.time == 0.5
+        assert torch.equal(restored.elements[0].conn, model.elements[0].conn)
+        for name in ("X", "u", "v", "m"):
+            expected = getattr(model.nodes, name)
+            assert torch.equal(getattr(restored.nodes, name), expected)
+
+    def test_resume_is_bit_identical(self, young, density, area, length, tmp_path):
+        model = self.build(young, density, area, length)
+        solver = CentralDifference(model, update_interval=7)
+        for _ in range(20):
+            solver.step(solver.stable_time_step())
+        solver.run(model.time + 30 * solver.dt)
+        model.save_checkpoint(tmp_path / "model.pt", solver)
+        solver.run(model.time + 50 * solver.dt)
+        restored = self.build(young, density, area, length)
+        resumed = CentralDifference(restored, update_interval=7)
+        restored.load_checkpoint(tmp_path / "model.pt", resumed)
+        resumed.run(model.time)
+        assert resumed.steps == solver.steps
+        assert restored.time == model.time
+        assert torch.equal(restored.nodes.u, model.nodes.u)
+        assert torch.equal(restored.nodes.v, model.nodes.v)
+
+    def test_mismatched_model_fails(self, young, density, area, length, tmp_path):
+        model = self.build(young, density, area, length)
+        model.save_checkpoint(tmp_path / "model.pt")
+        model.constraints.clear()
+        with pytest.raises(ValueError):
+            model.load_checkpoint(tmp_path / "model.pt")
+
+
+class TestPlasticity:
+    @pytest.fixture
+    def bar(self, young, area, length):
+        """Two bars in series, the second one weaker, stretched at the free end."""
+        X = length * torch.tensor([[0.0, 0.0], [1.0, 0.0], [2.0, 0.0]]).double()
+        nodes = Nodes(X)
+        conn = torch.tensor([[0, 1], [1, 2]])
+        yield_stress = torch.tensor([2.0, 1.0]).double() * young / 100
+        material = ElastoPlastic1D(young, yield_stress, hardening=young / 10)
+        model = Model(nodes, Truss(conn, nodes, area, material.to(torch.double)))
+        model.constraints.append(Prescribe(nodes, [0], 0.0, "u"))
+        model.constraints.append(Prescribe(nodes, [1, 2], 0.0, "u", components=[1]))
+        # the time is the prescribed strain of the pair of bars
+        stretch = Prescribe(nodes, [2], lambda t: 2 * t * length, "u", components=[0])
+        model.constraints.append(stretch)
+        return model
+
+    def stretch(self, model, strain, length):
+        model.time = strain
+        assert model.solve_static(rtol=1e-10).converged
+        return -model.internal_force()[2, 0].item()
+
+    def test_loading_and_unloading(self, bar, young, area, length):
+        force = self.stretch(bar, 0.015, length)
+        material = bar.elements[0].material
+        plastic = material.committed["plastic_strain"]
+        assert plastic[0].item() == 0 and plastic[1].item() > 0
+        stress = force / area
+        hardening = young / 10
+        assert stress == pytest.approx(young / 100 + hardening * plastic[1].item())
+        # unloading is elastic, and the plastic strain remains
+        assert self.stretch(bar, plastic[1].item() / 2, length) == pytest.approx(
+            0, abs=1e-8 * young * area
+        )
+        assert torch.equal(material.committed["plastic_strain"], plastic)
+
+    def test_checkpoint_restores_the_material_state(self, bar, length, tmp_path):
+        self.stretch(bar, 0.015, length)
+        bar.save_checkpoint(tmp_path / "plastic.pt")
+        state = bar.elements[0].material.state_dict()
+        plastic = state["plastic_strain"].clone()
+        self.stretch(bar, 0.025, length)
+        bar.load_checkpoint(tmp_path / "plastic.pt")
+        material = bar.elements[0].material
+        assert torch.equal(material.committed["plastic_strain"], plastic)
+
+    def test_explicit_steps_commit(self, bar, young, density):
+        bar.constraints.pop()
+        bar.nodes.v[2, 0] = (young / density) ** 0.5
+        solver = CentralDifference(bar)
+        solver.run(20 * solver.stable_time_step())
+        material = bar.elements[0].material
+        assert material.committed["plastic_strain"][1] > 0
+        for name, value in material.trial.items():
+            assert torch.equal(material.committed[name], value)
+
+
+class TestFusedElements:
+    @pytest.fixture
+    def build(self, young, density, area, length):
+        def build(fuse):
+            """A chain of bars with one group per section."""
+            torch.manual_seed(100)
+            count = 6
+            X = length * torch.stack(
+                (torch.arange(count + 1.0), torch.rand(count + 1)), 1
+            ).double()
+            nodes = Nodes(X, u=length * torch.rand_like(X) / 100)
+            material = BasicMaterial(lambda e: young * e, density)
+            model = Model(nodes, fuse=fuse)
+            model.elements = [
+                Truss(torch.tensor([[k, k + 1]]), nodes, area * (k + 1), material)
+                for k in range(count)
+            ]
+            model.loads.append(PointLoad(nodes, count, [young * area, 0.0]))
+            return model
+
+        return build
+
+    def test_matches_separate_groups(self, build):
+        fused, separate = build(True), build(False)
+        assert len(fused.fused_elements()) == 1
+        assert len(separate.fused_elements()) == 6
+        assert torch.allclose(fused.force(), separate.force())
+        assert torch.allclose(fused.mass(), separate.mass())
+        for els, reference in zip(fused.elements, separate.elements):
+            assert torch.allclose(els.strain, reference.strain)
+            assert torch.allclose(els.stress, reference.stress)
+
+    def test_rebuilt_when_groups_change(self, build):
+        model = build(True)
+        fused = model.fused_elements()
+        assert model.fused_elements() is fused
+        force = model.internal_force().clone()
+        model.elements[2].area = model.elements[2].area * 2
+        assert model.fused_elements() is not fused
+        assert not torch.equal(model.internal_force(), force)
+
+    def test_rebuilt_when_the_list_changes(self, build, young):
+        model = build(True)
+        fused = model.fused_elements()
+        model.elements.append(model.elements.pop(0))
+        assert model.fused_elements() is not fused
+        model.elements[0].material = BasicMaterial(lambda e: 2 * young * e)
+        assert len(model.fused_elements()) == 2
+
+    def test_not_rebuilt_by_evaluations(self, build):
+        model = build(True)
+        model.acceleration()
+        revisions = [els.revision for els in model.elements]
+        fused = model.fused_elements()
+        for _ in range(2):
+            model.acceleration()
+            model.stable_time_step()
+        assert [els.revision for els in model.elements] == revisions
+        assert model.fused_elements() is fused
+
+    def test_not_rebuilt_by_other_models(self, build):
+        first, second = build(True), build(True)
+        fused = first.fused_elements(), second.fused_elements()
+        for _ in range(2):
+            first.force()
+            second.force()
+            second.elements[0].area = second.elements[0].area * 2
+        assert first.fused_elements() is fused[0]
+        assert second.fused_elements() is not fused[1]
+
+    def test_follows_material_changes(self, build, young):
+        model = build(True)
+        for k, els in enumerate(model.elements):
+            els.material = Elastic1D(young * (k + 1), els.material.density)
+        assert len(model.fused_elements()) == 1
+        model.internal_force()
+        force = model.internal_force().clone()
+        material = model.elements[3].material
+        material.E = material.E * 2
+        stiffer = model.internal_force().clone()
+        assert not torch.equal(stiffer, force)
+        material.E.mul_(2)
+        assert not torch.equal(model.internal_force(), stiffer)
+        reference = build(False)
+        for k, els in enumerate(reference.elements):
+            els.material = Elastic1D(young * (k + 1), els.material.density)
+        reference.elements[3].material.E *= 4
+        assert torch.allclose(model.internal_force(), reference.internal_force())
+
+    def test_accumulates_in_one_buffer(self, build):
+        model = build(True)
+        out = torch.ones_like(model.nodes.X)
+        force = model.internal_force(out, accumulate=True)
+        assert force is out
+        assert torch.allclose(force, build(False).internal_force() + 1)
@@ -1,3 +1,4 @@
+import numpy as np
 import torch
 
 from vibrant.nodes import Nodes
@@ -20,3 +21,10 @@ class TestNodes:
         assert torch.allclose(nodes.x(), nodes.X)
         nodes.u = torch.rand(10, 2)
         assert torch.allclose(nodes.x(), nodes.X + nodes.u)
+
+    def test_arrays_share_memory(self):
+        X = np.zeros((3, 2))
+        nodes = Nodes(X, u=np.ones((3, 2)))
+        X[0, 0] = 1
+        assert nodes.X[0, 0] == 1
+        assert nodes.u.dtype == torch.float64
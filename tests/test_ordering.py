@@ -0,0 +1,48 @@
+import pytest
+import torch
+
+from vibrant.ordering import (
+    bandwidth,
+    hilbert_order,
+    inverse_permutation,
+    reverse_cuthill_mckee,
+)
+
+
+@pytest.fixture
+def shuffled_chain():
+    """A chain of bars with randomly numbered nodes."""
+    torch.manual_seed(100)
+    labels = torch.randperm(50)
+    return torch.stack((labels[:-1], labels[1:]), 1)
+
+
+def test_inverse_permutation():
+    order = torch.randperm(10)
+    assert torch.equal(order[inverse_permutation(order)], torch.arange(10))
+
+
+def test_rcm_is_a_permutation(shuffled_chain):
+    order = reverse_cuthill_mckee([shuffled_chain], 52)
+    assert torch.equal(order.sort().values, torch.arange(52))
+
+
+def test_rcm_minimizes_chain_bandwidth(shuffled_chain):
+    assert bandwidth([shuffled_chain]) > 1
+    order = reverse_cuthill_mckee([shuffled_chain], 50)
+    assert bandwidth([shuffled_chain], order) == 1
+
+
+def test_hilbert_visits_neighbouring_cells():
+    side = 16
+    axis = torch.arange(side)
+    grid = torch.stack(torch.meshgrid(axis, axis, indexing="ij"), -1)
+    X = grid.reshape(-1, 2)[torch.randperm(side ** 2)].double()
+    order = hilbert_order(X, bits=4)
+    steps = (X[order][1:] - X[order][:-1]).abs().sum(1)
+    assert torch.all(steps == 1)
+
+
+def test_hilbert_rejects_too_many_bits():
+    with pytest.raises(ValueError):
+        hilbert_order(torch.rand(5, 3), bits=21)
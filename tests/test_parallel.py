@@ -0,0 +1,150 @@
+import copy
+from contextlib import nullcontext
+
+import pytest
+import torch
+import torch.multiprocessing as mp
+
+from vibrant.elements import Hex8, Quad4, Truss
+from vibrant.materials import (
+    Elastic1D,
+    ElastoPlastic1D,
+    IsotropicPS,
+    J2Plasticity3D,
+)
+from vibrant.models import Model
+from vibrant.nodes import Nodes
+from vibrant.parallel import PartitionedModel, partition_elements
+from vibrant.solvers import CentralDifference
+
+pytestmark = pytest.mark.skipif(
+    "fork" not in mp.get_all_start_methods(), reason="requires the fork start method"
+)
+
+
+def grid(n):
+    """The nodes and the horizontal and vertical bars of a square grid."""
+    X = torch.stack(
+        torch.meshgrid(torch.arange(n + 0.0), torch.arange(n + 0.0), indexing="ij"), -1
+    )
+    ids = torch.arange(n * n).view(n, n)
+    conn = torch.cat(
+        (
+            torch.stack((ids[:-1].reshape(-1), ids[1:].reshape(-1)), 1),
+            torch.stack((ids[:, :-1].reshape(-1), ids[:, 1:].reshape(-1)), 1),
+        )
+    )
+    quads = torch.stack(
+        (ids[:-1, :-1], ids[1:, :-1], ids[1:, 1:], ids[:-1, 1:]), -1
+    ).reshape(-1, 4)
+    return X.reshape(-1, 2).double(), conn, quads
+
+
+@pytest.fixture
+def model():
+    torch.manual_seed(100)
+    X, conn, quads = grid(12)
+    nodes = Nodes(X, u=torch.rand_like(X) / 100)
+    count = len(conn)
+    material = Elastic1D(torch.rand(count).double() + 1, torch.rand(count).double() + 1)
+    bars = Truss(conn, nodes, torch.rand(count).double() + 1, material)
+    plates = Quad4(quads, nodes, IsotropicPS(torch.rand(len(quads)) + 1, 0.3), 0.1)
+    model = Model(nodes, bars)
+    model.elements.append(plates.to(torch.double))
+    return model
+
+
+class TestPartitionElements:
+    def test_balanced_and_compact(self):
+        X, conn, _ = grid(20)
+        (labels,) = partition_elements([Truss(conn)], X, 4)
+        assert torch.bincount(labels).tolist() == [len(conn) // 4] * 4
+        # compact partitions share about one grid line of nodes each
+        shared = sum(len(conn[labels == i].unique()) for i in range(4)) - len(X)
+        assert shared < 3 * 20
+
+    def test_several_groups(self):
+        X, conn, quads = grid(6)
+        labels = partition_elements([Truss(conn), Quad4(quads)], X, 3)
+        assert [len(label) for label in labels] == [len(conn), len(quads)]
+        counts = torch.cat(labels).bincount()
+        assert counts.sum() == len(conn) + len(quads)
+        assert counts.max() - counts.min() <= 1
+
+
+class TestPartitionedModel:
+    def test_matches_serial_forces(self, model):
+        expected = model.internal_force().clone()
+        with PartitionedModel(model, 3) as partitioned:
+            assert model.executor is partitioned
+            assert torch.allclose(model.internal_force(), expected)
+            model.nodes.u.mul_(2)
+            force = model.internal_force()
+        assert model.executor is None
+        assert torch.allclose(force, model.internal_force())
+
+    def test_matches_serial_dynamics(self, model):
+        model.nodes.u.zero_()
+        model.nodes.v[:, 0] = torch.linspace(-1, 1, len(model.nodes))
+        reference = copy.deepcopy(model)
+        CentralDifference(reference).run(0.5, dt=0.01)
+        with PartitionedModel(model, 2):
+            CentralDifference(model).run(0.5, dt=0.01)
+        assert torch.allclose(model.nodes.u, reference.nodes.u)
+
+    def test_commits_the_workers(self):
+        X, conn, _ = grid(6)
+        nodes = Nodes(X)
+        stretch = torch.zeros_like(X)
+        stretch[:, 0] = X[:, 0] / 10
+
+        def force(partitioned):
+            material = ElastoPlastic1D(100.0, 1.0).to(torch.double)
+            model = Model(nodes, Truss(conn, nodes, 1.0, material))
+            with PartitionedModel(model, 2) if partitioned else nullcontext():
+                nodes.u = stretch.clone()
+                model.internal_force()
+                model.commit()
+                nodes.u = torch.zeros_like(X)
+                return model.internal_force().clone()
+
+        # the unloaded bars keep a residual stress
+        residual = force(False)
+        assert residual.abs().max() > 0
+        assert torch.allclose(force(True), residual)
+
+    def test_returns_the_internal_variables(self):
+        # a row of hexahedra, with bars along its edges
+        n = 8
+        ids = torch.arange((n + 1) * 4).view(n + 1, 2, 2)
+        X = torch.stack(torch.meshgrid(*map(torch.arange, ids.size()), indexing="ij"))
+        X = X.reshape(3, -1).T.double()
+        corners = [(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0)]
+        corners += [(i, j, 1) for i, j, _ in corners]
+        hexes = torch.stack([ids[i : n + i, j, k] for i, j, k in corners], -1)
+        bars = torch.stack((ids[:-1].reshape(-1), ids[1:].reshape(-1)), 1)
+
+        def stretch(partitioned):
+            nodes = Nodes(X)
+            model = Model(nodes, Truss(bars, nodes, 1.0, ElastoPlastic1D(100.0, 1.0)))
+            model.elements.append(Hex8(hexes, nodes, J2Plasticity3D(100.0, 0.3, 1.0)))
+            model.to(torch.double)
+            with PartitionedModel(model, 3) if partitioned else nullcontext():
+                nodes.u[:, 0] = X[:, 0] * torch.linspace(0.01, 0.1, len(X)).double()
+                model.internal_force()
+                model.commit()
+            return [els.material for els in model.elements]
+
+        for material, expected in zip(stretch(True), stretch(False)):
+            assert expected.committed["equivalent_plastic_strain"].max() > 0
+            for name, value in expected.committed.items():
+                assert torch.allclose(material.committed[name], value)
+                assert torch.equal(material.trial[name], material.committed[name])
+
+    def test_differentiable_forces_are_serial(self, model):
+        with PartitionedModel(model, 2):
+            u = model.nodes.u.clone().requires_grad_()
+            model.nodes.u = u
+            model.internal_force().sum().backward()
+        assert u.grad is not None
+
@@ -0,0 +1,121 @@
+import json
+
+import pytest
+import torch
+
+from vibrant.constraints import Prescribe
+from vibrant.elements import Truss
+from vibrant.loads import Gravity
+from vibrant.materials import Elastic1D
+from vibrant.models import Model
+from vibrant.nodes import Nodes
+from vibrant.profiling import NULL_PHASE, Profiler
+
+
+@pytest.fixture
+def model():
+    X = torch.tensor([[0.0, 0.0], [1.0, 0.0], [1.0, 1.0], [0.0, 1.0]]).double()
+    nodes = Nodes(X, u=torch.rand(4, 2).double() / 100)
+    conn = torch.tensor([[0, 1], [1, 2], [2, 3], [3, 0]])
+    model = Model(nodes, Truss(conn, nodes, 2.0, Elastic1D(10.0).to(torch.double)))
+    model.loads.append(Gravity([0.0, -10.0]))
+    model.constraints.append(Prescribe(nodes, [0], 0.0, "f"))
+    model.damping = 0.1
+    return model
+
+
+class TestProfiler:
+    def test_records_calls_time_and_bytes(self):
+        profiler = Profiler()
+        for _ in range(3):
+            with profiler.phase("outer"):
+                with profiler.phase("inner") as phase:
+                    phase.output(torch.zeros(10, dtype=torch.double), None)
+        totals = profiler.totals()
+        assert totals["outer"][0] == totals["inner"][0] == 3
+        assert totals["outer"][1] >= totals["inner"][1] > 0
+        assert totals["inner"][2] == 3 * 80
+        assert totals["outer"][2] == 0
+
+    def test_summary(self):
+        profiler = Profiler()
+        with profiler.phase("elements/0:Truss"):
+            pass
+        lines = profiler.summary().splitlines()
+        assert lines[0].split()[:2] == ["phase", "calls"]
+        assert lines[1].split()[:2] == ["elements/0:Truss", "1"]
+
+    def test_chrome_trace(self, tmp_path):
+        profiler = Profiler()
+        with profiler.phase("outer"):
+            with profiler.phase("inner"):
+                pass
+        path = tmp_path / "trace.json"
+        profiler.chrome_trace(path)
+        with open(path) as file:
+            events = {event["name"]: event for event in json.load(file)["traceEvents"]}
+        assert {event["ph"] for event in events.values()} == {"X"}
+        inner, outer = events["inner"], events["outer"]
+        assert outer["ts"] <= inner["ts"]
+        assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+
+    def test_without_trace(self):
+        profiler = Profiler(trace=False)
+        with profiler.phase("phase"):
+            pass
+        assert profiler.totals()["phase"][0] == 1
+        assert profiler.chrome_trace()["traceEvents"] == []
+
+    def test_reset(self):
+        profiler = Profiler()
+        with profiler.phase("phase"):
+            pass
+        profiler.reset()
+        assert profiler.totals() == {}
+        assert profiler.summary().splitlines()[1:] == []
+
+
+class TestModelProfiling:
+    def test_phases(self, model):
+        with model.profile() as profiler:
+            model.acceleration()
+            model.acceleration()
+        totals = profiler.totals()
+        for name in (
+            "acceleration",
+            "force",
+            "elements/0:Truss",
+            "loads/table",
+            "damping",
+            "constraints/f",
+        ):
+            assert totals[name][0] == 2, name
+        assert totals["mass"][0] == 1
+        # strain and stress of 4 bars in double precision
+        assert totals["elements/0:Truss"][2] == 2 * 2 * 4 * 8
+
+    def test_results_are_unchanged(self, model):
+        expected = model.acceleration().clone()
+        with model.profile():
+            assert torch.equal(model.acceleration(), expected)
+
+    def test_disabled_by_default(self, model):
+        model.acceleration()
+        assert model.profiler is None
+        assert model._phase("elements/{}:{.__name__}", 0, Truss) is NULL_PHASE
+
+    def test_context_restores_the_profiler(self, model):
+        profiler = Profiler()
+        model.profiler = profiler
+        with model.profile() as inner:
+            model.force()
+        assert model.profiler is profiler
+        assert profiler.totals() == {}
+        assert "force" in inner.totals()
+
+    def test_constructor_option(self, model):
+        profiled = Model(model.nodes, model.elements[0], profile=True)
+        profiled.force()
+        assert "elements/0:Truss" in profiled.profiler.totals()
+        profiler = Profiler()
+        assert Model(model.nodes, profile=profiler).profiler is profiler
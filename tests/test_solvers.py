@@ -0,0 +1,241 @@
+from math import cos, pi, sin
+
+import pytest
+import torch
+
+from vibrant.constraints import ImposeVelocity, Prescribe
+from vibrant.elements import Truss
+from vibrant.loads import NodalLoad
+from vibrant.materials import BasicMaterial
+from vibrant.models import Model
+from vibrant.nodes import Nodes
+from vibrant.solvers import CentralDifference, MatrixFreeNewton, ModalDynamics
+
+
+class TestCentralDifference:
+    @pytest.fixture
+    def bar(self, young, density, area, length):
+        """A bar clamped at node 0 with an initial stretch at node 1."""
+        X = torch.tensor([[0.0, 0.0], [length, 0.0]], dtype=torch.double)
+        u = torch.tensor([[0.0, 0.0], [length * 1e-4, 0.0]], dtype=torch.double)
+        nodes = Nodes(X, u)
+        mat = BasicMaterial(lambda e: young * e, density)
+        conn = torch.tensor([[0, 1]], dtype=int)
+        model = Model(nodes, Truss(conn, nodes, area, mat))
+        model.constraints.append(ImposeVelocity(nodes, [0], [0.0, 0.0]))
+        return model
+
+    @pytest.fixture
+    def omega(self, young, density, length):
+        """Natural frequency of a bar with lumped mass at the free end."""
+        return (2 * young / density) ** 0.5 / length
+
+    def test_matches_analytic_oscillation(self, bar, omega, length):
+        period = 2 * pi / omega
+        solver = CentralDifference(bar)
+        solver.run(period / 3, period / 1000)
+        expected = length * 1e-4 * cos(omega * bar.time)
+        assert bar.nodes.u[1, 0].item() == pytest.approx(expected, rel=1e-3)
+        assert bar.nodes.u[1, 1].item() == pytest.approx(0)
+
+    def test_state_is_updated_in_place(self, bar, omega):
+        u, v = bar.nodes.u, bar.nodes.v
+        solver = CentralDifference(bar)
+        solver.run(1 / omega, 0.01 / omega)
+        assert bar.nodes.u is u
+        assert bar.nodes.v is v
+        assert solver.steps == 100
+
+    def test_buffers_are_reused(self, bar, omega, young, area):
+        bar.damping = 0.1 * omega
+        bar.loads.append(TipLoad(bar.nodes, 1e-3 * young * area))
+        bar.loads.append(NodalLoad(bar.nodes, [1], [0.0, 1e-3 * young * area]))
+        solver = CentralDifference(bar)
+        solver.step(0.01 / omega)
+        f, a = solver.f, solver.a
+        pointers = f.data_ptr(), a.data_ptr()
+        for _ in range(3):
+            solver.step(0.01 / omega)
+        assert solver.f is f and solver.a is a
+        assert (f.data_ptr(), a.data_ptr()) == pointers
+        assert bar.nodes.f is f
+        solver.acceleration()
+        assert torch.allclose(f.clone(), bar.force())
+
+    def test_constrained_node_does_not_move(self, bar, omega):
+        CentralDifference(bar).run(1 / omega, 0.01 / omega)
+        assert torch.allclose(bar.nodes.u[0], torch.zeros(2, dtype=torch.double))
+        assert torch.allclose(bar.nodes.v[0], torch.zeros(2, dtype=torch.double))
+
+    def test_inverse_mass_is_cached(self, bar):
+        solver = CentralDifference(bar)
+        inv_mass = solver.inverse_mass()
+        assert solver.inverse_mass() is inv_mass
+        assert torch.allclose(inv_mass * bar.mass(), torch.ones_like(inv_mass))
+
+    def test_stable_time_step_is_stable(self, bar, omega, young, density, length):
+        solver = CentralDifference(bar, safety=0.9, update_interval=10)
+        solver.run(50 / omega)
+        assert solver.dt == pytest.approx(
+            0.9 * length / (young / density) ** 0.5, rel=1e-3
+        )
+        assert bar.nodes.u[1, 0].abs().item() < 1.1 * length * 1e-4
+
+
+class TestMatrixFreeNewton:
+    @pytest.fixture
+    def arch(self, young, area, length):
+        """Two inclined bars joined at the top, with one support pulled outwards."""
+        X = length * torch.tensor([[0, 0], [2, 0], [1, 1]], dtype=torch.double)
+        nodes = Nodes(X)
+        nodes.u[1, 0] = 0.01 * length
+        conn = torch.tensor([[0, 2], [1, 2]])
+        material = BasicMaterial(lambda e: young * e + 10 * young * e ** 2)
+        model = Model(nodes, Truss(conn, nodes, area, material))
+        model.constraints.append(ImposeVelocity(nodes, [0, 1], [0.0, 0.0]))
+        return model
+
+    @pytest.mark.parametrize("preconditioner", ["stiffness", "mass", None])
+    def test_matches_sparse_newton(self, arch, preconditioner, length):
+        u = arch.nodes.u
+        solution = MatrixFreeNewton(arch, preconditioner).solve()
+        assert solution.converged
+        assert arch.nodes.u is u
+        assert not arch.nodes.u.requires_grad
+        matrix_free = arch.nodes.u.clone()
+        arch.nodes.u[2] = 0
+        assert arch.solve_static().converged
+        assert torch.allclose(matrix_free, arch.nodes.u, atol=1e-8 * length)
+        assert matrix_free[1, 0].item() == pytest.approx(0.01 * length)
+
+    def test_unknown_preconditioner_fails(self, arch):
+        with pytest.raises(ValueError):
+            MatrixFreeNewton(arch, "ilu")
+
+
+class TipLoad:
+    def __init__(self, nodes, value):
+        self.nodes = nodes
+        self.value = value
+
+    def force(self):
+        force = torch.zeros_like(self.nodes.X)
+        force[-1] = self.value
+        return force
+
+
+class TestModalDynamics:
+    @pytest.fixture
+    def bar(self, young, density, area, length):
+        """A clamped-free bar along a 1D axis, split in 20 elements."""
+        elements = 20
+        X = torch.linspace(0, length, elements + 1, dtype=torch.double)[:, None]
+        nodes = Nodes(X)
+        conn = torch.stack((torch.arange(elements), torch.arange(1, elements + 1)), 1)
+        material = BasicMaterial(lambda e: young * e, density)
+        model = Model(nodes, Truss(conn, nodes, area, material))
+        model.constraints.append(ImposeVelocity(nodes, [0], [0.0]))
+        return model
+
+    def test_free_vibration_of_a_mode(self, bar):
+        torch.manual_seed(100)
+        modes = bar.modes(3)
+        omega, shape = modes.omega[1].item(), modes.shapes[1]
+        bar.nodes.v.copy_(shape)
+        solver = ModalDynamics(bar, modes=modes)
+        solver.run([1 / omega, 2 / omega])
+        assert bar.time == pytest.approx(2 / omega)
+        expected = shape * sin(2) / omega
+        atol = 1e-8 * expected.abs().max().item()
+        assert torch.allclose(bar.nodes.u, expected, atol=atol)
+
+    @pytest.mark.parametrize("damping", [0, 0.1])
+    def test_matches_central_difference(self, bar, damping, young, area, length):
+        bar.damping = damping * bar.stable_time_step().dt ** -1
+        bar.loads.append(TipLoad(bar.nodes, 1e-3 * young * area))
+        explicit = CentralDifference(bar)
+        t_end = 200 * explicit.stable_time_step()
+        explicit.run(t_end, 0.05 * explicit.dt)
+        reference = bar.nodes.u.clone()
+        bar.nodes.u.zero_()
+        bar.nodes.v.zero_()
+        bar.time = 0
+        ModalDynamics(bar, k=20).run([t_end])
+        atol = 1e-2 * reference.abs().max().item()
+        assert torch.allclose(bar.nodes.u, reference, atol=atol)
+
+
+class TestPrecision:
+    @staticmethod
+    def chain(dtype, accumulate_dtype):
+        """A clamped chain of bars, far from the origin, vibrating in its first mode."""
+        count = 20
+        X = 10 * torch.stack((torch.arange(count + 1.0), torch.zeros(count + 1)), 1)
+        nodes = Nodes(X.double() + 1000)
+        shape = torch.sin(pi * torch.arange(count + 1.0) / count / 2)
+        nodes.v[:, 0] = 1e-3 * shape
+        conn = torch.stack((torch.arange(count), torch.arange(1, count + 1)), 1)
+        material = BasicMaterial(lambda e: 200 * e, 3.0)
+        model = Model(nodes, Truss(conn, nodes, 1.0, material))
+        model.constraints.append(ImposeVelocity(nodes, [0], [0.0, 0.0]))
+        return model.to(dtype, accumulate_dtype)
+
+    @staticmethod
+    def energy(model):
+        """The kinetic and strain energy, evaluated in double precision."""
+        nodes, els = model.nodes, model.elements[0]
+        kinetic = (model.mass().double() * nodes.v.double() ** 2).sum() / 2
+        X, u = nodes.X.double(), nodes.u.double()
+        first, last = els.conn.T
+        L0 = (X[last] - X[first]).norm(dim=1)
+        L = (X[last] + u[last] - X[first] - u[first]).norm(dim=1)
+        return kinetic.item() + (100 * (L - L0) ** 2 / L0).sum().item()
+
+    def energy_error(self, dtype, accumulate_dtype, dt, steps=2000):
+        """The largest energy difference with a double precision run."""
+        models = [self.chain(dtype, accumulate_dtype), self.chain(torch.double, None)]
+        solvers = [CentralDifference(model) for model in models]
+        error = 0
+        for step in range(steps):
+            for solver in solvers:
+                solver.step(dt)
+            if step % 100 == 99:
+                energy, reference = map(self.energy, models)
+                error = max(error, abs(energy - reference) / reference)
+        return error
+
+    def test_policy_is_propagated(self):
+        model = self.chain(torch.float32, torch.float64)
+        assert model.nodes.X.dtype == model.nodes.u.dtype == torch.float64
+        assert model.constraints[0].velocity.dtype == torch.float64
+        assert model.force().dtype == torch.float64
+        assert model.mass().dtype == torch.float64
+        assert model.elements[0].strain.dtype == torch.float32
+        assert model.elements[0].reference().Xdiff.dtype == torch.float32
+
+    def test_double_accumulation_reduces_energy_drift(self):
+        dt = 0.5 * self.chain(torch.double, None).stable_time_step().dt
+        single = self.energy_error(torch.float32, None, dt)
+        mixed = self.energy_error(torch.float32, torch.float64, dt)
+        assert single < 1e-5
+        assert mixed < single / 3
+
+
+class TestPrescribedMotion:
+    def test_prescribed_displacement_and_direction(self, young, density, area, length):
+        """A bar pulled at a constant rate, whose free end can only move along x."""
+        X = torch.tensor([[0.0, 0.0], [length, 0.0]], dtype=torch.double)
+        nodes = Nodes(X)
+        material = BasicMaterial(lambda e: young * e, density)
+        model = Model(nodes, Truss(torch.tensor([[0, 1]]), nodes, area, material))
+        rate = 1e-4 * length
+        model.constraints.append(Prescribe(nodes, [0], lambda t: [-rate * t, 0], "u"))
+        model.constraints.append(Prescribe(nodes, [0], [-rate, 0.0], "v"))
+        model.constraints.append(Prescribe(nodes, [1], 0.0, "a", components=[1]))
+        nodes.v[1, 1] = 1.0
+        solver = CentralDifference(model)
+        solver.run(10 * solver.stable_time_step())
+        assert nodes.u[0, 0].item() == pytest.approx(-rate * model.time)
+        assert nodes.v[1, 1].item() == pytest.approx(1.0)
+        assert nodes.u[1, 1].item() == pytest.approx(model.time)
+        assert model.constrained_dofs().tolist() == [[True, True], [False, True]]
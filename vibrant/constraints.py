@@ -1,16 +1,195 @@
+"""
+Constraints.
+
+A constraint prescribes the value of a nodal field, "u", "v", "a" or "f", on some
+    degrees of freedom. The `Prescribe` constraints of a model are compiled into a
+    `ConstraintTable`, which applies all the constraints of a field with a single
+    indexed write.
+"""
+
 import torch
 
+from vibrant.math_extensions import as_index
+
+
+FIELDS = ("u", "v", "a", "f")
 
-class ImposeVelocity:
-    """Constrain the velocity of nodes to a specified value."""
 
-    def __init__(self, nodes, node_ids, velocity):
+class Prescribe:
+    """Prescribe the value of a nodal field on some degrees of freedom.
+
+    The node ids are converted once into a compact tensor, which is checked against
+        the nodes, so they are not converted at every application.
+
+    Args:
+        nodes (Nodes): the nodes of the model.
+        node_ids (sequence, slice, array or tensor): the constrained nodes.
+        value (float, tensor or callable): the prescribed value. It broadcasts
+            against `(len(node_ids), len(components))`. A callable is called with the
+            time and returns such a value.
+        field (str): the constrained field, "u", "v", "a" or "f".
+        components (sequence): the constrained components, for example `[1]` to
+            constrain only the y direction. All of them by default.
+    """
+
+    def __init__(self, nodes, node_ids, value, field="v", components=None):
+        if field not in FIELDS:
+            raise ValueError(f"Unknown field {field}.")
         self.nodes = nodes
         self.node_ids = node_ids
-        self.velocity = torch.as_tensor(velocity)
-        if not torch.is_floating_point(self.velocity):
-            self.velocity = torch.as_tensor(velocity, dtype=torch.float)
+        self.field = field
+        if components is None:
+            components = range(nodes.X.size(1))
+        self.components = torch.as_tensor(components, dtype=torch.long)
+        self.value = value
+        if not callable(value):
+            self.value = torch.as_tensor(value)
+            if not torch.is_floating_point(self.value):
+                self.value = self.value.to(nodes.X.dtype)
+
+    @property
+    def node_ids(self):
+        """The ids of the constrained nodes, as a tensor."""
+        return self._node_ids
+
+    @node_ids.setter
+    def node_ids(self, node_ids):
+        node_ids = as_index(node_ids, len(self.nodes))
+        self._node_ids = node_ids.to(self.nodes.X.device)
+
+    def value_at(self, time):
+        """Evaluate the prescribed value, with shape `(nodes, components)`."""
+        value = self.value(time) if callable(self.value) else self.value
+        value = torch.as_tensor(value, dtype=self.nodes.X.dtype)
+        shape = (len(self.node_ids), len(self.components))
+        return value.expand(shape)
+
+    def __call__(self, field="v", time=0, target=None):
+        """Apply the constraint on its own, if it constrains `field`."""
+        if field == self.field:
+            target = getattr(self.nodes, field) if target is None else target
+            rows = self.node_ids[:, None]
+            value = self.value_at(time).to(target.dtype)
+            target[..., rows, self.components] = value
+
+    def to(self, dtype):
+        """Cast a constant prescribed value to `dtype` and return the constraint."""
+        if torch.is_tensor(self.value):
+            self.value = self.value.to(dtype)
+        return self
+
+    def state_dict(self):
+        state = {"node_ids": self.node_ids, "components": self.components}
+        if torch.is_tensor(self.value):
+            state["value"] = self.value
+        return state
+
+    def load_state_dict(self, state):
+        self.node_ids = state["node_ids"]
+        self.components = state["components"]
+        if "value" in state:
+            self.value = state["value"]
+
+    def mark(self, mask):
+        """Flag the constrained degrees of freedom in a `(nodes, dim)` boolean mask.
+
+        Prescribed forces do not constrain the motion, so they are not flagged.
+        """
+        if self.field != "f":
+            mask[self.node_ids[:, None], self.components] = True
+
+
+class ImposeVelocity(Prescribe):
+    """Constrain the velocity of nodes to a specified value.
+
+    Args:
+        nodes (Nodes): the nodes of the model.
+        node_ids (sequence, slice, array or tensor): the constrained nodes.
+        velocity (float, tensor or callable): the prescribed velocity.
+        components (sequence): the constrained components. All of them by default.
+    """
+
+    def __init__(self, nodes, node_ids, velocity, components=None):
+        super().__init__(nodes, node_ids, velocity, "v", components)
+
+    @property
+    def velocity(self):
+        """The prescribed velocity."""
+        return self.value
+
+    @velocity.setter
+    def velocity(self, velocity):
+        self.value = velocity
+
+
+class ConstraintTable:
+    """`Prescribe` constraints compiled into one index and value table per field.
+
+    The prescribed values of each field are gathered in a single vector, indexed by
+        the flattened degrees of freedom, so a whole field is constrained with one
+        indexed write, whatever the number of constraints and constrained
+        components. When several constraints act on the same degree of freedom, the
+        last one prevails. Only the time dependent values are evaluated at every
+        application.
+
+    Args:
+        constraints (iterable): the `Prescribe` constraints.
+        shape (tuple): the `(nodes, dim)` shape of the nodal fields.
+        dtype: the dtype of the prescribed values.
+        device: the device of the nodal fields.
+    """
+
+    def __init__(self, constraints, shape, dtype=None, device=None):
+        self.tables = {}
+        constraints = list(constraints)
+        for field in FIELDS:
+            group = [c for c in constraints if c.field == field]
+            if group:
+                self.tables[field] = self._compile(group, shape, dtype, device)
+
+    @staticmethod
+    def _compile(group, shape, dtype, device):
+        owner = torch.full(shape, -1, dtype=torch.long, device=device)
+        table = torch.zeros(shape, dtype=dtype, device=device)
+        blocks = []
+        for k, constraint in enumerate(group):
+            rows = constraint.node_ids.to(device)[:, None]
+            cols = constraint.components.to(device)
+            owner[rows, cols] = k
+            if not callable(constraint.value):
+                table[rows, cols] = constraint.value_at(None).to(table)
+            blocks.append((rows, cols))
+        owner = owner.reshape(-1)
+        (index,) = torch.nonzero(owner >= 0, as_tuple=True)
+        values = table.reshape(-1)[index]
+        dynamic = []
+        for k, constraint in enumerate(group):
+            if callable(constraint.value):
+                rows, cols = blocks[k]
+                local = torch.full(shape, -1, dtype=torch.long, device=device)
+                block = torch.arange(rows.numel() * cols.numel(), device=device)
+                local[rows, cols] = block.view(-1, len(cols))
+                (positions,) = torch.nonzero(owner[index] == k, as_tuple=True)
+                local = local.reshape(-1)[index[positions]]
+                dynamic.append((constraint, positions, local))
+        return index, values, dynamic
+
+    def fields(self):
+        """Get the constrained fields."""
+        return tuple(self.tables)
+
+    def apply(self, field, target, time=0):
+        """Write the prescribed values of `field` in `target`, in place.
 
-    def __call__(self, field="v"):
-        if field == "v":
-            self.nodes.v[self.node_ids] = self.velocity
+        Args:
+            field (str): the field, "u", "v", "a" or "f".
+            target (tensor): the field values, with shape `(..., nodes, dim)`.
+            time (float): the time at which the prescribed values are evaluated.
+        """
+        if field not in self.tables:
+            return
+        index, values, dynamic = self.tables[field]
+        for constraint, positions, local in dynamic:
+            value = constraint.value_at(time).reshape(-1)
+            values[positions] = value[local].to(values.dtype)
+        target.view(*target.size()[:-2], -1)[..., index] = values
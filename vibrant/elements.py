@@ -1,46 +1,821 @@
+import copy
+import functools
+import warnings
+from collections import namedtuple
+
 import torch
 
-from vibrant.math_extensions import assemble
+from vibrant.math_extensions import (
+    Assembler,
+    SparseAssembler,
+    as_index,
+    concatenate_elements,
+    element_pattern,
+    permute_elements,
+    select_elements,
+)
+
+
+TrussReference = namedtuple(
+    "TrussReference", ["X", "Xdiff", "L0", "inv_L0", "area_inv_L0"]
+)
+TrussReference.__doc__ = """Reference geometry of truss elements.
+
+Attributes:
+    X (tensor): the reference positions the geometry was computed from.
+    Xdiff (tensor): the reference element vectors, from the first to the last node.
+    L0 (tensor): the reference lengths.
+    inv_L0 (tensor): the inverse of the reference lengths.
+    area_inv_L0 (tensor): the area divided by the reference length.
+"""
+
+
+ContinuumReference = namedtuple(
+    "ContinuumReference",
+    ["X", "N", "dNdX", "dNdX_flat", "measure", "weights", "characteristic_length"],
+)
+ContinuumReference.__doc__ = """Reference geometry of continuum elements.
+
+Attributes:
+    X (tensor): the reference positions the geometry was computed from.
+    N (tensor): the shape functions at the integration points, `(points, nodes)`.
+    dNdX (tensor): the shape function gradients in the reference configuration,
+        `(elements, points, nodes, dim)`.
+    dNdX_flat (tensor): the same gradients with the nodes first, as a contiguous
+        `(elements, nodes, points * dim)` tensor, of which `dNdX` is a view. Each
+        element contracts all its points with one matrix product.
+    measure (tensor): the integration weights times the jacobian determinant,
+        `(elements, points)`. For 2D elements it does not include the thickness.
+    weights (tensor): the measure, times the thickness of 2D elements.
+    characteristic_length (tensor): the length used for the critical time step.
+"""
+
+# Voigt components as pairs of tensor indices, with the shears ordered yz, xz, xy
+VOIGT_ROWS = {2: (0, 1, 0), 3: (0, 1, 2, 1, 0, 0)}
+VOIGT_COLS = {2: (0, 1, 1), 3: (0, 1, 2, 2, 2, 1)}
+# Voigt component of each entry of a symmetric tensor
+VOIGT_INDEX = {2: ((0, 2), (2, 1)), 3: ((0, 5, 4), (5, 1, 3), (4, 3, 2))}
+
+
+@functools.lru_cache(maxsize=None)
+def voigt_indices(dim, device):
+    """Get the voigt rows, columns and index as tensors, built once per device.
+
+    Args:
+        dim (int): the dimension, 2 or 3.
+        device: the device of the tensors.
+    Returns:
+        (tensor, tensor, tensor): `VOIGT_ROWS`, `VOIGT_COLS` and `VOIGT_INDEX`.
+    """
+    return tuple(
+        torch.tensor(table[dim], device=device)
+        for table in (VOIGT_ROWS, VOIGT_COLS, VOIGT_INDEX)
+    )
+
+
+def truss_strain(Xdiff, du, L, L0, inv_L0):
+    """Compute the strain of truss elements from their relative displacements.
+
+    The elongation `L - L0` is computed as `(L^2 - L0^2) / (L + L0)`, without the
+        cancellation of small strains in low precision.
+
+    Args:
+        Xdiff (tensor): the reference element vectors.
+        du (tensor): the relative displacements of the last to the first node.
+        L, L0 (tensor): the current and reference lengths.
+        inv_L0 (tensor): the inverse of the reference lengths.
+    Returns:
+        tensor: the strain.
+    """
+    return ((2 * Xdiff + du) * du).sum(-1) / (L + L0) * inv_L0
+
+
+def truss_element_forces(u, index, Xdiff, L0, inv_L0, area, material):
+    """Compute the strain, stress and nodal forces of each truss element.
 
+    It goes from the gather of the displacements to the element forces without
+        touching any state, so `torch.compile` can fuse it into few kernels. The
+        displacements are gathered with `index`, the flattened connectivity of the
+        assembler.
 
-class Truss:
-    """Truss elements."""
+    Returns:
+        (tensor, tensor, tensor): the strain, the stress and the element forces,
+            with shape `(..., elements, 2, dim)`.
+    """
+    ue = u[..., index, :].unflatten(-2, (-1, 2))
+    du = ue[..., 1, :] - ue[..., 0, :]
+    xdiff = Xdiff + du
+    L = xdiff.norm(dim=-1)
+    strain = truss_strain(Xdiff, du, L, L0, inv_L0)
+    stress = material(strain)
+    element_forces = (stress * area / L)[..., None] * xdiff
+    return strain, stress, torch.stack((element_forces, -element_forces), dim=-2)
 
-    def __init__(self, conn, nodes=None, area=1, material=None):
+
+def _compile_errors():
+    """Get the exceptions raised when `torch.compile` fails to trace or compile."""
+    try:
+        from torch._dynamo.exc import TorchDynamoException
+        from torch._inductor.exc import CppCompileError
+    except ImportError:
+        return ()
+    return (TorchDynamoException, CppCompileError)
+
+
+class Elements:
+    """Base class of element groups.
+
+    It stores the connectivity, the nodes and the material, and assembles element
+        quantities into nodal vectors and sparse matrices. The data derived from
+        the connectivity is discarded when `conn` is replaced.
+
+    The connectivity is stored as a contiguous int32 tensor, unless the node ids
+        need 64 bits, and NumPy arrays are accepted without a copy. It is checked
+        against the nodes once, when it is assigned. The only other copy is the
+        flattened 64 bit index of the `assembler`, which both gathers the nodal
+        values of the elements and scatters their forces.
+
+    Replacing the connectivity, the nodes, the material or the per element
+        attributes of a group, or changing its precision, increases its counter
+        `revision`, so the merged groups built from it are rebuilt. See `fuse`.
+    """
+
+    element_axis = -1  # the axis of the elements in `strain` and `stress`
+    state_attributes = ("conn",)  # the attributes saved in checkpoints
+    element_attributes = ()  # the attributes that may have one entry per element
+
+    def __init__(self, conn, nodes=None, material=None):
+        self.revision = 0  # increased whenever the group is modified
+        self.nodes = nodes
         self.conn = conn
-        self.area = area
         self.material = material
-        self.nodes = nodes
         self.strain = None
         self.stress = None
+        self.dtype = None
+        self.accumulate_dtype = None
+
+    @property
+    def conn(self):
+        """Connectivity, with the node ids of each element."""
+        return self._conn
+
+    @conn.setter
+    def conn(self, conn):
+        self._conn = as_index(conn, None if self.nodes is None else len(self.nodes))
+        self._reference = None
+        self._assembler = None
+        self._sparse_assembler = None
+        self.modified()
+
+    @property
+    def nodes(self):
+        """The nodes of the model."""
+        return self._nodes
+
+    @nodes.setter
+    def nodes(self, nodes):
+        self._nodes = nodes
+        self.modified()
+
+    @property
+    def material(self):
+        """The material, which maps the strain to the stress."""
+        return self._material
 
-    def force(self):
-        """Compute the nodal force."""
+    @material.setter
+    def material(self, material):
+        self._material = material
+        self.modified()
+
+    def modified(self):
+        """Record that the group changed, so the merged groups are rebuilt."""
+        self.revision += 1
+
+    def permute(self, order):
+        """Reorder the elements, along with their attributes.
+
+        Args:
+            order (tensor): the permutation, such that the new element `i` is the old
+                element `order[i]`. Per element material parameters are reordered
+                too, if the material has a `permute` method.
+        """
+        self.conn = self.conn[order]
+        if hasattr(self.material, "permute"):
+            self.material.permute(order)
+
+    @classmethod
+    def concatenate(cls, groups, material):
+        """Build one group with the elements of several groups of this type.
+
+        Args:
+            groups (sequence): the groups, which share their nodes and precision.
+            material: the material of the concatenated elements.
+        Returns:
+            Elements: the new group. The groups are not modified.
+        """
+        fused = copy.copy(groups[0])
+        counts = [len(els.conn) for els in groups]
+        fused.conn = torch.cat([els.conn for els in groups])
+        for name in cls.element_attributes:
+            values = [getattr(els, name) for els in groups]
+            setattr(fused, name, concatenate_elements(values, counts))
+        fused.material = material
+        fused.strain = fused.stress = None
+        return fused.to(fused.dtype, fused.accumulate_dtype)
+
+    def select(self, index):
+        """Build a group with some of the elements of this group.
+
+        Args:
+            index (tensor): the selected elements.
+        Returns:
+            Elements: the new group. The material is shared, unless it has a
+                `select` method.
+        """
+        selected = copy.copy(self)
+        count = len(self.conn)
+        selected.conn = self.conn[index]
+        for name in self.element_attributes:
+            value = select_elements(getattr(self, name), index, count)
+            setattr(selected, name, value)
+        if hasattr(self.material, "select"):
+            selected.material = self.material.select(index, count)
+        selected.strain = selected.stress = None
+        return selected
+
+    def state_dict(self):
+        """Get the attributes that define the state of the group.
+
+        It includes the state of the material, if it has a `state_dict` method.
+        """
+        state = {name: getattr(self, name) for name in self.state_attributes}
+        if hasattr(self.material, "state_dict"):
+            state["material"] = self.material.state_dict()
+        return state
+
+    def load_state_dict(self, state):
+        """Restore the attributes saved by `state_dict`."""
+        for name in self.state_attributes:
+            setattr(self, name, state[name])
+        if "material" in state:
+            self.material.load_state_dict(state["material"])
+
+    def to(self, dtype=None, accumulate_dtype=None):
+        """Set the precision of the element group.
+
+        Args:
+            dtype: the dtype of the element kernels. The reference geometry, the
+                material parameters and the gathered displacements are cast to it.
+                If it is None, they keep the dtype of the nodes.
+            accumulate_dtype: the dtype of the assembled nodal vectors. By default,
+                `dtype`.
+        Returns:
+            Elements: the element group.
+        """
+        self.dtype = dtype
+        self.accumulate_dtype = dtype if accumulate_dtype is None else accumulate_dtype
+        self._reference = None
+        self._assembler = None
+        self.modified()
+        if dtype is not None and hasattr(self.material, "to"):
+            self.material.to(dtype)
+        return self
+
+    def cast(self, tensor):
+        """Cast a tensor to the dtype of the element kernels."""
+        return tensor if self.dtype is None else tensor.to(self.dtype)
+
+    def check(self):
+        """Raise a TypeError if the material or the nodes are missing."""
         if self.material is None:
-            raise TypeError("Truss elements are missing material.")
+            raise TypeError(f"{type(self).__name__} elements are missing material.")
         if self.nodes is None:
-            raise TypeError("Truss elements are missing nodes.")
-        Xdiff = self.nodes.X[self.conn[:, 1]] - self.nodes.X[self.conn[:, 0]]
-        xdiff = Xdiff + (self.nodes.u[self.conn[:, 1]] - self.nodes.u[self.conn[:, 0]])
-        L0 = (Xdiff).norm(dim=1)
-        L = (xdiff).norm(dim=1)
-        self.strain = (L - L0) / L0
-        self.stress = self.material(self.strain)
-        direction = xdiff / L[:, None]
-        element_forces = self.stress[:, None] * self.area * direction
-        element_forces = torch.stack((element_forces, -element_forces), dim=1)
-        force = assemble(len(self.nodes), self.conn, element_forces)
-        return force
+            raise TypeError(f"{type(self).__name__} elements are missing nodes.")
+
+    def dofs(self):
+        """Get the global degrees of freedom of each element.
+
+        Returns:
+            tensor: shape `(elements, nodes per element * dim)`, node by node and
+                component by component, matching the rows of `element_stiffness`.
+        """
+        dim = self.nodes.X.size(1)
+        conn = self.conn.long()  # the dofs may not fit in 32 bits
+        components = torch.arange(dim, device=conn.device)
+        return (conn[:, :, None] * dim + components).reshape(len(conn), -1)
+
+    def assembler(self):
+        """Return the assembler of the element group, built once per `conn`."""
+        if self._assembler is None:
+            self._assembler = Assembler(
+                self.conn, len(self.nodes), self.accumulate_dtype
+            )
+        return self._assembler
+
+    def sparse_assembler(self):
+        """Return the sparse assembler of the element group, built once per `conn`."""
+        if self._sparse_assembler is None:
+            size = len(self.nodes) * self.nodes.X.size(1)
+            rows, cols = element_pattern(self.dofs())
+            self._sparse_assembler = SparseAssembler(rows, cols, size)
+        return self._sparse_assembler
+
+    def stiffness(self):
+        """Assemble the tangent stiffness in a sparse CSR matrix.
+
+        The rows and columns follow the node by node, component by component order
+            of the flattened nodal displacements.
+        """
+        return self.sparse_assembler()(self.element_stiffness())
+
+
+def _fusion_key(els):
+    """Get the key shared by the element groups that can be concatenated."""
+    material = els.material
+    if hasattr(material, "commit"):
+        # the internal variables of a material belong to a single group
+        return (id(els),)
+    merge = getattr(type(material), "concatenate", None)
+    return (
+        type(els),
+        id(els.nodes),
+        els.dtype,
+        els.accumulate_dtype,
+        getattr(els, "compile", False),
+        id(material) if merge is None else merge.__func__,
+    )
+
+
+def fuse(groups):
+    """Merge compatible element groups, so they are evaluated in one pass.
+
+    Groups are compatible when they have the same type, nodes and precision, and
+        either share their material, or have materials whose class can
+        `concatenate` them into one material with per element parameters.
+        Materials with internal variables are never merged.
+
+    Args:
+        groups (sequence): the element groups.
+    Returns:
+        list: a `(group, members)` pair for each merged group, where members holds
+            a `(group, start, count)` triple for every original group, giving the
+            range of its elements in the merged group. Groups without compatible
+            partners are returned as they are.
+    """
+    buckets = {}
+    for els in groups:
+        buckets.setdefault(_fusion_key(els), []).append(els)
+    fused = []
+    for bucket in buckets.values():
+        material = bucket[0].material
+        if len(bucket) > 1 and any(els.material is not material for els in bucket):
+            counts = [len(els.conn) for els in bucket]
+            materials = [els.material for els in bucket]
+            material = type(material).concatenate(materials, counts)
+        if len(bucket) == 1 or material is None:
+            fused += [(els, [(els, 0, len(els.conn))]) for els in bucket]
+            continue
+        members, start = [], 0
+        for els in bucket:
+            members.append((els, start, len(els.conn)))
+            start += len(els.conn)
+        fused.append((type(bucket[0]).concatenate(bucket, material), members))
+    return fused
+
+
+class Truss(Elements):
+    """Truss elements.
+
+    The reference geometry is computed once and reused. It is only recomputed when
+        `conn`, `area` or `nodes.X` are replaced, so modify them by assignment
+        rather than in place.
+
+    The nodal state, the area and the material parameters may carry leading
+        ensemble batch dimensions, as long as they broadcast against the
+        `(..., elements)` shape of the strain. For example, an area of shape
+        `(variants, 1)` assigns one area to each variant.
+
+    Args:
+        conn (tensor or array): the connectivity, with the two node ids of each
+            element.
+        nodes (Nodes): the nodes of the model.
+        area (float or tensor): the cross section area.
+        material: the material, which maps the strain to the stress.
+        compile (bool): evaluate the element forces with a kernel compiled by
+            `torch.compile`. If the material can not be compiled, the elements fall
+            back to the regular evaluation with a warning. The compiled kernel is not
+            used when the force must be differentiated.
+    """
+
+    state_attributes = ("conn", "area")
+    element_attributes = ("area",)
+
+    def __init__(self, conn, nodes=None, area=1, material=None, compile=False):
+        super().__init__(conn, nodes, material)
+        self.area = area
+        self.compile = compile
+        self._compiled_kernel = None
+
+    @property
+    def area(self):
+        """Cross section area."""
+        return self._area
+
+    @area.setter
+    def area(self, area):
+        self._area = area
+        self._reference = None
+        self.modified()
+
+    def permute(self, order):
+        super().permute(order)
+        self.area = permute_elements(self.area, order)
+
+    def to(self, dtype=None, accumulate_dtype=None):
+        if dtype is not None and torch.is_tensor(self.area):
+            self.area = self.area.to(dtype)
+        return super().to(dtype, accumulate_dtype)
+
+    def reference(self):
+        """Return the reference geometry, computing it if it is outdated."""
+        X = self.nodes.X
+        if self._reference is None or self._reference.X is not X:
+            Xdiff = X[self.conn[:, 1]] - X[self.conn[:, 0]]
+            L0 = Xdiff.norm(dim=1)
+            Xdiff, L0 = self.cast(Xdiff), self.cast(L0)
+            inv_L0 = L0.reciprocal()
+            self._reference = TrussReference(X, Xdiff, L0, inv_L0, self.area * inv_L0)
+        return self._reference
+
+    def element_vectors(self):
+        """Compute the current element vectors, from the first to the last node."""
+        return self._kinematics()[0]
+
+    def _kinematics(self):
+        """Compute the current element vectors, lengths and strains."""
+        ref = self.reference()
+        ue = self.assembler().gather(self.cast(self.nodes.u))
+        du = ue[..., 1, :] - ue[..., 0, :]
+        xdiff = ref.Xdiff + du
+        L = xdiff.norm(dim=-1)
+        return xdiff, L, truss_strain(ref.Xdiff, du, L, ref.L0, ref.inv_L0)
+
+    def force(self, out=None, accumulate=False):
+        """Compute the nodal force.
+
+        Args:
+            out (tensor): optional buffer that receives the nodal force.
+            accumulate (bool): if True, add the force to the contents of `out`.
+        Returns:
+            tensor: the nodal force.
+        """
+        self.check()
+        ref = self.reference()
+        index = self.assembler().index
+        arguments = (self.cast(self.nodes.u), index, ref.Xdiff, ref.L0, ref.inv_L0)
+        arguments += (self.area, self.material)
+        differentiable = torch.is_grad_enabled() and any(
+            torch.is_tensor(argument) and argument.requires_grad
+            for argument in arguments
+        )
+        if self.compile and not differentiable:
+            self.strain, self.stress, element_forces = self._compiled(arguments)
+        else:
+            self.strain, self.stress, element_forces = truss_element_forces(*arguments)
+        return self.assembler()(element_forces, out, accumulate)
+
+    def _compiled(self, arguments):
+        """Evaluate the element forces with the compiled kernel.
+
+        The kernel is compiled on the first call. If tracing or compiling it fails,
+            the elements fall back to the regular evaluation with a warning, which
+            raises any genuine error of the arguments or the material. Errors of
+            later calls are not caught.
+        """
+        if self._compiled_kernel is not None:
+            return self._compiled_kernel(*arguments)
+        if not hasattr(torch, "compile"):
+            warnings.warn("torch.compile is not available, truss forces are eager.")
+            self.compile = False
+            return truss_element_forces(*arguments)
+        kernel = torch.compile(truss_element_forces, fullgraph=True)
+        try:
+            results = kernel(*arguments)
+        except _compile_errors() as error:
+            message = str(error).splitlines()[0]
+            warnings.warn(f"Compiling truss forces failed, using eager: {message}")
+            self.compile = False
+            return truss_element_forces(*arguments)
+        self._compiled_kernel = kernel
+        return results
 
     def mass(self):
         """Compute the nodal mass."""
-        if self.material is None:
-            raise TypeError("Truss elements are missing material.")
-        if self.nodes is None:
-            raise TypeError("Truss elements are missing nodes.")
-        Xdiff = self.nodes.X[self.conn[:, 1]] - self.nodes.X[self.conn[:, 0]]
-        L0 = (Xdiff).norm(dim=1)
-        element_mass = L0 * self.area * self.material.density / 2
-        element_mass = torch.stack((element_mass[:, None], element_mass[:, None]))
-        mass = assemble(len(self.nodes), self.conn, element_mass)
+        self.check()
+        element_mass = self.reference().L0 * self.area * self.material.density / 2
+        element_mass = torch.stack((element_mass, element_mass), dim=-1)[..., None]
+        mass = self.assembler()(element_mass)
         return mass
+
+    def critical_time_step(self):
+        """Compute the critical time step of each element.
+
+        It is the current length divided by the wave speed, which is obtained from
+            the tangent modulus of the material at the current strain, or from the
+            elastic modulus of materials with an `elastic_tangent` method.
+        """
+        self.check()
+        _, L, strain = self._kinematics()
+        tangent = getattr(self.material, "elastic_tangent", self.material.tangent)
+        modulus = tangent(strain)
+        wave_speed = (modulus.clamp(min=0) / self.material.density).sqrt()
+        return L / wave_speed
+
+    def element_stiffness(self):
+        """Compute the consistent tangent stiffness of each element.
+
+        It includes the material term, from the tangent modulus of the material, and
+            the geometric term, from the current stress. It does not support
+            ensemble batch dimensions.
+
+        Returns:
+            tensor: shape `(elements, 2 * dim, 2 * dim)`.
+        """
+        self.check()
+        ref = self.reference()
+        xdiff, L, strain = self._kinematics()
+        stress = self.material(strain)
+        modulus = self.material.tangent(strain)
+        direction = xdiff / L[:, None]
+        projection = direction[:, :, None] * direction[:, None, :]
+        identity = torch.eye(xdiff.size(1), dtype=xdiff.dtype, device=xdiff.device)
+        material_term = (modulus * ref.area_inv_L0)[:, None, None] * projection
+        geometric_term = (stress * self.area / L)[:, None, None] * (
+            identity - projection
+        )
+        k = material_term + geometric_term
+        return torch.cat((torch.cat((k, -k), 2), torch.cat((-k, k), 2)), 1)
+
+
+class Continuum(Elements):
+    """Small strain continuum elements.
+
+    The shape function gradients and the integration weights are computed once, for
+        all the elements and integration points at once. They are only recomputed
+        when `conn`, `thickness` or `nodes.X` are replaced.
+
+    The strain and the stress are in voigt form, with engineering shear strains,
+        and have shape `(..., points, elements, components)`, so material parameters
+        with one value per element broadcast against them.
+
+    Subclasses define the reference element with the class attributes `dim`, the
+        integration `points` and `weights`, the `corners` of multilinear elements
+        (None for linear simplices), and the node `facets`, which are used to
+        compute the characteristic length of the elements.
+
+    Args:
+        conn (tensor or array): the connectivity, with the node ids of each element.
+        nodes (Nodes): the nodes of the model.
+        material: an elastic material in voigt form, such as `Isotropic3D`,
+            `IsotropicPS` or `IsotropicPE`.
+        thickness (float or tensor): the thickness of 2D elements.
+    """
+
+    dim = None
+    points = ()
+    weights = ()
+    corners = None
+    facets = ()
+    element_axis = -2
+    state_attributes = ("conn", "thickness")
+    element_attributes = ("thickness",)
+
+    def __init__(self, conn, nodes=None, material=None, thickness=1):
+        super().__init__(conn, nodes, material)
+        self.thickness = thickness
+
+    @property
+    def thickness(self):
+        """Thickness of 2D elements."""
+        return self._thickness
+
+    @thickness.setter
+    def thickness(self, thickness):
+        self._thickness = thickness
+        self._reference = None
+        self.modified()
+
+    def permute(self, order):
+        super().permute(order)
+        self.thickness = permute_elements(self.thickness, order)
+
+    @classmethod
+    def shape_functions(cls, dtype=None):
+        """Evaluate the reference shape functions at the integration points.
+
+        Returns:
+            (tensor, tensor): the shape functions, with shape `(points, nodes)`, and
+                their gradients in natural coordinates, `(points, nodes, dim)`.
+        """
+        points = torch.tensor(cls.points, dtype=dtype)
+        if cls.corners is None:
+            N = torch.cat((1 - points.sum(1, keepdim=True), points), 1)
+            identity = torch.eye(cls.dim, dtype=points.dtype)
+            gradient = torch.cat((-points.new_ones(1, cls.dim), identity))
+            return N, gradient.expand(len(points), -1, -1)
+        corners = torch.tensor(cls.corners, dtype=points.dtype)
+        factors = (1 + points[:, None, :] * corners) / 2
+        N = factors.prod(-1)
+        gradient = []
+        for j in range(cls.dim):
+            others = [k for k in range(cls.dim) if k != j]
+            gradient.append(corners[:, j] / 2 * factors[..., others].prod(-1))
+        return N, torch.stack(gradient, -1)
+
+    def reference(self):
+        """Return the reference geometry, computing it if it is outdated."""
+        X = self.nodes.X
+        if self._reference is None or self._reference.X is not X:
+            N, gradient = self.shape_functions(X.dtype)
+            Xe = X[self.conn]
+            jacobian = Xe.transpose(1, 2)[:, None] @ gradient
+            dNdX = gradient @ torch.linalg.inv(jacobian)
+            weights = torch.tensor(self.weights, dtype=X.dtype)
+            measure = weights * torch.linalg.det(jacobian).abs()
+            length = self._characteristic_length(Xe, measure.sum(1))
+            N, dNdX, measure, length = map(self.cast, (N, dNdX, measure, length))
+            dNdX_flat = dNdX.transpose(1, 2).flatten(2)
+            dNdX = dNdX_flat.unflatten(2, dNdX.size()[1::2]).transpose(1, 2)
+            weights = measure
+            if self.dim == 2:
+                thickness = torch.as_tensor(self.thickness, dtype=measure.dtype)
+                weights = measure * thickness.to(measure.device)[..., None]
+            self._reference = ContinuumReference(
+                X, N, dNdX, dNdX_flat, measure, weights, length
+            )
+        return self._reference
+
+    def _characteristic_length(self, Xe, volume):
+        """Divide the volume by the largest facet measure.
+
+        For simplices it is multiplied by the dimension, which gives their smallest
+            height.
+        """
+        corners = Xe[:, torch.tensor(self.facets)].unbind(2)
+        if len(corners) == 2:
+            sizes = (corners[1] - corners[0]).norm(dim=-1)
+        elif len(corners) == 3:
+            sides = (corners[1] - corners[0], corners[2] - corners[0])
+            sizes = torch.cross(*sides, dim=-1).norm(dim=-1) / 2
+        else:
+            diagonals = (corners[2] - corners[0], corners[3] - corners[1])
+            sizes = torch.cross(*diagonals, dim=-1).norm(dim=-1) / 2
+        factor = self.dim if self.corners is None else 1
+        return factor * volume / sizes.max(1).values
+
+    def weights_with_thickness(self):
+        """Get the integration weights, including the thickness of 2D elements."""
+        return self.reference().weights
+
+    def displacement_gradient(self):
+        """Compute the displacement gradient at the integration points.
+
+        Returns:
+            tensor: shape `(..., elements, points, dim, dim)`.
+        """
+        ue = self.assembler().gather(self.cast(self.nodes.u))
+        gradient = ue.transpose(-1, -2) @ self.reference().dNdX_flat
+        return gradient.unflatten(-1, (-1, self.dim)).transpose(-3, -2)
+
+    def current_strain(self):
+        """Compute the voigt strain.
+
+        Returns:
+            tensor: shape `(..., points, elements, components)`.
+        """
+        gradient = self.displacement_gradient()
+        symmetric = gradient + gradient.transpose(-1, -2)
+        rows, cols, _ = voigt_indices(self.dim, symmetric.device)
+        strain = symmetric[..., rows, cols]
+        strain[..., : self.dim] /= 2
+        return strain.transpose(-3, -2)
+
+    def force(self, out=None, accumulate=False):
+        """Compute the nodal force.
+
+        Args:
+            out (tensor): optional buffer that receives the nodal force.
+            accumulate (bool): if True, add the force to the contents of `out`.
+        Returns:
+            tensor: the nodal force.
+        """
+        self.check()
+        self.strain = self.current_strain()
+        self.stress = self.material(self.strain)
+        ref = self.reference()
+        _, _, index = voigt_indices(self.dim, self.stress.device)
+        stress = self.stress[..., index].transpose(-4, -3)
+        stress = stress * ref.weights[..., None, None]
+        # the product sums the points, with the stress tensors stacked by rows
+        element_forces = -(ref.dNdX_flat @ stress.flatten(-3, -2))
+        return self.assembler()(element_forces, out, accumulate)
+
+    def mass(self):
+        """Compute the nodal lumped mass, as the row sums of the consistent mass."""
+        self.check()
+        measure = self.weights_with_thickness()
+        density = torch.as_tensor(self.material.density, dtype=measure.dtype)
+        element_mass = (measure @ self.reference().N) * density[..., None]
+        return self.assembler()(element_mass[..., None])
+
+    def critical_time_step(self):
+        """Compute the critical time step of each element.
+
+        It is the characteristic length divided by the dilatational wave speed,
+            obtained from the first diagonal entry of the material tangent, or of
+            the elastic tangent of materials with an `elastic_tangent` method.
+        """
+        self.check()
+        tangent = getattr(self.material, "elastic_tangent", self.material.tangent)
+        modulus = tangent(self.current_strain())[..., 0, 0]
+        if modulus.dim() >= 2:
+            modulus = modulus.amax(-2)
+        wave_speed = (modulus.clamp(min=0) / self.material.density).sqrt()
+        return self.reference().characteristic_length / wave_speed
+
+    def element_stiffness(self):
+        """Compute the stiffness of each element.
+
+        It does not support ensemble batch dimensions.
+
+        Returns:
+            tensor: shape `(elements, nodes * dim, nodes * dim)`, where nodes is the
+                number of nodes per element.
+        """
+        self.check()
+        dNdX = self.reference().dNdX
+        elements, points, nodes, dim = dNdX.size()
+        components = len(VOIGT_ROWS[dim])
+        B = dNdX.new_zeros(elements, points, components, nodes, dim)
+        for k, (i, j) in enumerate(zip(VOIGT_ROWS[dim], VOIGT_COLS[dim])):
+            B[:, :, k, :, i] = dNdX[..., j]
+            B[:, :, k, :, j] = dNdX[..., i]
+        B = B.reshape(elements, points, components, nodes * dim)
+        C = self.material.tangent(self.current_strain()).to(dNdX.dtype)
+        C = C.expand(points, elements, components, components).transpose(0, 1)
+        weights = self.weights_with_thickness()[..., None, None]
+        return (B.transpose(-1, -2) @ C @ B * weights).sum(1)
+
+
+class Tri3(Continuum):
+    """Linear triangles, integrated with one point."""
+
+    dim = 2
+    points = ((1 / 3, 1 / 3),)
+    weights = (1 / 2,)
+    facets = ((0, 1), (1, 2), (2, 0))
+
+
+class Quad4(Continuum):
+    """Bilinear quadrilaterals, integrated with 2x2 Gauss points."""
+
+    dim = 2
+    corners = ((-1, -1), (1, -1), (1, 1), (-1, 1))
+    points = tuple((3 ** -0.5 * x, 3 ** -0.5 * y) for x, y in corners)
+    weights = (1,) * 4
+    facets = ((0, 1), (1, 2), (2, 3), (3, 0))
+
+
+class Tet4(Continuum):
+    """Linear tetrahedra, integrated with one point."""
+
+    dim = 3
+    points = ((1 / 4, 1 / 4, 1 / 4),)
+    weights = (1 / 6,)
+    facets = ((0, 1, 2), (0, 1, 3), (0, 2, 3), (1, 2, 3))
+
+
+class Hex8(Continuum):
+    """Trilinear hexahedra, integrated with 2x2x2 Gauss points."""
+
+    dim = 3
+    corners = (
+        (-1, -1, -1),
+        (1, -1, -1),
+        (1, 1, -1),
+        (-1, 1, -1),
+        (-1, -1, 1),
+        (1, -1, 1),
+        (1, 1, 1),
+        (-1, 1, 1),
+    )
+    points = tuple(tuple(3 ** -0.5 * x for x in corner) for corner in corners)
+    weights = (1,) * 8
+    facets = (
+        (0, 1, 2, 3),
+        (4, 5, 6, 7),
+        (0, 1, 5, 4),
+        (1, 2, 6, 5),
+        (2, 3, 7, 6),
+        (3, 0, 4, 7),
+    )
@@ -0,0 +1,292 @@
+"""
+Result histories.
+
+A `History` records selected fields of a model over time into memory mapped `.npy`
+    files, one per field, so the length of a run is not limited by the available
+    memory. The files are preallocated, grown in place when they are full and
+    trimmed to the recorded frames when the history is closed. They are read back
+    with `read_history`, or directly with `numpy.load`.
+"""
+
+import queue
+import threading
+from pathlib import Path
+
+import numpy as np
+from numpy.lib import format as npy
+
+
+NODAL_FIELDS = ("u", "v", "f")
+ELEMENT_FIELDS = ("strain", "stress")
+
+
+class GrowableArray:
+    """A `.npy` file whose first dimension grows in place.
+
+    The file is memory mapped. When it is full, the header is rewritten with the
+        new number of frames and the file is extended, so the recorded frames are
+        never copied.
+
+    Args:
+        path (str or Path): the file path. An existing file is overwritten.
+        frame_shape (tuple): the shape of each frame.
+        dtype: the numpy data type.
+        capacity (int): the initial number of frames.
+    """
+
+    def __init__(self, path, frame_shape, dtype, capacity=1024):
+        self.path = Path(path)
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        shape = (max(capacity, 1), *self.frame_shape)
+        self.array = npy.open_memmap(self.path, "w+", self.dtype, shape)
+        self.offset = self.array.offset
+
+    @property
+    def capacity(self):
+        """The number of frames that fit in the file without growing it."""
+        return len(self.array)
+
+    def next_frame(self):
+        """Reserve the next frame, growing the file if needed, and return it."""
+        if self.count == self.capacity:
+            self._resize(2 * self.capacity)
+        frame = self.array[self.count, ...]
+        self.count += 1
+        return frame
+
+    def append(self, values):
+        """Copy `values` into the next frame."""
+        self.next_frame()[...] = values
+
+    def flush(self):
+        """Write the recorded frames to the disk."""
+        if self.array is not None:
+            self.array.flush()
+
+    def close(self):
+        """Trim the file to the recorded frames and release the memory map."""
+        if self.array is not None:
+            self._resize(self.count, reopen=False)
+
+    def _resize(self, frames, reopen=True):
+        self.array.flush()
+        self.array = None
+        header = {
+            "descr": npy.dtype_to_descr(self.dtype),
+            "fortran_order": False,
+            "shape": (frames, *self.frame_shape),
+        }
+        frame_bytes = self.dtype.itemsize * int(np.prod(self.frame_shape))
+        with open(self.path, "r+b") as file:
+            npy.write_array_header_1_0(file, header)
+            if file.tell() != self.offset:
+                raise RuntimeError(f"Can not resize {self.path} in place.")
+            file.truncate(self.offset + frames * frame_bytes)
+        if reopen:
+            self.array = npy.open_memmap(self.path, "r+")
+
+
+class History:
+    """Record fields of a model over time into memory mapped `.npy` files.
+
+    Call it every time step, for example as the callback of a solver, and it
+        records one of every `every` calls. Each field is written to
+        `<path>/<field>.npy`, with shape `(frames, ...)`, and the times to
+        `<path>/time.npy`. The frames are copied straight from the model tensors
+        into the memory maps, unless they are written in the background.
+
+    Args:
+        model (Model): the model to record.
+        path (str or Path): the output directory. It is created if needed.
+        fields (iterable): the recorded fields. The nodal fields are "u", "v" and
+            "f", and the element fields, of the group `group`, are "strain" and
+            "stress".
+        every (int): the number of calls between recorded frames.
+        nodes (sequence): the ids of the recorded nodes. All of them by default.
+        elements (sequence): the ids of the recorded elements. All of them by
+            default.
+        group (int): the index in `model.elements` of the element group whose
+            fields are recorded.
+        capacity (int): the initial number of frames of the files, which double
+            their size whenever they are full.
+        background (bool): write the frames in a background thread. They are
+            copied when they are recorded, so the model can keep changing.
+        max_pending (int): the maximum number of frames waiting to be written in
+            the background. Recording blocks when it is reached.
+    """
+
+    def __init__(
+        self,
+        model,
+        path,
+        fields=("u",),
+        every=1,
+        nodes=None,
+        elements=None,
+        group=0,
+        capacity=1024,
+        background=False,
+        max_pending=4,
+    ):
+        for field in fields:
+            if field not in NODAL_FIELDS + ELEMENT_FIELDS:
+                raise ValueError(f"Unknown field {field}.")
+        self.model = model
+        self.path = Path(path)
+        self.fields = tuple(fields)
+        self.every = every
+        if nodes is not None:
+            nodes = np.asarray(nodes, dtype=np.int64)
+        self.nodes = nodes
+        if elements is not None:
+            elements = np.asarray(elements, dtype=np.int64)
+        self.elements = elements
+        self.group = group
+        self.capacity = capacity
+        self.calls = 0
+        self.frames = 0
+        self.arrays = None
+        self._queue = None
+        self._thread = None
+        self._error = None
+        self.path.mkdir(parents=True, exist_ok=True)
+        if background:
+            self._queue = queue.Queue(max_pending)
+            self._thread = threading.Thread(target=self._work, daemon=True)
+            self._thread.start()
+
+    def __call__(self, solver=None):
+        self.calls += 1
+        if self.calls % self.every == 0:
+            self.record()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def sources(self):
+        """Get the current values of the fields as numpy arrays.
+
+        Returns:
+            dict: for each field, the array and the axis of the nodes or elements.
+        """
+        sources = {}
+        for field in self.fields:
+            if field in NODAL_FIELDS:
+                value, axis = getattr(self.model.nodes, field), -2
+            else:
+                els = self.model.elements[self.group]
+                value, axis = getattr(els, field), els.element_axis
+            if value is None:
+                raise ValueError(f"The field {field} has not been computed yet.")
+            sources[field] = (value.detach().cpu().numpy(), axis)
+        return sources
+
+    def _ids(self, field):
+        return self.nodes if field in NODAL_FIELDS else self.elements
+
+    def record(self, time=None):
+        """Record a frame of the fields at `time`, the model time by default."""
+        self._raise()
+        time = self.model.time if time is None else time
+        sources = self.sources()
+        if self._queue is None:
+            self._write(time, sources)
+        else:
+            frames = {}
+            for field, (value, axis) in sources.items():
+                ids = self._ids(field)
+                value = value.copy() if ids is None else np.take(value, ids, axis)
+                frames[field] = (value, axis)
+            self._put((time, frames))
+        self.frames += 1
+
+    def _write(self, time, sources):
+        if self.arrays is None:
+            self._open(sources)
+        self.arrays["time"].append(time)
+        for field, (value, axis) in sources.items():
+            target = self.arrays[field].next_frame()
+            ids = self._ids(field)
+            if ids is None or self._queue is not None:
+                np.copyto(target, value)
+            else:
+                np.take(value, ids, axis, out=target, mode="clip")
+
+    def _open(self, sources):
+        arrays = {"time": GrowableArray(self.path / "time.npy", (), np.float64)}
+        for field, (value, axis) in sources.items():
+            shape = list(value.shape)
+            ids = self._ids(field)
+            if ids is not None and self._queue is None:
+                if len(ids) and (ids.min() < 0 or ids.max() >= shape[axis]):
+                    raise IndexError(f"The ids of {field} are out of range.")
+                shape[axis] = len(ids)
+            arrays[field] = GrowableArray(
+                self.path / f"{field}.npy", shape, value.dtype, self.capacity
+            )
+        self.arrays = arrays
+
+    def _put(self, item):
+        while True:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                self._raise()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is not None and self._error is None:
+                    self._write(*item)
+            except Exception as error:  # pylint: disable=broad-except
+                self._error = error
+            finally:
+                self._queue.task_done()
+            if item is None:
+                return
+
+    def _raise(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError("Writing the history failed.") from error
+
+    def flush(self):
+        """Wait for the pending frames and write the recorded ones to the disk."""
+        if self._queue is not None:
+            self._queue.join()
+        self._raise()
+        for array in (self.arrays or {}).values():
+            array.flush()
+
+    def close(self):
+        """Write the pending frames and trim the files to the recorded frames."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        for array in (self.arrays or {}).values():
+            array.close()
+        self._raise()
+
+
+def read_history(path, mmap=True):
+    """Read the fields recorded by a `History`.
+
+    Args:
+        path (str or Path): the output directory of the history.
+        mmap (bool): memory map the files instead of loading them.
+    Returns:
+        dict: the arrays of the time and the recorded fields, by name.
+    """
+    mode = "r" if mmap else None
+    return {
+        file.stem: np.load(file, mmap_mode=mode)
+        for file in sorted(Path(path).glob("*.npy"))
+    }
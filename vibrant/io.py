@@ -0,0 +1,602 @@
+"""
+Mesh import.
+
+`read_mesh` reads Gmsh files, in the ASCII format 4.1, and Abaqus input files into
+    a `Mesh`, with the node positions, the connectivity of each element block and
+    the named node sets as tensors. For example:
+
+        mesh = read_mesh("beam.msh")
+        model = mesh.model(Isotropic3D(2e11, 0.3, 7800))
+        model.constraints.append(
+            ImposeVelocity(model.nodes, mesh.node_sets["support"], 0.0)
+        )
+
+The files are read in large chunks of text, and the numbers of whole chunks are
+    parsed by numpy, without building a string per line. The blocks of Gmsh files
+    state their size, so they are written straight into preallocated arrays and
+    the memory stays close to the size of the final tensors. Abaqus files do not,
+    so their blocks are gathered in chunks and copied once. The connectivity and the
+    node sets hold zero based node indices, in 32 bits when the number of nodes
+    allows it.
+"""
+
+import warnings
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from vibrant.elements import Hex8, Quad4, Tet4, Tri3, Truss
+from vibrant.models import Model
+from vibrant.nodes import Nodes
+
+
+BUFFER = 1 << 18  # the number of characters read at once
+
+NODES_PER_ELEMENT = {Truss: 2, Tri3: 3, Quad4: 4, Tet4: 4, Hex8: 8}
+TOPOLOGICAL_DIM = {Truss: 1, Tri3: 2, Quad4: 2, Tet4: 3, Hex8: 3}
+GMSH_TYPES = {1: Truss, 2: Tri3, 3: Quad4, 4: Tet4, 5: Hex8}
+GMSH_POINT = 15
+ABAQUS_TYPES = {
+    "T2D2": Truss,
+    "T3D2": Truss,
+    "CPS3": Tri3,
+    "CPE3": Tri3,
+    "CPS4": Quad4,
+    "CPE4": Quad4,
+    "C3D4": Tet4,
+    "C3D8": Hex8,
+}
+# reduced integration and incompatible modes elements read as fully integrated ones
+ABAQUS_SUBSTITUTES = {
+    "CPS4R": "CPS4",
+    "CPE4R": "CPE4",
+    "C3D8R": "C3D8",
+    "C3D8I": "C3D8",
+}
+
+Block = namedtuple("Block", ["name", "element", "conn"])
+
+
+class Mesh:
+    """Nodes, element blocks and node sets read from a mesh file.
+
+    Args:
+        X (tensor): the node positions, with shape `(nodes, dim)`.
+        blocks (list): the element blocks, as `Block(name, element, conn)` tuples
+            with the name of the block, or None, the element class, and the
+            connectivity in zero based node indices.
+        node_sets (dict): the zero based indices of the nodes of each named set.
+        node_tags (tensor): the ids of the nodes in the file.
+    """
+
+    def __init__(self, X, blocks=(), node_sets=None, node_tags=None):
+        self.X = X
+        self.blocks = list(blocks)
+        self.node_sets = {} if node_sets is None else node_sets
+        self.node_tags = node_tags
+
+    def nodes(self, dtype=None):
+        """Build the nodes of the model.
+
+        Args:
+            dtype: the dtype of the nodal tensors. By default, the one of `X`.
+        """
+        return Nodes(self.X, dtype=dtype)
+
+    def element_groups(self, nodes, material, area=1, thickness=1):
+        """Build an element group per block.
+
+        Args:
+            nodes (Nodes): the nodes, usually built by `nodes`.
+            material: the material of the blocks of the highest topological
+                dimension, or a dict that maps block names to materials. Blocks
+                without a material, such as the boundary lines of a 2D Gmsh mesh,
+                are skipped.
+            area (float or tensor): the cross section area of the trusses.
+            thickness (float or tensor): the thickness of 2D continuum elements.
+        Returns:
+            list: the element groups, in the order of the blocks.
+        """
+        if not isinstance(material, dict):
+            top = max([TOPOLOGICAL_DIM[block.element] for block in self.blocks] or [0])
+            material = {
+                block.name: material
+                for block in self.blocks
+                if TOPOLOGICAL_DIM[block.element] == top
+            }
+        groups = []
+        for name, element, conn in self.blocks:
+            if name not in material:
+                continue
+            if element is Truss:
+                groups.append(Truss(conn, nodes, area, material[name]))
+            else:
+                groups.append(element(conn, nodes, material[name], thickness))
+        return groups
+
+    def model(self, material, dtype=None, accumulate_dtype=None, **kwargs):
+        """Build a model with the nodes and the element groups of the mesh.
+
+        Args:
+            material: the materials, as in `element_groups`.
+            dtype: the dtype of the element kernels. See `Model.to`.
+            accumulate_dtype: the dtype of the nodal state. See `Model.to`.
+            kwargs: the `area` and the `thickness`, as in `element_groups`.
+        Returns:
+            Model: the model.
+        """
+        model = Model(self.nodes())
+        model.elements = self.element_groups(model.nodes, material, **kwargs)
+        if dtype is not None or accumulate_dtype is not None:
+            model.to(dtype, accumulate_dtype)
+        return model
+
+
+def read_mesh(path, dim=None):
+    """Read a Gmsh `.msh` or an Abaqus `.inp` file.
+
+    Args:
+        path (str or Path): the file.
+        dim (int): the dimension of the node positions. By default, 2 if all the
+            nodes lie on the z = 0 plane, 3 otherwise.
+    Returns:
+        Mesh: the mesh.
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix == ".msh":
+        return read_gmsh(path, dim)
+    if suffix == ".inp":
+        return read_abaqus(path, dim)
+    raise ValueError(f"Unknown mesh format {suffix}.")
+
+
+def _parse(text, dtype):
+    """Parse numbers separated by spaces, commas or line breaks."""
+    if "," in text:
+        text = text.replace(",", " ")
+    with warnings.catch_warnings():
+        # numpy warns, rather than raises, when it finds something else
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            return np.fromstring(text, dtype=dtype, sep=" ")
+        except (DeprecationWarning, ValueError) as error:
+            message = f"Could not parse the numbers in {text[:80]!r}."
+            raise ValueError(message) from error
+
+
+class _Reader:
+    """Read a text file by lines, or by chunks of whole lines, through a buffer.
+
+    Args:
+        file: the text file.
+        size (int): the number of characters read at once.
+    """
+
+    def __init__(self, file, size):
+        self.file = file
+        self.size = size
+        self.buffer = ""
+        self.position = 0
+
+    def _fill(self):
+        """Read more text into the buffer, and return False at the end of the file."""
+        text = self.file.read(self.size)
+        self.buffer = self.buffer[self.position :] + text
+        self.position = 0
+        return bool(text)
+
+    def _take(self, end):
+        """Consume the buffer up to `end`."""
+        text = self.buffer[self.position : end]
+        self.position = end
+        return text
+
+    def readline(self):
+        """Read a line, or an empty string at the end of the file."""
+        while True:
+            end = self.buffer.find("\n", self.position) + 1
+            if end or not self._fill():
+                return self._take(end or len(self.buffer))
+
+    def __iter__(self):
+        line = self.readline()
+        while line:
+            yield line
+            line = self.readline()
+
+    def lines(self, count):
+        """Yield the next `count` lines, in chunks of whole lines.
+
+        Yields:
+            (str, int): the text of the chunk and its number of lines.
+        """
+        while count:
+            available = self.buffer.count("\n", self.position)
+            if available >= count:
+                end = self.position
+                for _ in range(count):
+                    end = self.buffer.index("\n", end) + 1
+                available = count
+            else:
+                end = self.buffer.rfind("\n", self.position) + 1
+            if available:
+                yield self._take(end), available
+                count -= available
+            if count and not self._fill():
+                raise ValueError("The mesh file is truncated.")
+
+    def until(self, marker):
+        """Yield the text up to the next line that starts with `marker`, in chunks."""
+        while not self.buffer.startswith(marker, self.position):
+            end = self.buffer.find("\n" + marker, self.position) + 1
+            if end:
+                yield self._take(end)
+                return
+            end = self.buffer.rfind("\n", self.position) + 1
+            if end > self.position:
+                yield self._take(end)
+            if not self._fill():
+                if self.position < len(self.buffer):
+                    yield self._take(len(self.buffer))
+                return
+
+
+def _index_dtype(count):
+    """Get the smallest index dtype for `count` nodes."""
+    return np.int32 if count < 2 ** 31 else np.int64
+
+
+def _tag_map(tags):
+    """Get a function that maps node tags to zero based node indices."""
+    count = len(tags)
+    dtype = _index_dtype(count)
+    if count and tags[0] == 1 and tags[-1] == count and (np.diff(tags) == 1).all():
+        lookup = None
+    else:
+        lookup = np.full(int(tags.max(initial=0)) + 1, -1, dtype=dtype)
+        lookup[tags] = np.arange(count, dtype=dtype)
+
+    def index(values):
+        size = count + 1 if lookup is None else len(lookup)
+        if values.size and (values.min() < 0 or values.max() >= size):
+            raise ValueError("The mesh references undefined nodes.")
+        values = values - 1 if lookup is None else lookup[values]
+        if (values < 0).any():
+            raise ValueError("The mesh references undefined nodes.")
+        return values.astype(dtype, copy=False)
+
+    return index
+
+
+def _node_dim(X, dim):
+    """Drop the z coordinate of planar meshes, unless `dim` is given."""
+    if dim is None:
+        dim = 2 if X.shape[1] > 2 and not X[:, 2:].any() else X.shape[1]
+    return np.ascontiguousarray(X[:, :dim])
+
+
+def _merge_blocks(blocks):
+    """Concatenate the connectivities with the same name and element class."""
+    merged = {}
+    for name, element, conn in blocks:
+        merged.setdefault((name, element), []).append(conn)
+    return [
+        Block(name, element, torch.from_numpy(np.concatenate(conns)))
+        if len(conns) > 1
+        else Block(name, element, torch.from_numpy(conns[0]))
+        for (name, element), conns in merged.items()
+    ]
+
+
+def _read_rows(reader, rows, columns, dtype):
+    """Yield the rows of a block of lines with `columns` numbers each, in chunks.
+
+    Yields:
+        (int, array): the index of the first row of the chunk and its rows.
+    """
+    start = 0
+    for text, count in reader.lines(rows):
+        values = _parse(text, dtype)
+        if values.size != count * columns:
+            raise ValueError("The mesh file is malformed.")
+        yield start, values.reshape(count, columns)
+        start += count
+
+
+def _skip_section(reader, section):
+    """Skip the lines up to the end of a Gmsh section."""
+    end = "$End" + section[1:]
+    for line in reader:
+        if line.strip() == end:
+            return
+    raise ValueError(f"The section {section} is not closed.")
+
+
+def _gmsh_entities(reader):
+    """Read the physical groups of each entity of a Gmsh `$Entities` section."""
+    physical = {}
+    counts = [int(value) for value in reader.readline().split()[:4]]
+    for dim, count in enumerate(counts):
+        for _ in range(count):
+            values = reader.readline().split()
+            position = 4 if dim == 0 else 7  # after the point or the bounding box
+            tags = values[position + 1 : position + 1 + int(values[position])]
+            physical[dim, int(values[0])] = [abs(int(tag)) for tag in tags]
+    return physical
+
+
+def _gmsh_nodes(reader):
+    """Read the node tags and positions of a Gmsh `$Nodes` section."""
+    count, size = (int(value) for value in reader.readline().split()[:2])
+    X = np.empty((size, 3))
+    tags = np.empty(size, dtype=np.int64)
+    offset = 0
+    for _ in range(count):
+        dim, _, parametric, rows = map(int, reader.readline().split())
+        for start, values in _read_rows(reader, rows, 1, np.int64):
+            start += offset
+            tags[start : start + len(values)] = values[:, 0]
+        columns = 3 + (dim if parametric else 0)
+        for start, values in _read_rows(reader, rows, columns, np.float64):
+            start += offset
+            X[start : start + len(values)] = values[:, :3]
+        offset += rows
+    return X, tags
+
+
+def _gmsh_elements(reader, index, nodes, groups):
+    """Read the element blocks of a Gmsh `$Elements` section.
+
+    Args:
+        reader (_Reader): the file, after the section header.
+        index (callable): maps the node tags to zero based node indices.
+        nodes (int): the number of nodes.
+        groups (callable): gets the names of the physical groups of an entity.
+    Returns:
+        (list, dict): the element blocks, and the nodes of each physical group as
+            a boolean mask.
+    """
+    blocks = []
+    masks = {}
+    for _ in range(int(reader.readline().split()[0])):
+        dim, entity, kind, rows = map(int, reader.readline().split())
+        if kind == GMSH_POINT:
+            element, width = None, 1
+        elif kind in GMSH_TYPES:
+            element = GMSH_TYPES[kind]
+            width = NODES_PER_ELEMENT[element]
+        else:
+            raise ValueError(f"Unsupported Gmsh element type {kind}.")
+        conn = np.empty((rows, width), dtype=_index_dtype(nodes))
+        for start, values in _read_rows(reader, rows, width + 1, np.int64):
+            conn[start : start + len(values)] = index(values[:, 1:])
+        names = groups(dim, entity)
+        for name in names:
+            if name not in masks:
+                masks[name] = np.zeros(nodes, dtype=bool)
+            masks[name][conn] = True
+        if element is not None:
+            blocks.append(Block(names[0] if names else None, element, conn))
+    return blocks, masks
+
+
+def read_gmsh(path, dim=None):
+    """Read a Gmsh file in the ASCII format 4.1.
+
+    The elements are grouped into blocks by physical group, named after the
+        physical name or the tag of the group, and by element type. Elements
+        outside physical groups form unnamed blocks. The nodes of the elements of
+        each physical group, including physical points, form a node set.
+
+    Args:
+        path (str or Path): the file.
+        dim (int): the dimension of the node positions, see `read_mesh`.
+    Returns:
+        Mesh: the mesh.
+    """
+    names = {}
+    physical = {}
+    X = tags = None
+    blocks, masks = [], {}
+
+    def groups(dim, entity):
+        tags = physical.get((dim, entity), [])
+        return [names.get((dim, tag), str(tag)) for tag in tags]
+
+    with open(path) as file:
+        reader = _Reader(file, BUFFER)
+        for line in reader:
+            section = line.strip()
+            if section == "$MeshFormat":
+                version, binary, _ = reader.readline().split()
+                if version != "4.1":
+                    raise ValueError(
+                        f"Only Gmsh files of version 4.1 are read, not {version}."
+                    )
+                if binary != "0":
+                    raise ValueError("Only ASCII Gmsh files are read.")
+            elif section == "$PhysicalNames":
+                for _ in range(int(reader.readline())):
+                    group_dim, tag, name = reader.readline().split(maxsplit=2)
+                    names[int(group_dim), int(tag)] = name.strip().strip('"')
+            elif section == "$Entities":
+                physical = _gmsh_entities(reader)
+            elif section == "$Nodes":
+                X, tags = _gmsh_nodes(reader)
+            elif section == "$Elements":
+                if tags is None:
+                    raise ValueError("The elements precede the nodes.")
+                index = _tag_map(tags)
+                blocks, masks = _gmsh_elements(reader, index, len(tags), groups)
+            if section.startswith("$"):
+                _skip_section(reader, section)
+    if X is None:
+        raise ValueError("The mesh file has no nodes.")
+    dtype = _index_dtype(len(tags))
+    node_sets = {
+        name: torch.from_numpy(np.flatnonzero(mask).astype(dtype))
+        for name, mask in masks.items()
+    }
+    return Mesh(
+        torch.from_numpy(_node_dim(X, dim)),
+        _merge_blocks(blocks),
+        node_sets,
+        torch.from_numpy(tags),
+    )
+
+
+def _keyword(line):
+    """Split an Abaqus keyword line into the keyword and its options."""
+    parts = line[1:].split(",")
+    options = {}
+    for part in parts[1:]:
+        key, _, value = part.partition("=")
+        options[key.strip().lower()] = value.strip()
+    return parts[0].strip().lower(), options
+
+
+class _AbaqusBlock:
+    """The data lines of an Abaqus keyword, parsed in chunks of rows.
+
+    Rows may span several lines, as the elements with many nodes do.
+
+    Args:
+        columns (int): the numbers per row. If None, the numbers of the first line.
+        dtype: the dtype of the numbers.
+        convert (callable): transforms the rows of each chunk as they are parsed.
+    """
+
+    def __init__(self, columns, dtype, convert=None):
+        self.columns = columns
+        self.dtype = dtype
+        self.convert = convert
+        self.chunks = []
+        self.rest = np.empty(0, dtype=dtype)
+
+    def parse(self, text):
+        if self.columns is None:
+            self.columns = len(text.split("\n", 1)[0].rstrip().rstrip(",").split(","))
+        values = np.concatenate((self.rest, _parse(text, self.dtype)))
+        rows = len(values) // self.columns
+        self.rest = values[rows * self.columns :]
+        chunk = values[: rows * self.columns].reshape(rows, self.columns)
+        self.chunks.append(chunk if self.convert is None else self.convert(chunk))
+
+    def close(self):
+        """Check that the last row is complete, and return the chunks."""
+        if self.rest.size:
+            raise ValueError("An Abaqus data line is incomplete.")
+        return self.chunks
+
+    def rows(self):
+        """Concatenate the chunks, and release them."""
+        chunks = self.close() or [np.empty((0, self.columns or 1), self.dtype)]
+        self.chunks = [np.concatenate(chunks)]
+        return self.chunks[0]
+
+
+def _connectivity(rows):
+    """Drop the element ids, and store the node ids in 32 bits if they fit."""
+    conn = rows[:, 1:]
+    if conn.size and conn.max() < 2 ** 31:
+        return conn.astype(np.int32)
+    return conn
+
+
+def read_abaqus(path, dim=None):
+    """Read the mesh of an Abaqus input file.
+
+    The nodes, the elements and the node sets of the file are read, and the other
+        keywords are ignored. The file must be flat, or have a single part without
+        instance transformations. The element blocks are named after the `elset`
+        option of their `*Element` keyword, and the `nset` option of the `*Node`
+        keyword defines a node set too.
+
+    Plane stress (CPS) and plane strain (CPE) elements are read as the same
+        elements, and the assumption is set by the material, such as `IsotropicPS`
+        or `IsotropicPE`. Reduced integration (R) and incompatible modes (I)
+        elements are read as fully integrated elements, which are stiffer, with a
+        warning.
+
+    Args:
+        path (str or Path): the file.
+        dim (int): the dimension of the node positions, see `read_mesh`.
+    Returns:
+        Mesh: the mesh.
+    """
+    nodes = []  # (nset, block) pairs
+    elements = []  # (elset, element class, block) tuples
+    sets = {}  # nset: [(block, generate)]
+    block = None
+    with open(path) as file:
+        reader = _Reader(file, BUFFER)
+        for line in reader:
+            if not line.startswith("**"):
+                # data lines that follow other keywords are skipped
+                block = None
+                keyword, options = _keyword(line) if line[0] == "*" else ("", {})
+                if keyword == "node":
+                    block = _AbaqusBlock(None, np.float64)
+                    nodes.append((options.get("nset"), block))
+                elif keyword == "element":
+                    kind = options.get("type", "").upper()
+                    if kind in ABAQUS_SUBSTITUTES:
+                        substitute = ABAQUS_SUBSTITUTES[kind]
+                        warnings.warn(
+                            f"Abaqus {kind} elements are read as fully integrated "
+                            f"{substitute} elements, whose stiffness differs."
+                        )
+                        kind = substitute
+                    if kind not in ABAQUS_TYPES:
+                        raise ValueError(f"Unsupported Abaqus element type {kind}.")
+                    element = ABAQUS_TYPES[kind]
+                    columns = NODES_PER_ELEMENT[element] + 1
+                    block = _AbaqusBlock(columns, np.int64, _connectivity)
+                    elements.append((options.get("elset"), element, block))
+                elif keyword == "nset":
+                    block = _AbaqusBlock(1, np.int64)
+                    generate = "generate" in options
+                    sets.setdefault(options.get("nset"), []).append((block, generate))
+            # the data continues after comments
+            for text in reader.until("*"):
+                if block is not None:
+                    block.parse(text)
+    count = sum(len(chunk) for _, block in nodes for chunk in block.close())
+    columns = max([block.columns or 1 for _, block in nodes] or [1])
+    X = np.zeros((count, columns - 1))
+    tags = np.empty(count, dtype=np.int64)
+    offset = 0
+    for name, block in nodes:
+        start = offset
+        for chunk in block.close():
+            X[offset : offset + len(chunk), : chunk.shape[1] - 1] = chunk[:, 1:]
+            tags[offset : offset + len(chunk)] = chunk[:, 0]
+            offset += len(chunk)
+        block.chunks = []
+        if name is not None:
+            sets.setdefault(name, []).append((tags[start:offset], False))
+    index = _tag_map(tags)
+    blocks = []
+    for name, element, block in elements:
+        for i, chunk in enumerate(block.chunks):
+            block.chunks[i] = index(chunk)
+        block.columns -= 1
+        blocks.append(Block(name, element, block.rows()))
+    node_sets = {}
+    for name, parts in sets.items():
+        ids = []
+        for block, generate in parts:
+            rows = block if isinstance(block, np.ndarray) else block.rows()
+            if generate:
+                ids.extend(np.arange(a, b + 1, c) for a, b, c in rows.reshape(-1, 3))
+            else:
+                ids.append(rows.reshape(-1))
+        node_sets[name] = torch.from_numpy(np.unique(index(np.concatenate(ids))))
+    return Mesh(
+        torch.from_numpy(_node_dim(X, dim)),
+        _merge_blocks(blocks),
+        node_sets,
+        torch.from_numpy(tags),
+    )
@@ -0,0 +1,45 @@
+"""
+Linear solvers.
+
+The solvers only need the action of the operator on a vector, so they work equally
+    with sparse matrices and matrix-free operators.
+"""
+
+
+def conjugate_gradient(
+    matvec, b, x=None, preconditioner=None, rtol=1e-10, atol=0, maxiter=None
+):
+    """Solve `A x = b` for a symmetric positive definite operator `A`.
+
+    Args:
+        matvec (callable): computes the product of `A` with a tensor shaped like b.
+        b (tensor): the right hand side.
+        x (tensor): the initial guess. Zero by default.
+        preconditioner (callable): applies the inverse of the preconditioner to a
+            tensor shaped like b.
+        rtol (float): the tolerance of the residual norm relative to the norm of b.
+        atol (float): the absolute tolerance of the residual norm.
+        maxiter (int): the maximum number of iterations. By default, the number of
+            unknowns.
+    Returns:
+        (tensor, int): the solution and the number of iterations performed.
+    """
+    x = b.new_zeros(b.size()) if x is None else x
+    r = b - matvec(x)
+    z = r if preconditioner is None else preconditioner(r)
+    p = z.clone()
+    rz = (r * z).sum()
+    tolerance = max(rtol * b.norm().item(), atol)
+    maxiter = b.numel() if maxiter is None else maxiter
+    for iteration in range(maxiter):
+        if r.norm().item() <= tolerance:
+            return x, iteration
+        Ap = matvec(p)
+        alpha = rz / (p * Ap).sum()
+        x = x + alpha * p
+        r = r - alpha * Ap
+        z = r if preconditioner is None else preconditioner(r)
+        rz_next = (r * z).sum()
+        p = z + (rz_next / rz) * p
+        rz = rz_next
+    return x, maxiter
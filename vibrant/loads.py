@@ -0,0 +1,271 @@
+"""
+Loads.
+
+A load contributes nodal forces, optionally scaled by a time amplitude. The `Load`
+    objects of a model are merged into a `LoadTable`, which evaluates all of them
+    with one interpolation of the tabular amplitudes and one scatter per step.
+    Amplitudes are `Tabular` objects or any callable that maps the time to a scale
+    factor.
+"""
+
+import torch
+
+from vibrant.math_extensions import as_index
+
+
+def interpolate(times, values, time):
+    """Interpolate several piecewise linear tables at the same time.
+
+    The tables are constant outside of their range.
+
+    Args:
+        times (tensor): the increasing times of each table, with shape
+            `(tables, points)` and at least two points. Shorter tables are padded by
+            repeating their last entry.
+        values (tensor): the values of each table, with the same shape.
+        time (float): the time.
+    Returns:
+        tensor: the value of each table.
+    """
+    time = torch.full((len(times), 1), time, dtype=times.dtype, device=times.device)
+    after = torch.searchsorted(times, time, right=True).clamp(1, times.size(1) - 1)
+    t0, t1 = times.gather(1, after - 1), times.gather(1, after)
+    v0, v1 = values.gather(1, after - 1), values.gather(1, after)
+    span = t1 - t0
+    nonzero = span > 0
+    weight = (time - t0) / torch.where(nonzero, span, torch.ones_like(span))
+    weight = torch.where(nonzero, weight, torch.zeros_like(weight)).clamp(0, 1)
+    return (v0 + weight * (v1 - v0))[:, 0]
+
+
+class Tabular:
+    """Piecewise linear amplitude, constant outside of the table.
+
+    Args:
+        times (sequence): the increasing times.
+        values (sequence): the amplitude at each time.
+    """
+
+    def __init__(self, times, values):
+        self.times = torch.as_tensor(times, dtype=torch.double)
+        self.values = torch.as_tensor(values, dtype=torch.double)
+        if self.times.dim() != 1 or self.times.size() != self.values.size():
+            raise ValueError("The times and values must be 1D and of equal length.")
+        if len(self.times) == 0:
+            raise ValueError("The table is empty.")
+
+    def padded(self, points):
+        """Get the times and values, padded to `points` with their last entry."""
+        extra = points - len(self.times)
+        return (
+            torch.cat((self.times, self.times[-1:].expand(extra))),
+            torch.cat((self.values, self.values[-1:].expand(extra))),
+        )
+
+    def __call__(self, time):
+        times, values = self.padded(max(len(self.times), 2))
+        return interpolate(times[None], values[None], time).item()
+
+
+class Load:
+    """Base class of the loads merged by a `LoadTable`.
+
+    Subclasses implement `entries`, and store the loaded values in `value`.
+
+    Args:
+        amplitude (callable): maps the time to the scale factor of the load. The
+            load is constant if it is None.
+    """
+
+    def __init__(self, amplitude=None):
+        self.amplitude = amplitude
+
+    def entries(self, model):
+        """Get the loaded degrees of freedom and the forces at a unit amplitude.
+
+        Returns:
+            (tensor, tensor): the flat indices of the degrees of freedom, following
+                the flattened nodal forces, and the forces, which may have leading
+                ensemble batch dimensions.
+        """
+        raise NotImplementedError
+
+    def force(self, model, time=None):
+        """Evaluate the nodal force of the load on its own."""
+        return LoadTable([self], model).force(model.time if time is None else time)
+
+
+class NodalLoad(Load):
+    """Concentrated forces on some nodes.
+
+    The node ids are converted once into a compact tensor, which is checked against
+        the nodes, as in `Prescribe`.
+
+    Args:
+        nodes (Nodes): the nodes of the model.
+        node_ids (sequence, slice, array or tensor): the loaded nodes.
+        value (float or tensor): the force. It broadcasts against
+            `(len(node_ids), len(components))`, and may have leading ensemble
+            batch dimensions. For example, a value of shape `(variants, 1, 1)`
+            loads each variant with its own force.
+        components (sequence): the loaded components. All of them by default.
+        amplitude (callable): maps the time to the scale factor of the force.
+    """
+
+    def __init__(self, nodes, node_ids, value, components=None, amplitude=None):
+        super().__init__(amplitude)
+        self.nodes = nodes
+        self.node_ids = node_ids
+        self.value = torch.as_tensor(value)
+        self.components = components
+
+    @property
+    def node_ids(self):
+        """The ids of the loaded nodes, as a tensor."""
+        return self._node_ids
+
+    @node_ids.setter
+    def node_ids(self, node_ids):
+        node_ids = as_index(node_ids, len(self.nodes))
+        self._node_ids = node_ids.to(self.nodes.X.device)
+
+    def entries(self, model):
+        X = model.nodes.X
+        dim = X.size(1)
+        rows = self.node_ids.to(X.device).long()
+        cols = torch.arange(dim, device=X.device)
+        if self.components is not None:
+            cols = cols[torch.as_tensor(self.components, device=X.device)]
+        value = torch.atleast_2d(self.value.to(model.nodes.u.dtype))
+        batch = value.size()[:-2]
+        value = value.expand(*batch, len(rows), len(cols)).reshape(*batch, -1)
+        return (rows[:, None] * dim + cols).reshape(-1), value
+
+    def to(self, dtype):
+        """Cast the force to `dtype` and return the load."""
+        self.value = self.value.to(dtype)
+        return self
+
+    def state_dict(self):
+        return {"node_ids": self.node_ids, "value": self.value}
+
+    def load_state_dict(self, state):
+        self.node_ids = state["node_ids"]
+        self.value = state["value"]
+
+
+class Gravity(Load):
+    """Body forces from a uniform acceleration field, using the lumped mass.
+
+    A mass with ensemble batch dimensions, from a density per variant, gives forces
+        with the same batch dimensions.
+
+    Args:
+        value (sequence or tensor): the acceleration, with one value per component.
+        amplitude (callable): maps the time to the scale factor of the acceleration.
+    """
+
+    def __init__(self, value, amplitude=None):
+        super().__init__(amplitude)
+        self.value = torch.as_tensor(value)
+
+    def entries(self, model):
+        mass = model.mass()
+        force = mass * self.value.to(mass)
+        index = torch.arange(force.size(-2) * force.size(-1), device=force.device)
+        return index, force.reshape(*force.size()[:-2], -1)
+
+    def to(self, dtype):
+        """Cast the acceleration to `dtype` and return the load."""
+        self.value = self.value.to(dtype)
+        return self
+
+
+class LoadTable:
+    """Loads merged into one index and value table.
+
+    The forces of all the loads at a unit amplitude are precomputed. At every
+        evaluation, the tabular amplitudes are interpolated together, the other
+        amplitudes are called once each, and the scaled forces are assembled with
+        a single scatter.
+
+    The table has the ensemble batch dimensions of the load forces, such as those
+        of `Gravity` with a batched mass, and the forces of the other loads are
+        broadcast against them.
+
+    Args:
+        loads (iterable): the `Load` objects.
+        model (Model): the model, which provides the nodes and the mass.
+    """
+
+    def __init__(self, loads, model):
+        self.dtype = model.nodes.u.dtype
+        indices, values, amplitude_ids = [], [], []
+        amplitudes = []
+        for load in loads:
+            index, value = load.entries(model)
+            if load.amplitude is None:
+                amplitude_id = -1
+            else:
+                ids = [id(amplitude) for amplitude in amplitudes]
+                if id(load.amplitude) not in ids:
+                    amplitudes.append(load.amplitude)
+                    ids.append(id(load.amplitude))
+                amplitude_id = ids.index(id(load.amplitude))
+            indices.append(index)
+            values.append(value)
+            amplitude_ids.append(torch.full_like(index, amplitude_id))
+        device = model.nodes.X.device
+        batch = torch.broadcast_shapes(*(value.size()[:-1] for value in values))
+        self.shape = batch + model.nodes.X.size()
+        values = [value.expand(*batch, value.size(-1)) for value in values]
+        self.index = torch.cat(indices) if indices else torch.zeros(0, dtype=int)
+        self.values = torch.cat(values, -1) if values else torch.zeros(0)
+        self.values = self.values.to(device=device, dtype=self.dtype)
+        # the constant loads use the last scale, which is always one
+        self.amplitude_ids = torch.cat(amplitude_ids) if amplitude_ids else self.index
+        self.amplitude_ids = torch.where(
+            self.amplitude_ids < 0, len(amplitudes), self.amplitude_ids
+        )
+        self.amplitudes = amplitudes
+        self.tabular = [k for k, a in enumerate(amplitudes) if isinstance(a, Tabular)]
+        self.analytic = [k for k, a in enumerate(amplitudes) if k not in self.tabular]
+        self.times = self.table_values = None
+        if self.tabular:
+            points = max(max(len(amplitudes[k].times) for k in self.tabular), 2)
+            padded = [amplitudes[k].padded(points) for k in self.tabular]
+            self.times = torch.stack([times for times, _ in padded])
+            self.table_values = torch.stack([values for _, values in padded])
+
+    def __len__(self):
+        return len(self.index)
+
+    def scales(self, time):
+        """Evaluate the amplitudes, followed by a unit scale for constant loads."""
+        scales = torch.ones(len(self.amplitudes) + 1, dtype=self.dtype)
+        if self.tabular:
+            scales[self.tabular] = interpolate(
+                self.times, self.table_values, time
+            ).to(self.dtype)
+        for k in self.analytic:
+            scales[k] = float(self.amplitudes[k](time))
+        return scales.to(self.values.device)
+
+    def force(self, time, out=None, accumulate=False):
+        """Evaluate the nodal forces at `time`.
+
+        Args:
+            time (float): the time.
+            out (tensor): optional buffer of shape `shape` for the result.
+            accumulate (bool): if True, add the forces to the contents of `out`.
+        Returns:
+            tensor: the nodal forces.
+        """
+        if out is None:
+            out = self.values.new_zeros(self.shape)
+        elif not accumulate:
+            out.zero_()
+        values = self.values * self.scales(time)[self.amplitude_ids]
+        flat = out.view(*self.shape[:-2], -1)
+        flat.index_add_(flat.dim() - 1, self.index, values.to(out.dtype))
+        return out
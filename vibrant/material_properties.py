@@ -3,15 +3,17 @@ def mu_lambda(E=None, nu=None, lam=None, mu=None):
 
     Build the lame constants of a material using the elastic constants for
         isotropic materials. You must specify exactly two of the four available
-        constants. For example, you can provide E and mu as arguments.
+        constants. For example, you can provide E and mu as arguments. The
+        constants may be tensors, for example with one entry per element, and they
+        are broadcast elementwise.
 
     Args:
-        E (float): Young's modulus or elastic modulus.
-        nu (float): Poisson's ratio.
-        mu (float): lame's second parameter or shear modulus G.
-        lam (flaot): lame's first parameter lambda.
+        E (float or tensor): Young's modulus or elastic modulus.
+        nu (float or tensor): Poisson's ratio.
+        mu (float or tensor): lame's second parameter or shear modulus G.
+        lam (float or tensor): lame's first parameter lambda.
     Returns:
-        (float, float): mu and lambda
+        (float or tensor, float or tensor): mu and lambda
 
     """
     number_of_inputs = sum(p is not None for p in (E, nu, lam, mu))
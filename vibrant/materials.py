@@ -5,11 +5,65 @@ Materials are objects that have the following members:
     A `__call__` method. The particular arguments and outputs may change from
         material to material.
     A property or attribute named `density`, which returns the mass properties.
+    Optionally, a `tangent` method with the same arguments as `__call__`, which
+        returns the tangent stiffness. It is used to estimate stable time steps.
+    Optionally, a `to` method that casts the material parameters to a dtype.
+    Optionally, a `permute` method that reorders per element parameters, called
+        when the elements are reordered.
+    Optionally, an `elastic_tangent` method, with the same arguments as `tangent`,
+        used instead of it to estimate stable time steps when the tangent softens.
+    Optionally, a `commit` method that accepts the trial state computed by the last
+        call, for materials with internal variables.
+    Optionally, a `concatenate` class method that merges the materials of several
+        element groups into one material with per element parameters. It is used
+        to evaluate compatible element groups together.
+    Optionally, a `select` method that gets a new material for some of the elements
+        of a group. It is needed for per element parameters when the groups are
+        split, for example by `vibrant.parallel`.
+
+Material parameters may be tensors with one entry per element, so a single element
+    group evaluates elements with different properties in one pass.
 """
 
+import copy
+from math import sqrt
+
 import torch
 
-from vibrant.math_extensions import btdot
+from vibrant.material_properties import mu_lambda
+from vibrant.math_extensions import (
+    btdot,
+    concatenate_elements,
+    permute_elements,
+    select_elements,
+)
+
+
+def _as_parameter(value):
+    """Convert a material parameter to a floating point tensor."""
+    value = torch.as_tensor(value)
+    if not torch.is_floating_point(value):
+        value = value.to(torch.get_default_dtype())
+    return value
+
+
+def _isotropic(mu, lam, normal, shear):
+    """Build isotropic stiffnesses in voigt form, with the batch shape of mu and lam.
+
+    Args:
+        mu (tensor): lame's second parameter.
+        lam (tensor): lame's first parameter.
+        normal (int): the number of normal components.
+        shear (int): the number of shear components.
+    Returns:
+        tensor: shape `(..., normal + shear, normal + shear)`.
+    """
+    mu, lam = torch.broadcast_tensors(mu, lam)
+    size = normal + shear
+    C = lam.new_zeros(*lam.size(), size, size)
+    C[..., :normal, :normal] = lam[..., None, None]
+    diagonal = torch.stack([2 * mu] * normal + [mu] * shear, dim=-1)
+    return C + torch.diag_embed(diagonal)
 
 
 class BasicMaterial:
@@ -17,29 +71,78 @@ class BasicMaterial:
 
     It allows you to use a function as a material. It provides support for material
       density.
+
+    Args:
+        function (callable): maps the strain to the stress.
+        density (float): the density of the material.
+        tangent (callable): maps the strain to the tangent modulus. If it is not
+            provided, the tangent is obtained by differentiating `function`, which
+            must then act elementwise on the strain.
     """
 
-    def __init__(self, function, density=1):
+    def __init__(self, function, density=1, tangent=None):
         self.function = function
         self.density = density
+        self.tangent_function = tangent
 
     def __call__(self, *args, **kwargs):
         return self.function(*args, **kwargs)
 
+    def to(self, dtype):
+        """Cast the density, if it is a tensor, and return the material."""
+        if torch.is_tensor(self.density):
+            self.density = self.density.to(dtype)
+        return self
+
+    def permute(self, order):
+        """Reorder a per element density.
+
+        Parameters captured by `function` are not reordered.
+        """
+        self.density = permute_elements(self.density, order)
+
+    def select(self, index, count):
+        """Get the material of the elements `index` of a group of `count` elements.
+
+        Parameters captured by `function` are shared.
+        """
+        material = copy.copy(self)
+        material.density = select_elements(self.density, index, count)
+        return material
+
+    def tangent(self, strain):
+        """Get the tangent modulus for each component of the strain."""
+        if self.tangent_function is not None:
+            return self.tangent_function(strain)
+        with torch.enable_grad():
+            strain = strain.detach().requires_grad_()
+            stress = self.function(strain)
+            (modulus,) = torch.autograd.grad(stress.sum(), strain, allow_unused=True)
+        return torch.zeros_like(strain) if modulus is None else modulus
+
 
 class Elastic:
     """Basic elastic Material.
 
     Args:
-        C (tensor): the stiffness matrix. It can have dimension 2 or 4, which
-            corresopnd to the voigt and tensor form.
-        density (float): the density of the material.
+        C (tensor): the stiffness matrix. Without batch dimensions, it can have
+            dimension 2 or 4, which corresopnd to the voigt and tensor form.
+        density (float or tensor): the density of the material.
+        batch_dims (int): the number of leading batch dimensions of C. They are
+            broadcast against the batch dimensions of the strain, aligned to the
+            right. For example, a C of shape `(variants, 1, 6, 6)` holds one
+            stiffness per ensemble variant for strains of shape
+            `(variants, elements, 6)`.
     """
 
-    def __init__(self, C, density=1):
-        # Adding a batch dimension
-        self.C = C.unsqueeze(0)
+    def __init__(self, C, density=1, batch_dims=0):
+        if batch_dims == 0:
+            # Adding a batch dimension
+            C = C.unsqueeze(0)
+            batch_dims = 1
+        self.C = C
         self.density = density
+        self.dims = (C.dim() - batch_dims) // 2
 
     def __call__(self, strain):
         """Get the stress.
@@ -48,63 +151,473 @@ class Elastic:
             strain (tensor): A tensor of dimension 2 or 3. The first dimension
                 contains the batch and the other one(s) contain the strain. If
                 the dimension is 2, each row is a strain is in voigt form,
-                otherwise each batch contains a strain in tensor form.
+                otherwise each batch contains a strain in tensor form. Extra
+                leading batch dimensions are allowed.
         Returns:
             stress (tensor): It matches the shape of the input strain.
         """
         # PyTorch's einsum does not support broadcasting yet, so in the meantime
         #   we use our own batch dot multiplication.
         #   For more info see https://github.com/pytorch/pytorch/issues/30194
+        return btdot(self.tangent(strain), strain, self.dims)
+
+    def to(self, dtype):
+        """Cast the stiffness and the density to `dtype` and return the material."""
+        self.C = self.C.to(dtype)
+        if torch.is_tensor(self.density):
+            self.density = self.density.to(dtype)
+        return self
+
+    def permute(self, order):
+        """Reorder a per element stiffness and density.
 
-        return btdot(self.C, strain)
+        The elements span the last batch dimension of C.
+        """
+        selected = self.select(order, len(order))
+        self.C, self.density = selected.C, selected.density
+
+    def select(self, index, count):
+        """Get the material of the elements `index` of a group of `count` elements."""
+        material = copy.copy(self)
+        axis = self.C.dim() - 2 * self.dims - 1
+        if self.C.size(axis) == count > 1:
+            material.C = self.C.index_select(axis, torch.as_tensor(index))
+        material.density = select_elements(self.density, index, count)
+        return material
+
+    @classmethod
+    def concatenate(cls, materials, counts):
+        """Merge elastic materials into one with a stiffness per element.
+
+        Args:
+            materials (sequence): the materials, one per element group.
+            counts (sequence): the number of elements of each group.
+        Returns:
+            Elastic: the merged material, or None if the stiffnesses have different
+                forms.
+        """
+        dims = materials[0].dims
+        if any(material.dims != dims for material in materials):
+            return None
+        tail = materials[0].C.size()[materials[0].C.dim() - 2 * dims :]
+        stiffnesses = []
+        for material in materials:
+            C = material.C
+            batch = C.size()[: C.dim() - 2 * dims]
+            if C.size()[len(batch) :] != tail:
+                return None
+            # move the element axis last, so C is concatenated as an attribute
+            stiffnesses.append(C.reshape(*batch, -1).transpose(-1, -2))
+        C = concatenate_elements(stiffnesses, counts).transpose(-1, -2)
+        C = C.reshape(*C.size()[:-1], *tail)
+        density = concatenate_elements([m.density for m in materials], counts)
+        return Elastic(C, density, C.dim() - 2 * dims)
+
+    def tangent(self, strain):
+        """Get the stiffness, with as many batch dimensions as the strain."""
+        C = self.C
+        missing_dims = strain.dim() - self.dims - (C.dim() - 2 * self.dims)
+        if missing_dims > 0:
+            C = C.reshape((1,) * missing_dims + C.size())
+        return C
+
+
+class Elastic1D:
+    """Linear elastic material for one dimensional strains, such as those of trusses.
+
+    Args:
+        E (float or tensor): Young's modulus. A tensor of shape `(elements,)` holds
+            one modulus per element.
+        density (float or tensor): the density of the material.
+    """
+
+    def __init__(self, E, density=1):
+        self.E = _as_parameter(E)
+        self.density = density
+
+    def __call__(self, strain):
+        return self.E * strain
+
+    def tangent(self, strain):
+        """Get the tangent modulus, with the shape of the strain."""
+        return self.E * torch.ones_like(strain)
+
+    def to(self, dtype):
+        """Cast the modulus and the density to `dtype` and return the material."""
+        self.E = self.E.to(dtype)
+        if torch.is_tensor(self.density):
+            self.density = self.density.to(dtype)
+        return self
+
+    @classmethod
+    def concatenate(cls, materials, counts):
+        """Merge materials into one with a modulus per element."""
+        E = concatenate_elements([material.E for material in materials], counts)
+        density = concatenate_elements([m.density for m in materials], counts)
+        return cls(E, density)
+
+    def permute(self, order):
+        """Reorder a per element modulus and density."""
+        self.E = permute_elements(self.E, order)
+        self.density = permute_elements(self.density, order)
+
+    def select(self, index, count):
+        """Get the material of the elements `index` of a group of `count` elements."""
+        E = select_elements(self.E, index, count)
+        return type(self)(E, select_elements(self.density, index, count))
 
 
 class Isotropic3D(Elastic):
     """Isotropic elastic material 3D in voigt form.
 
+    The elastic constants may be tensors, which broadcast into the batch dimensions
+        of C. For example, tensors of shape `(elements,)` give one stiffness per
+        element of a continuum group.
+
     Args:
-        E (float): Young's modulus or elastic modulus.
-        nu (float): Poisson's ratio.
-        density (float): the density of the material.
+        E (float or tensor): Young's modulus or elastic modulus.
+        nu (float or tensor): Poisson's ratio.
+        density (float or tensor): the density of the material.
     """
 
     def __init__(self, E, nu, density=1):
-        coef = E / (1 + nu) / (1 - 2 * nu)
-        C = torch.zeros(6, 6)
-        C.fill_diagonal_(1 - 2 * nu)
-        C[:3, :3] += nu
-        C[3:, 3:] /= 2
-        C *= coef
-        super().__init__(C, density)
+        mu, lam = mu_lambda(E=_as_parameter(E), nu=_as_parameter(nu))
+        C = _isotropic(mu, lam, 3, 3)
+        super().__init__(C, density, C.dim() - 2)
 
 
 class IsotropicPS(Elastic):
     """Isotropic elastic material in plane stress in voigt form.
 
+    The elastic constants may be tensors, as in `Isotropic3D`.
+
     Args:
-        E (float): Young's modulus or elastic modulus.
-        nu (float): Poisson's ratio.
-        density (float): the density of the material.
+        E (float or tensor): Young's modulus or elastic modulus.
+        nu (float or tensor): Poisson's ratio.
+        density (float or tensor): the density of the material.
     """
 
     def __init__(self, E, nu, density=1):
-        coef = E / (1 - nu ** 2)
-        C = coef * torch.tensor([[1, nu, 0], [nu, 1, 0], [0, 0, (1 - nu) / 2]])
-        super().__init__(C, density)
+        mu, lam = mu_lambda(E=_as_parameter(E), nu=_as_parameter(nu))
+        # the out of plane stress condition condenses lambda
+        C = _isotropic(mu, 2 * mu * lam / (lam + 2 * mu), 2, 1)
+        super().__init__(C, density, C.dim() - 2)
 
 
 class IsotropicPE(Elastic):
     """Isotropic elastic material in plane strain in voigt form.
 
+    The elastic constants may be tensors, as in `Isotropic3D`.
+
     Args:
-        E (float): Young's modulus or elastic modulus.
-        nu (float): Poisson's ratio.
-        density (float): the density of the material.
+        E (float or tensor): Young's modulus or elastic modulus.
+        nu (float or tensor): Poisson's ratio.
+        density (float or tensor): the density of the material.
     """
 
     def __init__(self, E, nu, density=1):
-        coef = E / (1 + nu) / (1 - 2 * nu)
-        C = coef * torch.tensor(
-            [[1 - nu, nu, 0], [nu, 1 - nu, 0], [0, 0, (1 - 2 * nu) / 2]]
-        )
-        super().__init__(C, density)
+        mu, lam = mu_lambda(E=_as_parameter(E), nu=_as_parameter(nu))
+        C = _isotropic(mu, lam, 2, 1)
+        super().__init__(C, density, C.dim() - 2)
+
+
+class StatefulMaterial:
+    """Base class of materials with internal variables.
+
+    The internal variables live in preallocated tensors with one entry per
+        integration point, shaped after the strain. Every call computes a trial
+        state from the committed state, so a step can be retried by calling the
+        material again, and `commit` accepts the trial state of the last call. The
+        state is allocated with zeros on the first call, and again whenever the
+        shape of the strain changes.
+
+    Subclasses define `state_names`, `state_shape` and `return_mapping`.
+
+    Args:
+        density (float or tensor): the density of the material.
+    """
+
+    state_names = ()
+    element_axis = -1  # the axis of the elements in the internal variables
+
+    def __init__(self, density=1):
+        self.density = density
+        self.committed = None
+        self.trial = None
+
+    def state_shape(self, name, strain):
+        """Get the shape of the internal variable `name` for a given strain."""
+        raise NotImplementedError
+
+    def return_mapping(self, strain, state):
+        """Compute the stress and the updated internal variables.
+
+        Args:
+            strain (tensor): the strain.
+            state (dict): the committed internal variables.
+        Returns:
+            (tensor, dict, tensor): the stress, the trial internal variables and
+                a boolean mask of the yielding points.
+        """
+        raise NotImplementedError
+
+    def allocate(self, strain):
+        """Allocate the state for `strain`, unless it already fits."""
+        shapes = {name: self.state_shape(name, strain) for name in self.state_names}
+        if self.committed is None or any(
+            self.committed[name].size() != shape for name, shape in shapes.items()
+        ):
+            self.committed = {
+                name: strain.new_zeros(shape) for name, shape in shapes.items()
+            }
+            self.trial = {name: value.clone() for name, value in self.committed.items()}
+        return self.committed
+
+    def __call__(self, strain):
+        stress, trial, _ = self.return_mapping(strain, self.allocate(strain))
+        for name, value in trial.items():
+            self.trial[name].copy_(value.detach())
+        return stress
+
+    def commit(self):
+        """Accept the trial state computed by the last call."""
+        if self.committed is not None:
+            for name, value in self.trial.items():
+                self.committed[name].copy_(value)
+
+    def reset(self):
+        """Discard the internal variables."""
+        self.committed = self.trial = None
+
+    def state_dict(self):
+        """Get the committed internal variables."""
+        return dict(self.committed or {})
+
+    def load_state_dict(self, state):
+        """Restore the internal variables obtained with `state_dict`."""
+        if not state:
+            self.reset()
+            return
+        self.committed = {name: state[name].clone() for name in self.state_names}
+        self.trial = {name: value.clone() for name, value in self.committed.items()}
+
+    def parameters(self):
+        """Get the names of the tensor parameters."""
+        return [name for name, value in vars(self).items() if torch.is_tensor(value)]
+
+    def to(self, dtype):
+        """Cast the parameters and the internal variables and return the material."""
+        for name in self.parameters():
+            setattr(self, name, getattr(self, name).to(dtype))
+        for state in (self.committed, self.trial):
+            for name, value in (state or {}).items():
+                state[name] = value.to(dtype)
+        return self
+
+    def permute(self, order):
+        """Reorder the per element parameters and internal variables."""
+        selected = self.select(order, len(order))
+        for name, value in vars(selected).items():
+            setattr(self, name, value)
+
+    def select(self, index, count):
+        """Get the material of the elements `index` of a group of `count` elements.
+
+        The new material has its own copy of the internal variables.
+        """
+        material = copy.copy(self)
+        for name in self.parameters():
+            setattr(material, name, select_elements(getattr(self, name), index, count))
+        for kind in ("committed", "trial"):
+            state = getattr(self, kind)
+            if state is not None:
+                state = {
+                    name: select_elements(
+                        value.movedim(self.element_axis, -1), index, count
+                    )
+                    .movedim(-1, self.element_axis)
+                    .clone()
+                    for name, value in state.items()
+                }
+            setattr(material, kind, state)
+        return material
+
+
+class ElastoPlastic1D(StatefulMaterial):
+    """Elastoplastic material for one dimensional strains, such as those of trusses.
+
+    It has linear isotropic and kinematic hardening. The return mapping is
+        evaluated for all the points at once, and only the yielding points get
+        plastic increments. All the parameters may be per element tensors.
+
+    Args:
+        E (float or tensor): Young's modulus.
+        yield_stress (float or tensor): the initial yield stress.
+        hardening (float or tensor): the isotropic hardening modulus.
+        kinematic_hardening (float or tensor): the kinematic hardening modulus.
+        density (float or tensor): the density of the material.
+    """
+
+    state_names = ("plastic_strain", "back_stress", "equivalent_plastic_strain")
+
+    def __init__(self, E, yield_stress, hardening=0, kinematic_hardening=0, density=1):
+        super().__init__(density)
+        self.E = _as_parameter(E)
+        self.yield_stress = _as_parameter(yield_stress)
+        self.hardening = _as_parameter(hardening)
+        self.kinematic_hardening = _as_parameter(kinematic_hardening)
+
+    def state_shape(self, name, strain):
+        return strain.size()
+
+    def return_mapping(self, strain, state):
+        trial = self.E * (strain - state["plastic_strain"])
+        relative = trial - state["back_stress"]
+        alpha = state["equivalent_plastic_strain"]
+        f = relative.abs() - (self.yield_stress + self.hardening * alpha)
+        yielding = f > 0
+        moduli = self.E + self.hardening + self.kinematic_hardening
+        increment = f.clamp(min=0) / moduli * torch.sign(relative)
+        stress = trial - self.E * increment
+        state = {
+            "plastic_strain": state["plastic_strain"] + increment,
+            "back_stress": state["back_stress"] + self.kinematic_hardening * increment,
+            "equivalent_plastic_strain": alpha + increment.abs(),
+        }
+        return stress, state, yielding
+
+    def tangent(self, strain):
+        """Get the consistent tangent modulus, with the shape of the strain."""
+        _, _, yielding = self.return_mapping(strain, self.allocate(strain))
+        hardening = self.hardening + self.kinematic_hardening
+        plastic = self.E * hardening / (self.E + hardening)
+        return torch.where(yielding, plastic, self.E).to(strain.dtype)
+
+    def elastic_tangent(self, strain):
+        """Get the elastic modulus, with the shape of the strain."""
+        return self.E * torch.ones_like(strain)
+
+
+def _deviatoric_projection(dtype=None, device=None):
+    """Get the deviatoric projection in voigt form, for engineering shear strains."""
+    projection = torch.diag(torch.tensor([1, 1, 1, 0.5, 0.5, 0.5], dtype=dtype))
+    projection[:3, :3] -= 1 / 3
+    return projection.to(device)
+
+
+def _voigt_norm(tensor):
+    """Get the Frobenius norm of symmetric tensors in voigt stress form."""
+    squares = tensor.square()
+    return (squares[..., :3].sum(-1) + 2 * squares[..., 3:].sum(-1)).sqrt()
+
+
+class J2Plasticity3D(StatefulMaterial):
+    """Von Mises plasticity in 3D voigt form, with engineering shear strains.
+
+    It has linear isotropic and kinematic hardening. The radial return is evaluated
+        for all the integration points at once, and only the yielding points get
+        plastic increments. All the parameters may be per element tensors, which
+        broadcast against the `(..., points, elements)` batch shape of the strain.
+
+    Args:
+        E (float or tensor): Young's modulus.
+        nu (float or tensor): Poisson's ratio.
+        yield_stress (float or tensor): the initial uniaxial yield stress.
+        hardening (float or tensor): the isotropic hardening modulus.
+        kinematic_hardening (float or tensor): the kinematic hardening modulus.
+        density (float or tensor): the density of the material.
+    """
+
+    state_names = ("plastic_strain", "back_stress", "equivalent_plastic_strain")
+    element_axis = -2
+
+    def __init__(
+        self, E, nu, yield_stress, hardening=0, kinematic_hardening=0, density=1
+    ):
+        super().__init__(density)
+        self.mu, self.lam = mu_lambda(E=_as_parameter(E), nu=_as_parameter(nu))
+        self.yield_stress = _as_parameter(yield_stress)
+        self.hardening = _as_parameter(hardening)
+        self.kinematic_hardening = _as_parameter(kinematic_hardening)
+
+    def state_shape(self, name, strain):
+        if name == "equivalent_plastic_strain":
+            return strain.size()[:-1] + (1,)
+        return strain.size()
+
+    def elastic_stress(self, strain):
+        """Get the stress of an elastic strain."""
+        mu, lam = self.mu[..., None], self.lam[..., None]
+        volumetric = strain[..., :3].sum(-1, keepdim=True)
+        normal = lam * volumetric + 2 * mu * strain[..., :3]
+        return torch.cat((normal, mu * strain[..., 3:]), -1)
+
+    def radial_return(self, strain, state):
+        """Evaluate the trial stress and the plastic multiplier.
+
+        Returns:
+            (tensor, tensor, tensor, tensor): the trial stress, the unit direction
+                of the relative deviatoric trial stress, its norm, and the plastic
+                multiplier, which is zero on the points that do not yield.
+        """
+        trial = self.elastic_stress(strain - state["plastic_strain"])
+        mean = trial[..., :3].mean(-1, keepdim=True)
+        relative = torch.cat((trial[..., :3] - mean, trial[..., 3:]), -1)
+        relative = relative - state["back_stress"]
+        norm = _voigt_norm(relative)[..., None]
+        alpha = state["equivalent_plastic_strain"]
+        radius = self.yield_stress[..., None] + self.hardening[..., None] * alpha
+        f = norm - sqrt(2 / 3) * radius
+        hardening = (self.hardening + self.kinematic_hardening)[..., None]
+        multiplier = f.clamp(min=0) / (2 * self.mu[..., None] + 2 / 3 * hardening)
+        direction = relative / torch.where(norm > 0, norm, torch.ones_like(norm))
+        return trial, direction, norm, multiplier
+
+    def return_mapping(self, strain, state):
+        trial, direction, _, multiplier = self.radial_return(strain, state)
+        increment = multiplier * direction
+        stress = trial - 2 * self.mu[..., None] * increment
+        engineering = torch.ones_like(increment)
+        engineering[..., 3:] = 2
+        kinematic = 2 / 3 * self.kinematic_hardening[..., None]
+        state = {
+            "plastic_strain": state["plastic_strain"] + increment * engineering,
+            "back_stress": state["back_stress"] + kinematic * increment,
+            "equivalent_plastic_strain": (
+                state["equivalent_plastic_strain"] + sqrt(2 / 3) * multiplier
+            ),
+        }
+        return stress, state, multiplier[..., 0] > 0
+
+    def tangent(self, strain, plastic=True):
+        """Get the consistent tangent stiffness, with the batch shape of the strain.
+
+        Args:
+            strain (tensor): the strain.
+            plastic (bool): if False, get the elastic stiffness.
+        Returns:
+            tensor: shape `(..., 6, 6)`.
+        """
+        mu = self.mu[..., None, None]
+        volumetric = strain.new_zeros(6, 6)
+        volumetric[:3, :3] = 1
+        deviatoric = _deviatoric_projection(strain.dtype, strain.device)
+        bulk = self.lam[..., None, None] + 2 / 3 * mu
+        C = (bulk * volumetric + 2 * mu * deviatoric).expand(strain.size() + (6,))
+        if not plastic:
+            return C
+        state = self.allocate(strain)
+        _, direction, norm, multiplier = self.radial_return(strain, state)
+        # the return scales the deviatoric stiffness by theta, and removes part of
+        #   the stiffness along the return direction
+        norm = torch.where(norm > 0, norm, torch.ones_like(norm))[..., None]
+        theta = 1 - 2 * mu * multiplier[..., None] / norm
+        hardening = (self.hardening + self.kinematic_hardening)[..., None, None]
+        theta_bar = 1 / (1 + hardening / (3 * mu)) - (1 - theta)
+        theta_bar = torch.where(multiplier[..., None] > 0, theta_bar, 0)
+        outer = direction[..., :, None] * direction[..., None, :]
+        return C - 2 * mu * ((1 - theta) * deviatoric + theta_bar * outer)
+
+    def elastic_tangent(self, strain):
+        """Get the elastic stiffness, with the batch shape of the strain."""
+        return self.tangent(strain, plastic=False)
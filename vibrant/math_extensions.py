@@ -1,7 +1,10 @@
+import numpy as np
 import torch
 
+INT32_MAX = 2 ** 31 - 1
 
-def btdot(large, small):
+
+def btdot(large, small, dims=None):
     """Batch dot tensor product.
 
     If the dimension of small is `N+1`, perform a batch N-dimensional dot product.
@@ -9,6 +12,8 @@ def btdot(large, small):
         if small is 2D, perform a vector-vector multiplication. The first dimension
         of both tensors is a batch dimension and it must match or be broadcastable.
         If large has extra dimensions, they are considered batch dimensions too.
+        When `dims` is given, small may have several leading batch dimensions, and
+        large must have the same number of leading batch dimensions.
 
     Args:
         large (tensor): its last `N` dimensions are multiplied by small. The remaining
@@ -16,29 +21,247 @@ def btdot(large, small):
         small (tensor): a tensor whose first dimension is the batch, and the
             remaining ones are to be multiplied. Its dimension must be equal or
             saller than those of large.
+        dims (int): the number `N` of trailing dimensions of small that are
+            multiplied. By default, all the dimensions but the first one.
     Returns:
         tensor: the result of the product.
     """
-    dim_diff = large.dim() - small.dim()
-    batch_dim = small.size(0)
-    extra_dims = [1] * dim_diff
-    remaining_dims = small.size()[1:]
-    sview = small.view(batch_dim, *extra_dims, *remaining_dims)
-    return (large * sview).sum(tuple(range(dim_diff + 1, large.dim())))
+    dims = small.dim() - 1 if dims is None else dims
+    batch_dims = small.size()[: small.dim() - dims]
+    extra_dims = [1] * (large.dim() - small.dim())
+    remaining_dims = small.size()[small.dim() - dims :]
+    if extra_dims and all(size == 1 for size in large.size()[: len(batch_dims)]):
+        # large is shared by the whole batch, so the product is a single matmul
+        rows = large.size()[len(batch_dims) : large.dim() - dims]
+        dtype = torch.result_type(large, small)
+        matrix = large.reshape(-1, remaining_dims.numel()).to(dtype)
+        product = small.reshape(*batch_dims, -1).to(dtype) @ matrix.transpose(0, 1)
+        return product.reshape(*batch_dims, *rows)
+    sview = small.reshape(*batch_dims, *extra_dims, *remaining_dims)
+    return (large * sview).sum(tuple(range(large.dim() - dims, large.dim())))
+
+
+def select_elements(value, index, count):
+    """Select some elements of a per element attribute.
+
+    Scalars, and tensors whose last dimension does not match the number of
+        elements, are shared by all the elements and returned unchanged.
+
+    Args:
+        value (float or tensor): the attribute, whose last dimension spans the
+            elements.
+        index (tensor): the selected elements.
+        count (int): the number of elements.
+    Returns:
+        float or tensor: the attribute of the selected elements.
+    """
+    if torch.is_tensor(value) and value.dim() and value.size(-1) == count > 1:
+        return value[..., index]
+    return value
+
+
+def permute_elements(value, order):
+    """Reorder a per element attribute, whose last dimension spans the elements."""
+    return select_elements(value, order, len(order))
+
+
+def concatenate_elements(values, counts):
+    """Concatenate per element attributes of several element groups.
+
+    Args:
+        values (sequence): the attribute of each group. A scalar, or a tensor whose
+            last dimension has size one, is shared by the elements of its group.
+            Leading dimensions are ensemble batch dimensions, which must broadcast.
+        counts (sequence): the number of elements of each group.
+    Returns:
+        float or tensor: the attribute of the concatenated elements, or the shared
+            value itself if all the groups share the same scalar.
+    """
+    first = values[0]
+    if not torch.is_tensor(first) and all(
+        not torch.is_tensor(value) and value == first for value in values
+    ):
+        return first
+    tensors = [torch.as_tensor(value) for value in values]
+    tensors = [tensor if tensor.dim() else tensor[None] for tensor in tensors]
+    batch = torch.broadcast_shapes(*(tensor.size()[:-1] for tensor in tensors))
+    return torch.cat(
+        [tensor.expand(*batch, count) for tensor, count in zip(tensors, counts)], -1
+    )
+
+
+def as_index(index, size=None):
+    """Convert ids into a compact index tensor.
+
+    Sequences, NumPy arrays and tensors become contiguous int32 tensors, or int64
+        ones when the ids do not fit in 32 bits. NumPy arrays are wrapped by
+        `torch.from_numpy`, so int32 arrays are not copied. Boolean masks are
+        converted into the ids of their true entries. Call it once when the ids
+        are given, rather than at every use.
+
+    Args:
+        index (sequence, array, slice or tensor): the ids.
+        size (int): the number of indexed items. If given, the ids are checked
+            against it, negative ids count from the end, and slices are expanded.
+            Otherwise, slices are returned unchanged.
+    Returns:
+        tensor or slice: the index.
+    Raises:
+        IndexError: if some ids are out of range.
+    """
+    if isinstance(index, slice):
+        return index if size is None else as_index(torch.arange(size)[index], size)
+    if isinstance(index, np.ndarray):
+        index = torch.from_numpy(np.ascontiguousarray(index))
+    elif not torch.is_tensor(index):
+        index = torch.as_tensor(index)
+        if not index.numel():
+            index = index.long()
+    if index.dtype == torch.bool:
+        (index,) = torch.nonzero(index, as_tuple=True)
+    if index.is_floating_point() or index.is_complex():
+        raise TypeError(f"The ids must be integers, not {index.dtype}.")
+    low, high = (index.min(), index.max()) if index.numel() else (0, 0)
+    if size is not None:
+        if low < -size or high >= size:
+            raise IndexError(f"The ids are out of range for {size} items.")
+        if low < 0:
+            index = index.remainder(size)
+        low, high = 0, size - 1
+    dtype = torch.int32 if -INT32_MAX <= low and high <= INT32_MAX else torch.long
+    return index.to(dtype).contiguous()
 
 
 def assemble(length, conn, inputs):
     """Assemble the inputs according to the connectivity."""
-    storage = torch.zeros(length, inputs.size(2))
-    for j in range(storage.size(1)):
-        for i in range(conn.size(1)):
-            # Add the elements of the input vector, according to the indices in
-            #  conn.
-            # Dev notes: This is faster but equivalent to
-            # storage[:, j].put_(conn[:, i], inputs[:, i, j], accumulate=True)
-            # conn and inputs have two batch dimensions. Instead of the loop over
-            # i we could have generated views of both tensors.
-            storage[:, j] += torch.bincount(
-                conn[:, i], weights=inputs[:, i, j], minlength=storage.size(0)
-            )
-    return storage
+    return Assembler(conn, length)(inputs)
+
+
+class Assembler:
+    """Scatter element values into nodal values.
+
+    The connectivity is flattened once at construction, so every call performs the
+        whole scatter with a single `index_add_`, and `gather` reads the element
+        values back with the same index. Build it once per element group and
+        reuse it. The flattened index is kept in 64 bits even for a 32 bit
+        connectivity, because `index_add_` is several times slower with 32 bit
+        indices on the CPU. It is the only index the assembler keeps, and it is a
+        view of a 64 bit connectivity.
+
+    Args:
+        conn (tensor): the connectivity, with one row per element.
+        length (int): the number of nodes.
+        dtype: the dtype in which the values are accumulated. By default, the one
+            of the inputs.
+    """
+
+    def __init__(self, conn, length, dtype=None):
+        self.shape = conn.size()
+        self.length = length
+        self.dtype = dtype
+        self.index = conn.reshape(-1).long()
+
+    def __call__(self, inputs, out=None, accumulate=False):
+        """Assemble the inputs.
+
+        Args:
+            inputs (tensor): the element values, with shape
+                `(..., elements, nodes per element, components)`. The leading
+                dimensions, if any, are batch dimensions.
+            out (tensor): optional buffer of shape `(..., length, components)` that
+                receives the result. Its dtype takes precedence over `dtype`.
+            accumulate (bool): if True, add the result to the contents of `out`
+                instead of overwriting them.
+        Returns:
+            tensor: the assembled nodal values.
+        """
+        batch = inputs.size()[:-3]
+        values = inputs.reshape(*batch, -1, inputs.size(-1))
+        if out is None:
+            dtype = values.dtype if self.dtype is None else self.dtype
+            out = values.new_zeros(*batch, self.length, values.size(-1), dtype=dtype)
+        elif not accumulate:
+            out.zero_()
+        return out.index_add_(values.dim() - 2, self.index, values.to(out.dtype))
+
+    def gather(self, values):
+        """Get the nodal values of each element.
+
+        Args:
+            values (tensor): the nodal values, with shape `(..., length, components)`.
+        Returns:
+            tensor: shape `(..., elements, nodes per element, components)`.
+        """
+        return values[..., self.index, :].unflatten(-2, self.shape)
+
+
+def element_pattern(dofs):
+    """Get the row and column indices of the entries of element matrices.
+
+    Args:
+        dofs (tensor): the global degrees of freedom of each element, with shape
+            `(elements, m)`.
+    Returns:
+        (tensor, tensor): the flattened rows and columns of the `(elements, m, m)`
+            element matrices.
+    """
+    m = dofs.size(1)
+    rows = dofs[:, :, None].expand(-1, m, m).reshape(-1)
+    cols = dofs[:, None, :].expand(-1, m, m).reshape(-1)
+    return rows, cols
+
+
+class SparseAssembler:
+    """Assemble entries of element matrices into a sparse CSR matrix.
+
+    The sparsity pattern and the position of every entry in it are computed once at
+        construction, so each call only sums the values with a single `index_add_`.
+
+    Args:
+        rows (tensor): the row of each entry.
+        cols (tensor): the column of each entry.
+        size (int): the number of rows and columns of the square matrix.
+    """
+
+    def __init__(self, rows, cols, size):
+        self.size = size
+        keys = rows.long() * size + cols.long()
+        keys, self.index = torch.unique(keys, sorted=True, return_inverse=True)
+        row = keys // size
+        self.col = keys - row * size
+        counts = torch.bincount(row, minlength=size)
+        self.crow = torch.cat((counts.new_zeros(1), counts.cumsum(0)))
+        (self.diagonal_index,) = torch.nonzero(row == self.col, as_tuple=True)
+        self.diagonal_rows = row[self.diagonal_index]
+
+    @property
+    def nnz(self):
+        """The number of stored entries of the assembled matrix."""
+        return self.col.numel()
+
+    def __call__(self, values, out=None):
+        """Assemble the entries.
+
+        Args:
+            values (tensor): the value of each entry, in the order of `rows` and
+                `cols`.
+            out (tensor): optional buffer of size `nnz` that receives the values of
+                the assembled matrix.
+        Returns:
+            tensor: the assembled sparse CSR matrix.
+        """
+        if out is None:
+            out = values.new_zeros(self.nnz)
+        else:
+            out.zero_()
+        out.index_add_(0, self.index, values.reshape(-1))
+        return torch.sparse_csr_tensor(
+            self.crow, self.col, out, (self.size, self.size)
+        )
+
+    def diagonal(self, matrix):
+        """Extract the diagonal of a matrix assembled by this object."""
+        values = matrix.values()
+        diagonal = values.new_zeros(self.size)
+        diagonal[self.diagonal_rows] = values[self.diagonal_index]
+        return diagonal
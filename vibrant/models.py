@@ -1,6 +1,101 @@
+from collections import namedtuple
+from contextlib import contextmanager
+from math import inf
+
+import numpy as np
 import torch
 
+from vibrant.constraints import ConstraintTable, Prescribe
+from vibrant.elements import fuse
+from vibrant.linalg import conjugate_gradient
+from vibrant.loads import Gravity, Load, LoadTable
+from vibrant.math_extensions import SparseAssembler, element_pattern
 from vibrant.nodes import Nodes
+from vibrant.ordering import hilbert_order, inverse_permutation, reverse_cuthill_mckee
+from vibrant.profiling import NULL_PHASE, Profiler
+
+
+StableTimeStep = namedtuple("StableTimeStep", ["dt", "group", "element"])
+StableTimeStep.__doc__ = """Critical time step of a model.
+
+Attributes:
+    dt (float): the critical time step.
+    group (int): the index in `Model.elements` of the controlling element group.
+    element (int): the index of the controlling element within its group.
+"""
+
+StaticSolution = namedtuple("StaticSolution", ["converged", "iterations", "residual"])
+StaticSolution.__doc__ = """Outcome of a static solution.
+
+Attributes:
+    converged (bool): whether the residual reached the tolerance.
+    iterations (int): the number of Newton iterations performed.
+    residual (float): the norm of the final residual force on the free dofs.
+"""
+
+
+def _free_operator(K, free):
+    """Restrict the product with K to the free dofs, leaving the others unchanged."""
+
+    def matvec(x):
+        return (K @ (x * free)[:, None])[:, 0] * free + x * (1 - free)
+
+    return matvec
+
+
+Modes = namedtuple("Modes", ["omega", "shapes"])
+Modes.__doc__ = """Natural vibration modes.
+
+Attributes:
+    omega (tensor): the angular frequencies, in increasing order.
+    shapes (tensor): the mass normalized mode shapes, with shape
+        `(modes, nodes, dim)`. They are zero at the constrained dofs.
+"""
+
+
+def _state_dicts(items):
+    """Get the state of the items with a `state_dict` method, or None."""
+    return [
+        item.state_dict() if hasattr(item, "state_dict") else None for item in items
+    ]
+
+
+def _versioned(values):
+    """Pair each value with its version, to detect when it is replaced or modified.
+
+    The pairs are compared by `_same_state`, which compares the values by identity,
+        so tensors modified in place are caught by their version.
+    """
+    return [(value, getattr(value, "_version", None)) for value in values]
+
+
+def _fusion_state(groups):
+    """Get what the merged groups are built from, to detect when it changes.
+
+    Besides each group and its revision, it holds the per element attributes and
+        the parameters of the materials that can be concatenated, since merged
+        groups hold copies of them.
+    """
+    state = []
+    for els in groups:
+        values = [getattr(els, name) for name in els.element_attributes]
+        if hasattr(type(els.material), "concatenate"):
+            values += vars(els.material).values()
+        state.append((els, els.revision))
+        state += _versioned(values)
+    return state
+
+
+def _same_state(state, previous):
+    """Check whether two lists of `(value, version)` pairs match."""
+    return (
+        previous is not None
+        and len(state) == len(previous)
+        and all(
+            value is other and version == other_version
+            for (value, version), (other, other_version) in zip(state, previous)
+        )
+    )
 
 
 class Model:
@@ -10,41 +105,596 @@ class Model:
         properties like the time and damping factor.
 
     Args:
-        nodes (Nodes or 2D tensor): The nodes of the model. If it is a tensor, it
-            corresponds to the initial position of the nodes.
+        nodes (Nodes, 2D tensor or array): The nodes of the model. If it is a tensor
+            or a NumPy array, it corresponds to the initial position of the nodes.
         elements (Elements):
+        time (float): the initial time.
+        damping (float): the mass proportional damping factor.
+        dtype: the dtype of the element kernels. See `to`.
+        accumulate_dtype: the dtype of the nodal state and the assembled nodal
+            vectors. See `to`.
+        fuse (bool): evaluate the forces and the mass of compatible element groups
+            together. See `fused_elements`.
+        profile (bool or Profiler): record the time, the calls and the memory of
+            each phase of the force evaluation in `profiler`. See `profile`.
 
     """
 
-    def __init__(self, nodes=None, elements=None, time=0, damping=0):
+    def __init__(
+        self,
+        nodes=None,
+        elements=None,
+        time=0,
+        damping=0,
+        dtype=None,
+        accumulate_dtype=None,
+        fuse=True,
+        profile=False,
+    ):
 
-        self.nodes = Nodes(nodes) if isinstance(nodes, torch.Tensor) else nodes
+        if isinstance(nodes, (torch.Tensor, np.ndarray)):
+            nodes = Nodes(nodes)
+        self.nodes = nodes
         self.elements = [] if elements is None else [elements]
         self.loads = []
         self.constraints = []
         self.damping = damping
         self.time = time
+        self.fuse = fuse
+        self.dtype = None
+        self.accumulate_dtype = None
+        self._stiffness_assembler = None
+        self._stiffness_key = None
+        self._constraint_table = None
+        self._constraint_key = None
+        self._load_table = None
+        self._load_key = None
+        self._fused = None
+        self._fused_state = None
+        self.executor = None  # evaluates the element forces, see vibrant.parallel
+        self.profiler = None
+        if profile:
+            self.profiler = profile if isinstance(profile, Profiler) else Profiler(
+                device=None if self.nodes is None else self.nodes.X.device
+            )
+        if dtype is not None or accumulate_dtype is not None:
+            self.to(dtype, accumulate_dtype)
+
+    def to(self, dtype=None, accumulate_dtype=None):
+        """Apply a precision policy to the model.
+
+        For example, `model.to(torch.float32, torch.float64)` evaluates the elements
+            in single precision, halving the memory of the element data, while the
+            nodal state, the nodal forces and the time integration keep double
+            precision. Call it again after adding element groups, constraints or
+            loads.
+
+        Args:
+            dtype: the dtype of the element kernels and the material parameters.
+            accumulate_dtype: the dtype of the nodal state and of the assembled
+                nodal vectors. By default, `dtype`.
+        Returns:
+            Model: the model.
+        """
+        accumulate_dtype = dtype if accumulate_dtype is None else accumulate_dtype
+        self.dtype = dtype
+        self.accumulate_dtype = accumulate_dtype
+        if accumulate_dtype is not None:
+            self.nodes.to(accumulate_dtype)
+            for item in self.constraints + self.loads:
+                if hasattr(item, "to"):
+                    item.to(accumulate_dtype)
+        for els in self.elements:
+            els.to(dtype, accumulate_dtype)
+        self._stiffness_assembler = None
+        self._fused = None
+        return self
+
+    @contextmanager
+    def profile(self, trace=True):
+        """Profile the model within a `with` block.
+
+        For example:
+
+            with model.profile() as profiler:
+                CentralDifference(model).run(1.0)
+            print(profiler.summary())
+            profiler.chrome_trace("trace.json")
+
+        Each element group is a phase, named after its position and type. The
+            `Load` objects are merged in the load table and applied with a single
+            scatter, so they are recorded together as `loads/table`. Other loads
+            are recorded one by one, as `loads/{type}`.
+
+        Args:
+            trace (bool): keep every call for the Chrome trace.
+        Yields:
+            Profiler: the profiler, which is detached at the end of the block.
+        """
+        previous = self.profiler
+        self.profiler = Profiler(trace, self.nodes.X.device)
+        try:
+            yield self.profiler
+        finally:
+            self.profiler = previous
+
+    def _phase(self, name, *args):
+        """Get a context manager that profiles a phase, or does nothing.
+
+        The name is only formatted with `args` when profiling, so disabled phases
+            cost one attribute check.
+        """
+        if self.profiler is None:
+            return NULL_PHASE
+        return self.profiler.phase(name.format(*args) if args else name)
+
+    def fused_elements(self):
+        """Return the element groups merged for evaluation.
+
+        Compatible groups, for example trusses of different sections that share a
+            material, are concatenated into one group, so their forces are
+            evaluated in a single pass. The merged groups are rebuilt when the
+            list of groups is modified, when the connectivity, the attributes or
+            the material of a group are replaced, which is tracked by the
+            `revision` of each group, or when the parameters of a merged
+            material are replaced or modified in place.
+
+        Returns:
+            list: a `(group, members)` pair per merged group, as in
+                `vibrant.elements.fuse`.
+        """
+        if not self.fuse:
+            return [(els, [(els, 0, len(els.conn))]) for els in self.elements]
+        state = _fusion_state(self.elements)
+        if self._fused is None or not _same_state(state, self._fused_state):
+            self._fused = fuse(self.elements)
+            self._fused_state = state
+        return self._fused
 
     def mass(self):
         """Update and return the mass."""
         if self.nodes.m is None:
-            self.nodes.m = sum(els.mass() for els in self.elements)
+            with self._phase("mass") as phase:
+                self.nodes.m = sum(els.mass() for els, _ in self.fused_elements())
+                phase.output(self.nodes.m)
         return self.nodes.m
 
-    def force(self):
-        """Update and return the nodal forces."""
-        internal_force = sum(els.force() for els in self.elements)
-        external_force = sum(load.force() for load in self.loads)
-        self.nodes.f = internal_force + external_force
-        if self.damping:
-            self.nodes.f = -self.damping * self.mass() * self.nodes.v
-        return self.nodes.f
+    def internal_force(self, out=None, accumulate=False):
+        """Compute the nodal forces of the elements.
+
+        All the groups are assembled in the same buffer. The strain and the stress
+            of merged groups are mapped back to the original groups as views. If an
+            executor is set, such as a `vibrant.parallel.PartitionedModel`, it
+            evaluates the forces instead, unless they must be differentiated.
+
+        Args:
+            out (tensor): optional buffer that receives the nodal forces.
+            accumulate (bool): if True, add the forces to the contents of `out`.
+        Returns:
+            tensor: the nodal forces.
+        """
+        if self.executor is not None and not (
+            torch.is_grad_enabled() and self.nodes.u.requires_grad
+        ):
+            with self._phase("elements/partitioned"):
+                return self.executor.internal_force(out, accumulate)
+        for i, (els, members) in enumerate(self.fused_elements()):
+            with self._phase("elements/{}:{.__name__}", i, type(els)) as phase:
+                out = els.force(out, accumulate)
+                phase.output(els.strain, els.stress)
+            accumulate = True
+            if len(members) > 1 and els.strain is not None:
+                axis = els.element_axis
+                for member, start, count in members:
+                    member.strain = els.strain.narrow(axis, start, count)
+                    member.stress = els.stress.narrow(axis, start, count)
+        if out is not None and not accumulate:
+            out.zero_()
+        return 0 if out is None else out
+
+    def external_force(self):
+        """Compute the nodal forces of the loads at the current time.
+
+        The `Load` objects are evaluated together through the load table. Other
+            loads must have a `force` method without arguments.
+        """
+        force = sum(load.force() for load in self.loads if not isinstance(load, Load))
+        table = self.load_table()
+        if len(table):
+            force = table.force(self.time) + force
+        return force
+
+    def load_table(self):
+        """Return the `Load` objects merged in a table.
+
+        The table is rebuilt when the loads, their nodes, values, components or
+            amplitudes are replaced, when their values are modified in place, or
+            when the mass or the dtype of the nodes change.
+        """
+        loads = [load for load in self.loads if isinstance(load, Load)]
+        if any(isinstance(load, Gravity) for load in loads):
+            self.mass()
+        values = [self.nodes.m, self.nodes.u.dtype]
+        for load in loads:
+            values += [load, load.value, load.amplitude]
+            values += [getattr(load, name, None) for name in ("node_ids", "components")]
+        key = _versioned(values)
+        if self._load_table is None or not _same_state(key, self._load_key):
+            self._load_table = LoadTable(loads, self)
+            self._load_key = key
+        return self._load_table
+
+    def static_force(self, out=None):
+        """Compute the internal and external nodal forces, without damping.
+
+        Args:
+            out (tensor): optional buffer that receives the forces. It is only
+                replaced by a new tensor if the loads broadcast the forces to a
+                larger shape.
+        Returns:
+            tensor: the nodal forces.
+        """
+        force = self.internal_force(out)
+        if not torch.is_tensor(force):
+            with self._phase("loads"):
+                return force + self.external_force()
+        for load in self.loads:
+            if not isinstance(load, Load):
+                with self._phase("loads/{.__name__}", type(load)):
+                    load_force = load.force()
+                    if force is out and force.size() == load_force.size():
+                        force.add_(load_force)
+                    else:
+                        force = force + load_force
+        table = self.load_table()
+        if len(table):
+            with self._phase("loads/table"):
+                if force.size() == table.shape:
+                    table.force(self.time, force, accumulate=True)
+                else:
+                    force = force + table.force(self.time)
+        return force
+
+    def force(self, out=None):
+        """Update and return the nodal forces, including the prescribed ones.
+
+        Args:
+            out (tensor): optional buffer that receives the forces, as in
+                `static_force`. The damping and the prescribed forces are applied
+                in place.
+        Returns:
+            tensor: the nodal forces, which are also stored in `nodes.f`.
+        """
+        with self._phase("force"):
+            force = self.static_force(out)
+            if self.damping:
+                with self._phase("damping"):
+                    mass, v = self.mass(), self.nodes.v
+                    if force is out and force.size() == v.size():
+                        force.addcmul_(mass, v, value=-self.damping)
+                    else:
+                        force = force - self.damping * mass * v
+            constrained = "f" in self.constraint_table().fields()
+            shape = self.nodes.u.size()
+            if constrained and (force is not out or force.size() != shape):
+                force = force.expand(shape).clone()
+            self.nodes.f = force
+            if constrained:
+                self.apply_constraints("f")
+        return force
 
     def acceleration(self):
         """Update the mass and the force, and calculate the acceleration."""
         # return nodal acceleration
-        return self.force() / self.mass()
+        with self._phase("acceleration"):
+            return self.force() / self.mass()
+
+    def commit(self):
+        """Accept the trial state of the materials with internal variables.
+
+        Call it after each converged step. Until then, the materials evaluate every
+            force from the last committed state, so a step can be retried.
+        """
+        if self.executor is not None:
+            self.executor.commit()
+        for els in self.elements:
+            if hasattr(els.material, "commit"):
+                els.material.commit()
+
+    def critical_time_steps(self):
+        """Compute the critical time step of every element of every group."""
+        return [els.critical_time_step() for els in self.elements]
+
+    def stable_time_step(self):
+        """Find the critical time step of the model and the element controlling it.
+
+        Returns:
+            StableTimeStep: the time step, and the group and element that set it.
+        """
+        result = StableTimeStep(inf, None, None)
+        for group, dts in enumerate(self.critical_time_steps()):
+            if dts.numel() == 0:
+                continue
+            dt, index = dts.reshape(-1).min(0)
+            if dt.item() < result.dt:
+                element = index.item() % dts.size(-1)
+                result = StableTimeStep(dt.item(), group, element)
+        return result
+
+    def stiffness(self):
+        """Assemble the tangent stiffness of all the element groups.
+
+        The sparsity pattern is computed once and reused until the element groups
+            or their connectivities change.
+
+        Returns:
+            tensor: a sparse CSR matrix, whose rows and columns follow the flattened
+                nodal displacements.
+        """
+        key = [(id(els), id(els.conn)) for els in self.elements]
+        if self._stiffness_assembler is None or self._stiffness_key != key:
+            rows, cols = zip(*(element_pattern(els.dofs()) for els in self.elements))
+            size = self.nodes.u.numel()
+            self._stiffness_assembler = SparseAssembler(
+                torch.cat(rows), torch.cat(cols), size
+            )
+            self._stiffness_key = key
+        values = [els.element_stiffness().reshape(-1) for els in self.elements]
+        return self._stiffness_assembler(torch.cat(values).to(self.nodes.u.dtype))
+
+    def stiffness_diagonal(self):
+        """Assemble the diagonal of the tangent stiffness without forming the matrix.
+
+        Returns:
+            tensor: shape `(nodes, dim)`.
+        """
+        diagonal = torch.zeros_like(self.nodes.X)
+        for els in self.elements:
+            entries = els.element_stiffness().diagonal(dim1=-2, dim2=-1)
+            entries = entries.reshape(*els.conn.size(), -1)
+            els.assembler()(entries, out=diagonal, accumulate=True)
+        return diagonal
+
+    def modes(self, k, tol=None, niter=None):
+        """Compute the lowest natural frequencies and mode shapes.
+
+        Solve `K phi = omega^2 M phi` with the tangent stiffness and the lumped mass,
+            after eliminating the constrained dofs. Since M is diagonal, the problem
+            is scaled to a standard symmetric one and solved with the sparse LOBPCG
+            method, preconditioned with its diagonal. Small problems, with fewer than
+            `3 k` free dofs, are solved with a dense eigensolver instead.
+
+        Args:
+            k (int): the number of modes. At most, the number of free dofs.
+            tol (float): the residual tolerance of LOBPCG.
+            niter (int): the maximum number of LOBPCG iterations.
+        Returns:
+            Modes: the angular frequencies and the mode shapes.
+        """
+        free = ~self.constrained_dofs().reshape(-1)
+        (free_dofs,) = torch.nonzero(free, as_tuple=True)
+        size = self.nodes.u.numel()
+        dofs = len(free_dofs)
+        k = min(k, dofs)
+        scale = self.mass().expand_as(self.nodes.u).reshape(-1)[free_dofs].rsqrt()
+        numbering = torch.full((size,), -1, dtype=torch.long)
+        numbering[free_dofs] = torch.arange(dofs)
+        K = self.stiffness().to_sparse_coo().coalesce()
+        rows, cols = numbering[K.indices()]
+        keep = (rows >= 0) & (cols >= 0)
+        rows, cols = rows[keep], cols[keep]
+        values = K.values()[keep] * scale[rows] * scale[cols]
+        if 3 * k >= dofs:
+            A = torch.zeros(dofs, dofs, dtype=values.dtype)
+            A[rows, cols] = values
+            eigenvalues, vectors = torch.linalg.eigh(A)
+            eigenvalues, vectors = eigenvalues[:k], vectors[:, :k]
+        else:
+            A = torch.sparse_coo_tensor(torch.stack((rows, cols)), values, (dofs, dofs))
+            diagonal = values.new_zeros(dofs).index_add_(
+                0, rows[rows == cols], values[rows == cols]
+            )
+            diagonal = torch.where(diagonal > 0, diagonal, torch.ones_like(diagonal))
+            eye = torch.arange(dofs).expand(2, dofs)
+            iK = torch.sparse_coo_tensor(eye, diagonal.reciprocal(), (dofs, dofs))
+            eigenvalues, vectors = torch.lobpcg(
+                A.coalesce(), k, iK=iK, tol=tol, niter=niter, largest=False
+            )
+            eigenvalues, order = eigenvalues.sort()
+            vectors = vectors[:, order]
+        shapes = vectors.new_zeros(size, k)
+        shapes[free_dofs] = scale[:, None] * vectors
+        omega = eigenvalues.clamp(min=0).sqrt()
+        return Modes(omega, shapes.T.reshape(k, *self.nodes.u.size()))
+
+    def constrained_dofs(self):
+        """Get a `(nodes, dim)` boolean mask of the constrained degrees of freedom."""
+        mask = torch.zeros(self.nodes.X.size(), dtype=torch.bool)
+        for constraint in self.constraints:
+            constraint.mark(mask)
+        return mask
+
+    def solve_static(self, rtol=1e-8, atol=0, max_iterations=20, linear_rtol=1e-10):
+        """Find the static equilibrium with the Newton-Raphson method.
+
+        The displacement is updated in place. The prescribed displacements are
+            applied first, and the constrained degrees of freedom keep their
+            displacement. Each linear system is solved with the conjugate gradient
+            method preconditioned with the stiffness diagonal. The material state
+            is committed on convergence.
+
+        Args:
+            rtol (float): the tolerance of the residual force relative to the initial
+                residual.
+            atol (float): the absolute tolerance of the residual force.
+            max_iterations (int): the maximum number of Newton iterations.
+            linear_rtol (float): the relative tolerance of the linear solutions.
+        Returns:
+            StaticSolution: the convergence information.
+        """
+        self.apply_constraints("u")
+        free = (~self.constrained_dofs()).reshape(-1).to(self.nodes.u.dtype)
+        tolerance = None
+        for iteration in range(max_iterations + 1):
+            residual = self.static_force().reshape(-1) * free
+            norm = residual.norm().item()
+            if tolerance is None:
+                tolerance = max(rtol * norm, atol)
+            if norm <= tolerance:
+                self.commit()
+                return StaticSolution(True, iteration, norm)
+            if iteration == max_iterations:
+                break
+            K = self.stiffness()
+            diagonal = self._stiffness_assembler.diagonal(K) * free
+            diagonal = torch.where(diagonal > 0, diagonal, torch.ones_like(diagonal))
+            du, _ = conjugate_gradient(
+                _free_operator(K, free),
+                residual,
+                preconditioner=diagonal.reciprocal().mul,
+                rtol=linear_rtol,
+            )
+            self.nodes.u.add_(du.view_as(self.nodes.u))
+        return StaticSolution(False, max_iterations, norm)
+
+    def reorder(self, method="rcm", elements=True):
+        """Renumber the nodes to improve the locality of the element operations.
+
+        The nodal state is permuted, and the connectivities of the element groups
+            and the `node_ids` of the constraints and loads are renumbered
+            consistently. The cached mass and stiffness pattern are discarded, and
+            the solvers holding nodal buffers must be reset.
+
+        Args:
+            method (str): "rcm" for the reverse Cuthill-McKee ordering, which
+                minimizes the bandwidth, or "hilbert" to sort the nodes along a
+                Hilbert curve through their reference positions.
+            elements (bool): also sort the elements of each group by their lowest
+                node id, so they visit the nodes in increasing order.
+        Returns:
+            tensor: the permutation, such that the new node `i` is the old node
+                `order[i]`. A nodal field of the original model is recovered with
+                `field[..., inverse_permutation(order), :]`.
+        """
+        nodes = self.nodes
+        if method == "rcm":
+            conns = [els.conn for els in self.elements]
+            order = reverse_cuthill_mckee(conns, len(nodes))
+        elif method == "hilbert":
+            order = hilbert_order(nodes.X)
+        else:
+            raise ValueError(f"Unknown ordering method {method}.")
+        order = order.to(nodes.X.device)
+        inverse = inverse_permutation(order)
+        nodes.X = nodes.X[order]
+        nodes.u = nodes.u[..., order, :]
+        nodes.v = nodes.v[..., order, :]
+        nodes.m = None
+        if nodes.f is not None:
+            nodes.f = nodes.f[..., order, :]
+        for els in self.elements:
+            els.conn = inverse.to(els.conn.dtype)[els.conn]
+            if elements:
+                els.permute(torch.argsort(els.conn.amin(1), stable=True))
+        everything = torch.arange(len(nodes), device=inverse.device)
+        for item in self.constraints + self.loads:
+            if hasattr(item, "node_ids"):
+                item.node_ids = inverse[everything[item.node_ids]]
+        self._stiffness_assembler = None
+        return order
+
+    def state_dict(self):
+        """Get the state of the model.
+
+        It contains the time, the damping, the nodal tensors, including the cached
+            mass, and the state of the element groups, constraints and loads that
+            have a `state_dict` method. The materials and the functions are not
+            included, so the model is restored into an equivalent one.
+        """
+        return {
+            "time": self.time,
+            "damping": self.damping,
+            "nodes": self.nodes.state_dict(),
+            "elements": [els.state_dict() for els in self.elements],
+            "constraints": _state_dicts(self.constraints),
+            "loads": _state_dicts(self.loads),
+        }
+
+    def load_state_dict(self, state):
+        """Restore a state obtained with `state_dict` into an equivalent model."""
+        for name in ("elements", "constraints", "loads"):
+            if len(state[name]) != len(getattr(self, name)):
+                raise ValueError(f"The checkpoint has a different number of {name}.")
+        self.time = state["time"]
+        self.damping = state["damping"]
+        self.nodes.load_state_dict(state["nodes"])
+        for els, els_state in zip(self.elements, state["elements"]):
+            els.load_state_dict(els_state)
+        for item, item_state in zip(
+            self.constraints + self.loads, state["constraints"] + state["loads"]
+        ):
+            if item_state is not None:
+                item.load_state_dict(item_state)
+
+    def save_checkpoint(self, path, solver=None):
+        """Save the state of the model, and optionally of a solver, to a file.
+
+        The tensors are stored uncompressed, so `load_checkpoint` maps them
+            directly from the file instead of reading them.
+        """
+        state = {"model": self.state_dict()}
+        if solver is not None:
+            state["solver"] = solver.state_dict()
+        torch.save(state, path)
+
+    def load_checkpoint(self, path, solver=None):
+        """Restore the state saved with `save_checkpoint`.
+
+        The model, and the solver, must be built as the ones that were saved.
+            Resuming the run then reproduces the uninterrupted one exactly. The
+            tensors are memory mapped when the version of torch supports it, and
+            their pages are only copied when they are modified.
+        """
+        try:
+            state = torch.load(path, mmap=True, weights_only=True)
+        except TypeError:
+            state = torch.load(path)
+        self.load_state_dict(state["model"])
+        if solver is not None:
+            solver.load_state_dict(state["solver"])
+
+    def constraint_table(self):
+        """Return the compiled `Prescribe` constraints.
+
+        The table is rebuilt when the constraints, their nodes or their values are
+            replaced, or when the dtype of the nodes changes.
+        """
+        prescribed = [c for c in self.constraints if isinstance(c, Prescribe)]
+        key = [(id(c), id(c.node_ids), id(c.value)) for c in prescribed]
+        key.append(self.nodes.u.dtype)
+        if self._constraint_table is None or self._constraint_key != key:
+            self._constraint_table = ConstraintTable(
+                prescribed, self.nodes.X.size(), self.nodes.u.dtype, self.nodes.X.device
+            )
+            self._constraint_key = key
+        return self._constraint_table
+
+    def apply_constraints(self, field="v", target=None, time=None):
+        """Apply the constraints on a field, in place.
 
-    def apply_constraints(self, field="v"):
+        Args:
+            field (str): the field, "u", "v", "a" or "f".
+            target (tensor): the values of the field. By default, the nodal tensor
+                with the name of the field.
+            time (float): the time at which the prescribed values are evaluated. By
+                default, the model time.
+        """
+        time = self.time if time is None else time
+        if target is None:
+            target = getattr(self.nodes, field)
+        with self._phase("constraints/{}", field):
+            self.constraint_table().apply(field, target, time)
         for constraint in self.constraints:
-            constraint(field)
+            if not isinstance(constraint, Prescribe):
+                with self._phase("constraints/{}/{.__name__}", field, type(constraint)):
+                    constraint(field)
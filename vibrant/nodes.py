@@ -1,18 +1,71 @@
+import numpy as np
 import torch
 
 
+FIELDS = ("X", "u", "v", "m", "f")
+
+
+def _as_tensor(value):
+    """Wrap NumPy arrays in tensors that share their memory."""
+    return torch.from_numpy(value) if isinstance(value, np.ndarray) else value
+
+
 class Nodes:
-    """Nodes container."""
+    """Nodes container.
+
+    The reference positions `X` are shared, but the displacement `u` and velocity
+        `v` may have leading batch dimensions to simulate an ensemble of variants
+        of the same mesh at once.
+
+    NumPy arrays are wrapped with `torch.from_numpy`, so they share their memory
+        with the nodal tensors.
 
-    def __init__(self, X, u=None, v=None):
+    Args:
+        X (tensor or array): the reference positions, with one row per node.
+        u (tensor or array): the displacements. Zero by default.
+        v (tensor or array): the velocities. Zero by default.
+        batch_size (int): the number of ensemble variants of the default `u` and
+            `v`. If it is None, they have no batch dimension.
+        dtype: the dtype of the nodal tensors. By default, the one of `X`.
+    """
+
+    def __init__(self, X, u=None, v=None, batch_size=None, dtype=None):
+        X, u, v = (_as_tensor(value) for value in (X, u, v))
+        X = X if dtype is None else X.to(dtype)
+        shape = X.size() if batch_size is None else (batch_size, *X.size())
         self.X = X
-        self.u = u if u is not None else torch.zeros_like(X)
-        self.v = v if v is not None else torch.zeros_like(X)
+        self.u = u if u is not None else X.new_zeros(shape)
+        self.v = v if v is not None else X.new_zeros(shape)
         self.m = None
         self.f = None
+        if dtype is not None:
+            self.to(dtype)
 
     def __len__(self):
         return len(self.X)
 
+    @property
+    def batch_shape(self):
+        """The ensemble batch dimensions of the nodal state."""
+        return self.u.size()[:-2]
+
     def x(self):
         return self.X + self.u
+
+    def to(self, dtype):
+        """Cast the nodal tensors to `dtype`, in place, and return the nodes."""
+        for name in FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                setattr(self, name, value.to(dtype))
+        return self
+
+    def state_dict(self):
+        """Get the nodal tensors, skipping the ones not computed yet."""
+        state = {name: getattr(self, name) for name in FIELDS}
+        return {name: value for name, value in state.items() if value is not None}
+
+    def load_state_dict(self, state):
+        """Replace the nodal tensors with the ones in `state`."""
+        for name in FIELDS:
+            setattr(self, name, state.get(name))
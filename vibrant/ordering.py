@@ -0,0 +1,151 @@
+"""
+Node orderings.
+
+The element groups gather nodal values and scatter element values back to the
+    nodes, so the memory access pattern follows the node numbering. Numbering
+    nearby nodes consecutively improves the cache locality of those operations and
+    reduces the bandwidth of the stiffness matrix.
+
+An ordering is a permutation `order`, such that the new node `i` is the old node
+    `order[i]`.
+"""
+
+from collections import deque
+
+import torch
+
+
+def node_graph(conns, size):
+    """Build the node adjacency graph of several connectivities.
+
+    Args:
+        conns (iterable): the connectivities, with shape `(elements, nodes)`.
+        size (int): the number of nodes.
+    Returns:
+        (tensor, tensor): the compressed rows and the columns of the adjacency, in
+            CSR format, without self loops.
+    """
+    rows, cols = [], []
+    for conn in conns:
+        conn = torch.as_tensor(conn, dtype=torch.long)
+        n = conn.size(1)
+        rows.append(conn[:, :, None].expand(-1, n, n).reshape(-1))
+        cols.append(conn[:, None, :].expand(-1, n, n).reshape(-1))
+    rows = torch.cat(rows) if rows else torch.zeros(0, dtype=torch.long)
+    cols = torch.cat(cols) if cols else torch.zeros(0, dtype=torch.long)
+    keep = rows != cols
+    edges = torch.unique(rows[keep] * size + cols[keep])
+    rows, cols = edges // size, edges % size
+    crow = torch.zeros(size + 1, dtype=torch.long)
+    crow[1:] = torch.bincount(rows, minlength=size).cumsum(0)
+    return crow, cols
+
+
+def bandwidth(conns, order=None):
+    """Compute the largest difference between the ids of the nodes of an element.
+
+    Args:
+        conns (iterable): the connectivities, with shape `(elements, nodes)`.
+        order (tensor): an ordering of the nodes. The current one by default.
+    """
+    result = 0
+    for conn in conns:
+        conn = torch.as_tensor(conn, dtype=torch.long)
+        if order is not None:
+            conn = inverse_permutation(order)[conn]
+        if conn.numel():
+            spread = conn.max(1).values - conn.min(1).values
+            result = max(result, spread.max().item())
+    return result
+
+
+def inverse_permutation(order):
+    """Get the inverse of a permutation, which maps the old ids to the new ones."""
+    inverse = torch.empty_like(order)
+    inverse[order] = torch.arange(len(order), dtype=order.dtype, device=order.device)
+    return inverse
+
+
+def reverse_cuthill_mckee(conns, size):
+    """Order the nodes with the reverse Cuthill-McKee algorithm.
+
+    Each connected component is traversed breadth first, from a node of minimum
+        degree, visiting the neighbours in order of increasing degree.
+
+    Args:
+        conns (iterable): the connectivities, with shape `(elements, nodes)`.
+        size (int): the number of nodes.
+    Returns:
+        tensor: the permutation.
+    """
+    crow, cols = node_graph(conns, size)
+    degree = crow[1:] - crow[:-1]
+    crow, cols, degrees = crow.tolist(), cols.tolist(), degree.tolist()
+    visited = [False] * size
+    order = []
+    for start in torch.argsort(degree, stable=True).tolist():
+        if visited[start]:
+            continue
+        visited[start] = True
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            order.append(node)
+            neighbours = cols[crow[node] : crow[node + 1]]
+            neighbours = [n for n in neighbours if not visited[n]]
+            neighbours.sort(key=degrees.__getitem__)
+            for neighbour in neighbours:
+                visited[neighbour] = True
+            queue.extend(neighbours)
+    return torch.tensor(order[::-1], dtype=torch.long)
+
+
+def hilbert_order(X, bits=16):
+    """Order the nodes along a Hilbert space filling curve.
+
+    The positions are quantized in a grid of `2 ** bits` cells per side, and the
+        nodes are sorted by the distance along the curve of their cells, computed
+        with Skilling's algorithm.
+
+    Args:
+        X (tensor): the node positions, with shape `(nodes, dim)`.
+        bits (int): the resolution of the grid. `bits * dim` must be under 63.
+    Returns:
+        tensor: the permutation.
+    """
+    dim = X.size(1)
+    if bits * dim > 62:
+        raise ValueError(f"Too many bits ({bits}) for a {dim}D Hilbert curve.")
+    low = X.amin(0)
+    extent = (X.amax(0) - low).max()
+    extent = torch.where(extent > 0, extent, torch.ones_like(extent))
+    cells = ((X - low) / extent * (2 ** bits - 1)).round().to(torch.long)
+    axes = list(cells.unbind(1))
+    # invert or exchange the low bits, from the most significant one
+    q = 1 << (bits - 1)
+    while q > 1:
+        p = q - 1
+        for i in range(dim):
+            flip = (axes[i] & q) != 0
+            if i == 0:
+                axes[0] = torch.where(flip, axes[0] ^ p, axes[0])
+                continue
+            swap = (axes[0] ^ axes[i]) & p
+            axes[0] = torch.where(flip, axes[0] ^ p, axes[0] ^ swap)
+            axes[i] = torch.where(flip, axes[i], axes[i] ^ swap)
+        q >>= 1
+    # gray encode
+    for i in range(1, dim):
+        axes[i] = axes[i] ^ axes[i - 1]
+    t = torch.zeros_like(axes[0])
+    q = 1 << (bits - 1)
+    while q > 1:
+        t = torch.where((axes[-1] & q) != 0, t ^ (q - 1), t)
+        q >>= 1
+    axes = [axis ^ t for axis in axes]
+    # interleave the bits, from the most significant one
+    index = torch.zeros_like(axes[0])
+    for bit in range(bits - 1, -1, -1):
+        for axis in axes:
+            index = (index << 1) | ((axis >> bit) & 1)
+    return torch.argsort(index, stable=True)
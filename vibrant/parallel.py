@@ -0,0 +1,242 @@
+"""
+Partitioned force evaluation.
+
+The elements of a model are split into spatially compact partitions, each owned by
+    a worker process. The workers gather the displacement of their nodes from a
+    shared memory tensor, evaluate the forces of their elements in local node
+    numbering, and write them to a shared memory buffer. The parent process then
+    sums the contributions of the nodes shared by several partitions with a single
+    scatter.
+
+The workers are forked, so the element groups and their materials, including
+    functions that can not be pickled, are inherited rather than sent. It requires
+    the "fork" start method, which is available on Linux. The internal variables
+    of the materials are sent back to the model when the workers stop.
+"""
+
+import torch
+import torch.multiprocessing as mp
+
+from vibrant.elements import fuse
+from vibrant.nodes import Nodes
+from vibrant.ordering import hilbert_order
+
+
+def partition_elements(groups, X, parts):
+    """Split the elements of several groups into spatially compact partitions.
+
+    The elements of all the groups are sorted along a Hilbert curve through their
+        centroids, and the curve is cut into `parts` pieces with the same number of
+        elements, which keeps the number of nodes shared by partitions small.
+
+    Args:
+        groups (sequence): the element groups.
+        X (tensor): the node positions, with shape `(nodes, dim)`.
+        parts (int): the number of partitions.
+    Returns:
+        list: the partition of each element, one tensor per group.
+    """
+    centroids = torch.cat([X[els.conn].mean(1) for els in groups])
+    labels = torch.empty(len(centroids), dtype=torch.long)
+    labels[hilbert_order(centroids)] = (
+        torch.arange(len(centroids)) * parts // max(len(centroids), 1)
+    )
+    return list(labels.split([len(els.conn) for els in groups]))
+
+
+def _worker(connection, groups, nodes, node_ids, u, partial):
+    """Evaluate the forces of a partition on request."""
+    torch.set_num_threads(1)
+    while True:
+        command = connection.recv()
+        reply = None
+        try:
+            if command == "close":
+                break
+            if command == "force":
+                torch.index_select(u, -2, node_ids, out=nodes.u)
+                accumulate = False
+                for els, _ in groups:
+                    els.force(partial, accumulate)
+                    accumulate = True
+                if not accumulate:
+                    partial.zero_()
+            elif command == "commit":
+                for els, _ in groups:
+                    if hasattr(els.material, "commit"):
+                        els.material.commit()
+            elif command == "state":
+                reply = [
+                    member.material.state_dict()
+                    if hasattr(member.material, "state_dict")
+                    else None
+                    for _, members in groups
+                    for member, _, _ in members
+                ]
+            connection.send(reply)
+        except Exception as error:  # pylint: disable=broad-except
+            connection.send(error)
+    connection.close()
+
+
+class PartitionedModel:
+    """Evaluate the element forces of a model in several worker processes.
+
+    While it is running, `Model.internal_force` and `Model.commit` are delegated to
+        the workers, so the solvers use it transparently. Differentiable forces are
+        still evaluated in the parent process. The workers keep their own copy of
+        the element groups, so the strain and the stress of the model groups are
+        not updated. The committed internal variables of the materials are copied
+        back to the model groups by `close`, and the uncommitted trial state is
+        discarded. Use it as a context manager, or call `close` to stop the
+        workers.
+
+    Args:
+        model (Model): the model. Its nodes must not change size.
+        parts (int): the number of partitions and worker processes.
+        start_method (str): the multiprocessing start method. The workers inherit
+            the element groups, so it must be "fork".
+    """
+
+    def __init__(self, model, parts=2, start_method="fork"):
+        self.model = model
+        self.parts = parts
+        nodes = model.nodes
+        u = nodes.u
+        labels = partition_elements(model.elements, nodes.X, parts)
+        self.u = torch.empty_like(u).share_memory_()
+        self.node_ids = []
+        self.origins = []  # the model group and element ids of each worker group
+        partitions = []
+        for part in range(parts):
+            origins = {}
+            groups = []
+            for k, (els, label) in enumerate(zip(model.elements, labels)):
+                element_ids = torch.nonzero(label == part)[:, 0]
+                if len(element_ids):
+                    groups.append(els.select(element_ids))
+                    origins[id(groups[-1])] = (k, element_ids)
+            if not groups:
+                continue
+            conn = torch.cat([els.conn.reshape(-1) for els in groups])
+            node_ids, local = torch.unique(conn, return_inverse=True)
+            local_nodes = Nodes(nodes.X[node_ids], u=u[..., node_ids, :].clone())
+            for els, local_conn in zip(
+                groups, local.split([els.conn.numel() for els in groups])
+            ):
+                els.conn = local_conn.view_as(els.conn)
+                els.nodes = local_nodes
+            self.node_ids.append(node_ids)
+            fused = fuse(groups)
+            members = [member for _, group in fused for member, _, _ in group]
+            self.origins.append([origins[id(member)] for member in members])
+            partitions.append((fused, local_nodes, node_ids))
+        sizes = [len(node_ids) for node_ids in self.node_ids]
+        self.index = torch.cat(self.node_ids).long()  # for a fast index_add_
+        self.partial = u.new_zeros(*u.size()[:-2], sum(sizes), u.size(-1))
+        self.partial.share_memory_()
+        context = mp.get_context(start_method)
+        self.connections = []
+        self.processes = []
+        partials = self.partial.split(sizes, dim=-2)
+        for (groups, local_nodes, node_ids), partial in zip(partitions, partials):
+            parent, child = context.Pipe()
+            process = context.Process(
+                target=_worker,
+                args=(child, groups, local_nodes, node_ids, self.u, partial),
+                daemon=True,
+            )
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+        model.executor = self
+
+    def _broadcast(self, command):
+        """Send a command to all the workers and return their replies."""
+        for connection in self.connections:
+            connection.send(command)
+        replies = [connection.recv() for connection in self.connections]
+        for reply in replies:
+            if isinstance(reply, Exception):
+                raise RuntimeError(f"A force worker failed: {reply!r}") from reply
+        return replies
+
+    def internal_force(self, out=None, accumulate=False):
+        """Compute the nodal forces of the elements in the workers.
+
+        Args:
+            out (tensor): optional buffer that receives the nodal forces.
+            accumulate (bool): if True, add the forces to the contents of `out`.
+        Returns:
+            tensor: the nodal forces.
+        """
+        u = self.model.nodes.u
+        if u.size() != self.u.size():
+            raise ValueError("The size of the displacement changed.")
+        self.u.copy_(u.detach())
+        self._broadcast("force")
+        if out is None:
+            out = torch.zeros_like(self.u)
+        elif not accumulate:
+            out.zero_()
+        return out.index_add_(-2, self.index, self.partial.to(out.dtype))
+
+    def commit(self):
+        """Accept the trial state of the materials of the workers."""
+        self._broadcast("commit")
+
+    def gather_state(self):
+        """Copy the committed internal variables of the workers to the model groups.
+
+        The state of each partition is scattered along the element axis of the
+            material, which must have the `state_dict`, `load_state_dict` and
+            `element_axis` of a `vibrant.materials.StatefulMaterial`.
+        """
+        states = {}
+        for origins, reply in zip(self.origins, self._broadcast("state")):
+            for (k, element_ids), state in zip(origins, reply):
+                if state:
+                    states.setdefault(k, []).append((element_ids, state))
+        for k, parts in states.items():
+            material = self.model.elements[k].material
+            axis = material.element_axis
+            count = len(self.model.elements[k].conn)
+            merged = {}
+            for name, value in parts[0][1].items():
+                size = list(value.size())
+                size[axis] = count
+                merged[name] = value.new_zeros(size)
+            for element_ids, state in parts:
+                for name, value in state.items():
+                    merged[name].index_copy_(axis, element_ids, value)
+            material.load_state_dict(merged)
+
+    def close(self):
+        """Stop the workers and restore the serial evaluation of the model.
+
+        The committed internal variables of the materials are copied back to the
+            model groups first, see `gather_state`.
+        """
+        try:
+            if self.processes and all(process.is_alive() for process in self.processes):
+                self.gather_state()
+        finally:
+            self._stop()
+
+    def _stop(self):
+        """Stop the workers and detach them from the model."""
+        for connection, process in zip(self.connections, self.processes):
+            if process.is_alive():
+                connection.send("close")
+            process.join()
+            connection.close()
+        self.connections, self.processes = [], []
+        if self.model.executor is self:
+            self.model.executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
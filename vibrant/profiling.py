@@ -0,0 +1,182 @@
+"""
+Profiling.
+
+A `Profiler` attached to a `Model` records the wall time, the number of calls and
+    the allocated bytes of each phase of the force evaluation: every element group,
+    the loads, the damping, the mass and the constraints of each field. Phases may
+    be nested, and a phase called several times accumulates its records. The
+    records are summarized in a table, or exported as a Chrome trace that can be
+    opened in `chrome://tracing` or Perfetto.
+
+When no profiler is attached, the model uses a shared no-op phase, so the cost of
+    the instrumentation is one attribute check per phase.
+"""
+
+import json
+import os
+import threading
+import time
+
+import torch
+
+
+class _NullPhase:
+    """Phase that records nothing, used when profiling is disabled."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def output(self, *tensors):
+        pass
+
+
+NULL_PHASE = _NullPhase()
+
+
+def _nbytes(tensors):
+    """Get the total bytes of the tensors, ignoring anything else."""
+    return sum(
+        tensor.numel() * tensor.element_size()
+        for tensor in tensors
+        if torch.is_tensor(tensor)
+    )
+
+
+class _Phase:
+    """A timed phase of a `Profiler`."""
+
+    def __init__(self, profiler, name, device):
+        self.profiler = profiler
+        self.name = name
+        self.cuda = device is not None and device.type == "cuda"
+        self.bytes = 0
+
+    def __enter__(self):
+        if self.cuda:
+            torch.cuda.synchronize(self.profiler.device)
+            self.memory = torch.cuda.memory_allocated(self.profiler.device)
+            torch.cuda.reset_peak_memory_stats(self.profiler.device)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def output(self, *tensors):
+        """Count the bytes of tensors produced by the phase.
+
+        It is only used on the CPU, where PyTorch does not count allocations.
+        """
+        if not self.cuda:
+            self.bytes += _nbytes(tensors)
+
+    def __exit__(self, *args):
+        if self.cuda:
+            torch.cuda.synchronize(self.profiler.device)
+            peak = torch.cuda.max_memory_allocated(self.profiler.device)
+            self.bytes = peak - self.memory
+        end = time.perf_counter_ns()
+        self.profiler.add(self.name, self.start, end - self.start, self.bytes)
+
+
+class Profiler:
+    """Record the time, the calls and the allocated bytes of named phases.
+
+    On CUDA devices the allocated bytes are the increase of the peak allocated
+        memory during the phase, and the device is synchronized around every phase.
+        On the CPU, PyTorch does not count allocations, so they are the bytes of
+        the tensors produced by the phase, such as the strain, the stress and the
+        nodal forces.
+
+    Args:
+        trace (bool): keep every call for the Chrome trace, besides the totals.
+        device: the device of the model. By default, the CPU.
+    """
+
+    def __init__(self, trace=True, device=None):
+        self.trace = trace
+        self.device = None if device is None else torch.device(device)
+        self.origin = time.perf_counter_ns()
+        self.records = {}
+        self.events = []
+
+    def phase(self, name):
+        """Get a context manager that records the phase `name`.
+
+        The object it returns has an `output` method that counts the bytes of the
+            tensors produced by the phase.
+        """
+        return _Phase(self, name, self.device)
+
+    def add(self, name, start, duration, nbytes=0):
+        """Record a call of a phase, with times in nanoseconds."""
+        record = self.records.setdefault(name, [0, 0, 0])
+        record[0] += 1
+        record[1] += duration
+        record[2] += nbytes
+        if self.trace:
+            self.events.append((name, start, duration, nbytes, threading.get_ident()))
+
+    def reset(self):
+        """Discard the records."""
+        self.records = {}
+        self.events = []
+
+    def totals(self):
+        """Get the calls, the seconds and the bytes of every phase.
+
+        Returns:
+            dict: maps each phase to a `(calls, seconds, bytes)` tuple.
+        """
+        return {
+            name: (calls, duration * 1e-9, nbytes)
+            for name, (calls, duration, nbytes) in self.records.items()
+        }
+
+    def summary(self, sort=True):
+        """Format the records as a table.
+
+        Args:
+            sort (bool): sort the phases by decreasing total time.
+        Returns:
+            str: the table.
+        """
+        totals = list(self.totals().items())
+        if sort:
+            totals.sort(key=lambda item: -item[1][1])
+        width = max([len("phase")] + [len(name) for name, _ in totals])
+        header = ("calls", "total [ms]", "mean [us]", "MB")
+        lines = [f"{'phase':<{width}}" + " {:>8} {:>12} {:>11} {:>10}".format(*header)]
+        for name, (calls, seconds, nbytes) in totals:
+            lines.append(
+                f"{name:<{width}} {calls:>8} {1e3 * seconds:>12.3f}"
+                f" {1e6 * seconds / calls:>11.1f} {nbytes / 2 ** 20:>10.2f}"
+            )
+        return "\n".join(lines)
+
+    def chrome_trace(self, path=None):
+        """Export the recorded calls in the Chrome trace event format.
+
+        Args:
+            path (str): if given, the trace is written to this file.
+        Returns:
+            dict: the trace.
+        """
+        pid = os.getpid()
+        events = [
+            {
+                "name": name,
+                "ph": "X",
+                "ts": (start - self.origin) / 1e3,
+                "dur": duration / 1e3,
+                "pid": pid,
+                "tid": tid,
+                "args": {"bytes": nbytes},
+            }
+            for name, start, duration, nbytes, tid in self.events
+        ]
+        trace = {"traceEvents": events, "displayTimeUnit": "ms"}
+        if path is not None:
+            with open(path, "w") as file:
+                json.dump(trace, file)
+        return trace
@@ -0,0 +1,329 @@
+"""
+Solvers.
+
+Solvers advance the state of a `Model`. They own the work buffers they need, so a
+    step updates the nodal state in place instead of allocating new tensors.
+"""
+
+from math import exp
+
+import torch
+
+from vibrant.linalg import conjugate_gradient
+from vibrant.models import StaticSolution
+
+
+class CentralDifference:
+    """Explicit central difference time integrator.
+
+    The velocity is advanced in two half steps (velocity Verlet form), so `nodes.u`
+        and `nodes.v` are synchronized at the end of every step. Both are updated in
+        place. The constraints of each field are applied after each update of the
+        field, with the prescribed values at the time of the update. The material
+        state is committed after every step.
+
+    Args:
+        model (Model): the model to integrate.
+        safety (float): fraction of the critical time step used when the time step
+            is not given.
+        update_interval (int): number of steps between evaluations of the critical
+            time step when the time step is not given.
+    """
+
+    def __init__(self, model, safety=0.9, update_interval=100):
+        self.model = model
+        self.safety = safety
+        self.update_interval = update_interval
+        self.steps = 0
+        self.dt = None
+        self.a = None
+        self.f = None
+        self._mass = None
+        self._inv_mass = None
+
+    def inverse_mass(self):
+        """Return the inverse of the lumped mass.
+
+        The inverse is only recomputed when the model mass is replaced.
+        """
+        mass = self.model.mass()
+        if mass is not self._mass:
+            self._mass = mass
+            self._inv_mass = mass.reciprocal()
+        return self._inv_mass
+
+    def acceleration(self, time=None):
+        """Update the acceleration buffer with the current nodal state.
+
+        The forces are evaluated in the force buffer `f`, which is allocated by the
+            first evaluation. The acceleration constraints are evaluated at `time`,
+            the model time by default.
+        """
+        force = self.model.force(self.f)
+        if torch.is_tensor(force):
+            self.f = force
+        inv_mass = self.inverse_mass()
+        shape = torch.broadcast_shapes(force.shape, inv_mass.shape)
+        if self.a is None or self.a.shape != shape or self.a.dtype != force.dtype:
+            self.a = torch.empty(shape, dtype=force.dtype, device=force.device)
+        torch.mul(force, inv_mass, out=self.a)
+        self.model.apply_constraints("a", self.a, time)
+        return self.a
+
+    def stable_time_step(self):
+        """Update and return the stable time step of the model."""
+        self.dt = self.safety * self.model.stable_time_step().dt
+        return self.dt
+
+    def reset(self):
+        """Discard the stored acceleration and the force buffer.
+
+        Call it after modifying the nodal state outside of the solver.
+        """
+        self.a = None
+        self.f = None
+
+    def state_dict(self):
+        """Get the step count, the current time step and the acceleration."""
+        return {"steps": self.steps, "dt": self.dt, "a": self.a}
+
+    def load_state_dict(self, state):
+        """Restore the state obtained with `state_dict`."""
+        self.steps = state["steps"]
+        self.dt = state["dt"]
+        self.a = state["a"]
+
+    def step(self, dt):
+        """Advance the model by a time increment `dt`."""
+        model = self.model
+        nodes = model.nodes
+        end = model.time + dt
+        if self.a is None:
+            self.acceleration()
+        nodes.v.add_(self.a, alpha=dt / 2)
+        model.apply_constraints("v", time=model.time + dt / 2)
+        nodes.u.add_(nodes.v, alpha=dt)
+        model.apply_constraints("u", time=end)
+        self.acceleration(end)
+        model.commit()
+        nodes.v.add_(self.a, alpha=dt / 2)
+        model.apply_constraints("v", time=end)
+        model.time += dt
+        self.steps += 1
+
+    def run(self, t_end, dt=None, callback=None):
+        """Advance the model until `t_end`.
+
+        Args:
+            t_end (float): the final time.
+            dt (float): the time increment. If it is None, the stable time step is
+                used and re-evaluated every `update_interval` steps.
+            callback (callable): called with the solver after every step.
+        """
+        while True:
+            step_dt = dt
+            if step_dt is None:
+                if self.dt is None or self.steps % self.update_interval == 0:
+                    self.stable_time_step()
+                step_dt = self.dt
+            if self.model.time + step_dt / 2 >= t_end:
+                break
+            self.step(step_dt)
+            if callback is not None:
+                callback(self)
+
+
+class MatrixFreeNewton:
+    """Matrix-free Newton-Raphson static solver.
+
+    The tangent stiffness is never formed. Its product with a vector is obtained by
+        differentiating `Model.static_force` twice with autograd, and each linear
+        system is solved with preconditioned conjugate gradients, so the memory use
+        is linear in the number of dofs. The tangent must be symmetric positive
+        definite on the free dofs. The prescribed displacements are applied first, and
+        the constrained degrees of freedom keep their displacement. The material
+        state is committed on convergence.
+
+    Args:
+        model (Model): the model to solve.
+        preconditioner (str): the Jacobi preconditioner. "stiffness" uses the
+            diagonal of the tangent stiffness, "mass" uses the lumped mass and None
+            disables preconditioning.
+        rtol (float): the tolerance of the residual force relative to the initial
+            residual.
+        atol (float): the absolute tolerance of the residual force.
+        max_iterations (int): the maximum number of Newton iterations.
+        linear_rtol (float): the relative tolerance of the linear solutions.
+        linear_maxiter (int): the maximum number of Krylov iterations per solution.
+    """
+
+    def __init__(
+        self,
+        model,
+        preconditioner="stiffness",
+        rtol=1e-8,
+        atol=0,
+        max_iterations=20,
+        linear_rtol=1e-10,
+        linear_maxiter=None,
+    ):
+        if preconditioner not in ("stiffness", "mass", None):
+            raise ValueError(f"Unknown preconditioner {preconditioner}.")
+        self.model = model
+        self.preconditioner = preconditioner
+        self.rtol = rtol
+        self.atol = atol
+        self.max_iterations = max_iterations
+        self.linear_rtol = linear_rtol
+        self.linear_maxiter = linear_maxiter
+        self.linear_iterations = 0
+
+    def jacobi(self, free):
+        """Build the Jacobi preconditioner restricted to the free dofs."""
+        if self.preconditioner is None:
+            return None
+        with torch.no_grad():
+            if self.preconditioner == "mass":
+                diagonal = self.model.mass().expand_as(self.model.nodes.X)
+            else:
+                diagonal = self.model.stiffness_diagonal()
+        diagonal = diagonal.reshape(-1) * free
+        diagonal = torch.where(diagonal > 0, diagonal, torch.ones_like(diagonal))
+        return diagonal.reciprocal().mul
+
+    def solve(self):
+        """Find the static equilibrium, updating the displacement in place.
+
+        Returns:
+            StaticSolution: the convergence information.
+        """
+        model = self.model
+        displacement = model.nodes.u
+        model.apply_constraints("u")
+        free = (~model.constrained_dofs()).reshape(-1).to(displacement.dtype)
+        tolerance = None
+        self.linear_iterations = 0
+        try:
+            for iteration in range(self.max_iterations + 1):
+                u = displacement.detach().requires_grad_()
+                model.nodes.u = u
+                with torch.enable_grad():
+                    force = model.static_force()
+                residual = force.detach().reshape(-1) * free
+                norm = residual.norm().item()
+                if tolerance is None:
+                    tolerance = max(self.rtol * norm, self.atol)
+                if norm <= tolerance:
+                    model.commit()
+                    return StaticSolution(True, iteration, norm)
+                if iteration == self.max_iterations:
+                    break
+                du, linear_iterations = conjugate_gradient(
+                    _tangent_operator(force, u, free),
+                    residual,
+                    preconditioner=self.jacobi(free),
+                    rtol=self.linear_rtol,
+                    maxiter=self.linear_maxiter,
+                )
+                self.linear_iterations += linear_iterations
+                displacement.add_(du.view_as(displacement))
+        finally:
+            model.nodes.u = displacement
+        return StaticSolution(False, self.max_iterations, norm)
+
+
+def _tangent_operator(force, u, free):
+    """Build the product of the tangent stiffness with a vector on the free dofs.
+
+    The stiffness is minus the Jacobian of the force. Its products are obtained
+        with the double backward trick: `g = J^T w` is linear in `w`, so the
+        gradient of `g . v` with respect to `w` is `J v`.
+    """
+    w = torch.zeros_like(force, requires_grad=True)
+    (g,) = torch.autograd.grad(force, u, w, create_graph=True)
+
+    def matvec(x):
+        (jvp,) = torch.autograd.grad(g, w, (x * free).view_as(g), retain_graph=True)
+        return -jvp.reshape(-1) * free + x * (1 - free)
+
+    return matvec
+
+
+class ModalDynamics:
+    """Reduced order dynamics by modal superposition.
+
+    The displacement is approximated as `u = u0 + shapes q`, where u0 is the
+        displacement when the solver is created. Each modal coordinate follows a
+        decoupled oscillator, with the mass proportional damping of the model, and is
+        integrated exactly assuming that the modal force is constant during a step.
+        The internal force is linearized around u0, so the results are exact for
+        linear problems. The nodal state is only written back at the output times.
+        The modes must have nonzero frequencies, so the model needs enough
+        constraints to prevent rigid body motions.
+
+    Args:
+        model (Model): the model to integrate.
+        k (int): the number of modes. It is ignored if `modes` is given.
+        modes (Modes): precomputed modes of the model.
+    """
+
+    def __init__(self, model, k=20, modes=None):
+        self.model = model
+        self.modes = model.modes(k) if modes is None else modes
+        nodes = model.nodes
+        self.basis = self.modes.shapes.reshape(len(self.modes.omega), -1)
+        self.u0 = nodes.u.clone()
+        self.internal_force = model.internal_force()
+        mass = model.mass().expand_as(nodes.u).reshape(-1)
+        self.q = self.basis.new_zeros(len(self.modes.omega))
+        self.dq = self.basis @ (mass * nodes.v.reshape(-1))
+
+    def modal_force(self):
+        """Project the nodal forces at the current time on the modes."""
+        force = self.internal_force + self.model.external_force()
+        return self.basis @ force.reshape(-1)
+
+    def step(self, dt):
+        """Advance the modal coordinates by a time increment `dt`."""
+        c = self.model.damping
+        omega2 = self.modes.omega ** 2
+        y = self.q - self.modal_force() / omega2
+        dy = self.dq
+        damped2 = omega2 - c ** 2 / 4
+        damped = damped2.abs().sqrt()
+        phase = damped * dt
+        # cos(wd dt) and sin(wd dt) / wd, or their hyperbolic counterparts
+        underdamped = damped2 > 0
+        cosine = torch.where(underdamped, phase.cos(), phase.cosh())
+        sine = torch.where(underdamped, phase.sin(), phase.sinh())
+        nonzero = damped > 0
+        sine = sine / torch.where(nonzero, damped, torch.ones_like(damped))
+        sine = torch.where(nonzero, sine, torch.full_like(sine, dt))
+        decay = exp(-c * dt / 2)
+        self.q = self.q - y + decay * (y * cosine + (dy + c / 2 * y) * sine)
+        self.dq = decay * (dy * cosine - (omega2 * y + c / 2 * dy) * sine)
+        self.model.time += dt
+
+    def expand(self):
+        """Write the nodal displacement and velocity, in place."""
+        nodes = self.model.nodes
+        nodes.u.copy_(self.u0 + (self.q @ self.basis).view_as(nodes.u))
+        nodes.v.copy_((self.dq @ self.basis).view_as(nodes.v))
+
+    def run(self, times, dt=None, callback=None):
+        """Advance the model through increasing output times.
+
+        Args:
+            times (iterable): the output times.
+            dt (float): the maximum time increment, which limits how often the loads
+                are sampled. By default, the steps span the whole output interval.
+            callback (callable): called with the solver at every output time, after
+                updating the nodal state.
+        """
+        for time in times:
+            while self.model.time < time:
+                remaining = time - self.model.time
+                self.step(remaining if dt is None else min(dt, remaining))
+            self.expand()
+            if callback is not None:
+                callback(self)